@@ -39,6 +39,46 @@ EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 EMAIL_TIMEOUT = 15
 
+# Ventas: reserva de stock con bloqueo de fila y reintentos ante deadlock
+VENTAS_BLOQUEO_STOCK = os.getenv("VENTAS_BLOQUEO_STOCK", "true").lower() == "true"
+VENTAS_REINTENTOS_DEADLOCK = int(os.getenv("VENTAS_REINTENTOS_DEADLOCK", "3"))
+VENTAS_LOTE_MAX = int(os.getenv("VENTAS_LOTE_MAX", "1000"))  # ventas por petición en /api/ventas/lote
+INVENTARIO_LOTE_MAX = int(os.getenv("INVENTARIO_LOTE_MAX", "5000"))  # movimientos por petición en /api/inventario/movimientos/lote
+
+# Idempotency-Key en POST /api/ventas/create: ventana de reproducción y máximo de claves
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+IDEMPOTENCIA_MAX_CLAVES = int(os.getenv("IDEMPOTENCIA_MAX_CLAVES", "10000"))
+
+# Importación masiva (CSV/XLSX): carpeta de reportes de errores y tamaño de bloque
+IMPORTACION_DIR = os.getenv("IMPORTACION_DIR", "")  # vacío = carpeta temporal del sistema
+IMPORTACION_TAM_BLOQUE = int(os.getenv("IMPORTACION_TAM_BLOQUE", "500"))
+IMPORTACION_HILOS = int(os.getenv("IMPORTACION_HILOS", "4"))
+
+# Catálogo de productos en memoria (POS): recarga completa cada N segundos
+CATALOGO_TTL_SEGUNDOS = int(os.getenv("CATALOGO_TTL_SEGUNDOS", "300"))
+
+# Búsqueda de productos con índice de trigramas en memoria (false = LIKE en SQL Server)
+BUSQUEDA_INDICE = os.getenv("BUSQUEDA_INDICE", "true").lower() == "true"
+BUSQUEDA_DISTANCIA_MAX = int(os.getenv("BUSQUEDA_DISTANCIA_MAX", "2"))  # errores tolerados en modo=difuso
+
+# Autocompletado de estudiantes en memoria: recarga completa cada N segundos
+ESTUDIANTES_INDICE_TTL_SEGUNDOS = int(os.getenv("ESTUDIANTES_INDICE_TTL_SEGUNDOS", "300"))
+
+# Caché de lecturas de categorías (listados y detalle), invalidada al escribir
+CACHE_CATEGORIAS_MAX = int(os.getenv("CACHE_CATEGORIAS_MAX", "256"))
+CACHE_CATEGORIAS_TTL_SEGUNDOS = int(os.getenv("CACHE_CATEGORIAS_TTL_SEGUNDOS", "3600"))
+# Caché de detalle por producto (versión por producto; el TTL acota la deriva entre procesos)
+CACHE_PRODUCTOS_MAX = int(os.getenv("CACHE_PRODUCTOS_MAX", "5000"))
+CACHE_PRODUCTOS_TTL_SEGUNDOS = int(os.getenv("CACHE_PRODUCTOS_TTL_SEGUNDOS", "30"))
+# Caché de reportes: los períodos cerrados no vencen; el TTL aplica al período abierto
+REPORTES_CACHE_MAX = int(os.getenv("REPORTES_CACHE_MAX", "512"))
+REPORTES_CACHE_TTL_SEGUNDOS = int(os.getenv("REPORTES_CACHE_TTL_SEGUNDOS", "300"))
+# Backend de las cachés: "memoria" (por proceso), "sqlite:///ruta/cache.sqlite3" o
+# "redis://host:6379/0" (compartidos entre workers, con invalidación por contadores)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+# Retraso máximo con que un worker ve la invalidación hecha por otro (backend compartido)
+CACHE_SINCRONIZAR_SEGUNDOS = float(os.getenv("CACHE_SINCRONIZAR_SEGUNDOS", "1"))
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
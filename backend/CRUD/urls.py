@@ -76,8 +76,12 @@ urlpatterns = [
     # API
     #Estudiantes (admin, secretaria)
     path("api/estudiantes",                        api.api_listar,        name="api_listar"),          # GET (ambos roles)
+    path("api/estudiantes/autocompletar",           api.api_autocompletar, name="api_autocompletar"),   # GET (ambos roles)
+    path("api/estudiantes/duplicados",              api.api_duplicados,    name="api_duplicados"),      # GET (ambos roles)
     path("api/estudiantes/<int:id_est>",           api.api_detalle,       name="api_detalle"),         # GET (ambos roles)
     path("api/estudiantes/create",                  api.api_crear,         name="api_crear"),           # POST (ambos roles)
+    path("api/estudiantes/importar",                api.api_importar,      name="api_importar"),        # POST (ambos roles)
+    path("api/estudiantes/importar/errores/<str:token>", api.api_importar_errores, name="api_importar_errores"),  # GET (ambos roles)
     path("api/estudiantes/<int:id_est>/update",api.api_actualizar,    name="api_actualizar"),      # PUT  (solo admin, secretaría)
     path("api/estudiantes/<int:id_est>/delete",  api.api_eliminar,      name="api_eliminar"),        # DELETE (solo admin)
     #Usuarios (admin)
@@ -124,8 +128,14 @@ urlpatterns = [
 
     # APIs - Productos
     path("api/productos", api.api_producto_listar, name="api_producto_listar"),
+    path("api/catalogo", api.api_catalogo, name="api_catalogo"),
+    path("api/cache/estadisticas", api.api_cache_estadisticas, name="api_cache_estadisticas"),
+    path("api/productos/codigo/<str:codigo>", api.api_producto_por_codigo, name="api_producto_por_codigo"),
+    path("api/productos/codigos", api.api_productos_por_codigos, name="api_productos_por_codigos"),
     path("api/productos/<int:id_prod>", api.api_producto_detalle, name="api_producto_detalle"),
     path("api/productos/create", api.api_producto_crear, name="api_producto_crear"),
+    path("api/productos/importar", api.api_productos_importar, name="api_productos_importar"),
+    path("api/productos/importar/errores/<str:token>", api.api_productos_importar_errores, name="api_productos_importar_errores"),
     path("api/productos/<int:id_prod>/update", api.api_producto_actualizar, name="api_producto_actualizar"),
     path("api/productos/<int:id_prod>/delete", api.api_producto_eliminar, name="api_producto_eliminar"),
     path("api/productos/<int:id_prod>/categorias", api.api_producto_categorias, name="api_producto_categorias"),
@@ -135,11 +145,13 @@ urlpatterns = [
     # APIs - Inventario
     path("api/inventario", api.api_inventario_actual, name="api_inventario_actual"),
     path("api/inventario/entrada", api.api_inventario_entrada, name="api_inventario_entrada"),
+    path("api/inventario/movimientos/lote", api.api_inventario_movimientos_lote, name="api_inventario_movimientos_lote"),
     path("api/inventario/historial/<int:id_prod>", api.api_inventario_historial, name="api_inventario_historial"),
 
     # APIs - Ventas
     path("api/ventas", api.api_ventas_listar, name="api_ventas_listar"),
     path("api/ventas/create", api.api_venta_crear, name="api_venta_crear"),
+    path("api/ventas/lote", api.api_ventas_lote, name="api_ventas_lote"),
     path("api/ventas/<int:id_venta>", api.api_venta_detalle, name="api_venta_detalle"),
 
     # APIs - Reportes Productos
@@ -0,0 +1,205 @@
+"""
+Autocompletado de estudiantes por prefijo (nombres, apellidos y correo).
+
+Índice en memoria con dos arreglos paralelos ordenados por (clave, idEstudiante):
+las claves son cada palabra normalizada de nombres/apellidos y el correo. Un
+prefijo se resuelve con bisect (O(log n)) y se recorre solo el rango que lo
+comparte hasta juntar k estudiantes. Las palabras se internan: "maria" o
+"lopez" se guardan una vez aunque aparezcan en miles de estudiantes.
+
+Se carga completo la primera vez que se usa, se actualiza por estudiante con
+el evento 'estudiante' de db.py (insertar/actualizar/eliminar) y se recarga
+cada ESTUDIANTES_INDICE_TTL_SEGUNDOS. Con CACHE_BACKEND compartido los cambios
+de otros workers llegan por cache.Difusion y se aplican por estudiante.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connection
+
+from . import db
+from .busqueda import normalizar
+from .cache import RECARGAR, Difusion
+
+_SQL_ESTUDIANTES = "SELECT idEstudiante, nombres, apellidos, correo FROM dbo.tbEstudiante"
+
+
+def _claves(nombres, apellidos, correo) -> frozenset:
+    claves = {sys.intern(w) for w in normalizar(f"{nombres} {apellidos}").split()}
+    correo = normalizar(correo)
+    if correo:
+        claves.add(correo)
+    return frozenset(claves)
+
+
+def _registro(nombres, apellidos, correo):
+    """(nombres, apellidos, correo, claves) tal como se guarda por estudiante"""
+    return (sys.intern(str(nombres or "")), sys.intern(str(apellidos or "")), str(correo or ""),
+            _claves(nombres, apellidos, correo))
+
+
+class IndicePrefijos:
+    """Claves ordenadas con bisect; thread-safe"""
+
+    def __init__(self, ttl: float = 300, difusion: Difusion | None = None):
+        self.ttl = ttl
+        self.difusion = difusion
+        self._claves = []   # claves ordenadas (repetidas una vez por estudiante)
+        self._ids = []      # idEstudiante en la misma posición (ordenados dentro de cada clave)
+        self._datos = {}    # idEstudiante -> (nombres, apellidos, correo, claves)
+        self._cargado_en = None
+        self._lock = threading.RLock()
+        self.recargas = 0
+        self.actualizaciones = 0
+
+    # ---------------------------
+    # Construcción
+    # ---------------------------
+    def cargar_filas(self, filas):
+        """Reemplaza el índice completo (filas: idEstudiante, nombres, apellidos, correo)"""
+        pares, datos = [], {}
+        for id_est, nombres, apellidos, correo in filas:
+            id_est = int(id_est)
+            datos[id_est] = reg = _registro(nombres, apellidos, correo)
+            pares.extend((c, id_est) for c in reg[3])
+        pares.sort()
+        with self._lock:
+            self._claves = [c for c, _ in pares]
+            self._ids = [i for _, i in pares]
+            self._datos = datos
+            self._cargado_en = time.monotonic()
+            self.recargas += 1
+
+    def recargar(self):
+        if self.difusion is not None:
+            self.difusion.base()
+        with connection.cursor() as cur:
+            cur.execute(_SQL_ESTUDIANTES)
+            filas = []
+            while True:
+                bloque = cur.fetchmany(5000)
+                if not bloque:
+                    break
+                filas.extend(bloque)
+        self.cargar_filas(filas)
+
+    def _insertar(self, clave, id_est):
+        lo, hi = bisect_left(self._claves, clave), bisect_right(self._claves, clave)
+        i = bisect_left(self._ids, id_est, lo, hi)
+        self._claves.insert(i, clave)
+        self._ids.insert(i, id_est)
+
+    def _borrar(self, clave, id_est):
+        lo, hi = bisect_left(self._claves, clave), bisect_right(self._claves, clave)
+        i = bisect_left(self._ids, id_est, lo, hi)
+        if i < hi and self._ids[i] == id_est:
+            del self._claves[i]
+            del self._ids[i]
+
+    def aplicar(self, filas, ids):
+        """Actualiza los estudiantes `ids` con sus filas actuales (los que no vienen se quitan)"""
+        nuevos = {int(f[0]): f for f in filas}
+        with self._lock:
+            for id_est in ids:
+                anterior = self._datos.pop(id_est, None)
+                if anterior is not None:
+                    for c in anterior[3]:
+                        self._borrar(c, id_est)
+                fila = nuevos.get(id_est)
+                if fila is not None:
+                    self._datos[id_est] = reg = _registro(*fila[1:])
+                    for c in reg[3]:
+                        self._insertar(c, id_est)
+            self.actualizaciones += 1
+
+    def refrescar(self, ids):
+        """Relee de la base solo los estudiantes `ids`"""
+        ids = sorted({int(i) for i in ids or ()})
+        if not ids or self._cargado_en is None:
+            return
+        filas = []
+        with connection.cursor() as cur:
+            for lote in db._lotes(ids, 1):
+                marcadores = ", ".join(["%s"] * len(lote))
+                cur.execute(f"{_SQL_ESTUDIANTES} WHERE idEstudiante IN ({marcadores})", lote)
+                filas.extend(cur.fetchall())
+        self.aplicar(filas, ids)
+
+    def cambio_local(self, ids):
+        """Escritura confirmada en este proceso: se aplica y se publica a los demás workers"""
+        self.refrescar(ids)
+        if self.difusion is not None:
+            self.difusion.publicar(ids)
+
+    def _asegurar(self):
+        if self.difusion is not None and self._cargado_en is not None:
+            cambios = self.difusion.pendientes()
+            if cambios is RECARGAR:
+                with self._lock:
+                    self._cargado_en = None
+            elif cambios:
+                self.refrescar(cambios)
+        cargado = self._cargado_en
+        if cargado is None or (self.ttl and time.monotonic() - cargado > self.ttl):
+            with self._lock:
+                cargado = self._cargado_en
+                if cargado is None or (self.ttl and time.monotonic() - cargado > self.ttl):
+                    self.recargar()
+
+    # ---------------------------
+    # Consultas
+    # ---------------------------
+    def _rango(self, prefijo):
+        """(inicio, fin) de las claves que empiezan con `prefijo`"""
+        inicio = bisect_left(self._claves, prefijo)
+        siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+        return inicio, bisect_left(self._claves, siguiente, inicio)
+
+    def buscar(self, texto, k: int = 10) -> list:
+        """
+        Hasta k estudiantes donde cada palabra de `texto` es prefijo de alguna de
+        sus palabras (o del correo). Se recorre el rango de la palabra con menos
+        claves (la más selectiva) y el resto se verifica por estudiante.
+        """
+        palabras = normalizar(texto).split()
+        if not palabras or k <= 0:
+            return []
+        self._asegurar()
+        resultado, vistos = [], set()
+        with self._lock:
+            rangos = sorted(((self._rango(w), w) for w in palabras), key=lambda r: r[0][1] - r[0][0])
+            (i, fin), _ = rangos[0]
+            resto = [w for _, w in rangos[1:]]
+            while i < fin and len(resultado) < k:
+                id_est = self._ids[i]
+                i += 1
+                if id_est in vistos:
+                    continue
+                vistos.add(id_est)
+                nombres, apellidos, correo, propias = self._datos[id_est]
+                if resto and not all(any(c.startswith(w) for c in propias) for w in resto):
+                    continue
+                resultado.append({
+                    "idEstudiante": id_est,
+                    "nombres": nombres,
+                    "apellidos": apellidos,
+                    "correo": correo,
+                })
+        return resultado
+
+    def estadisticas(self) -> dict:
+        return {
+            "estudiantes": len(self._datos),
+            "claves": len(self._claves),
+            "recargas": self.recargas,
+            "actualizaciones": self.actualizaciones,
+        }
+
+
+indice = IndicePrefijos(ttl=getattr(settings, "ESTUDIANTES_INDICE_TTL_SEGUNDOS", 300),
+                        difusion=Difusion("estudiantes"))
+
+db.suscribir("estudiante", lambda ids=(), **_: indice.cambio_local(ids))
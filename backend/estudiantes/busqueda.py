@@ -0,0 +1,395 @@
+"""
+Búsqueda de productos con un índice invertido de trigramas en memoria.
+
+Reemplaza el LIKE '%texto%' sobre codigo/nombre/categorias (que recorre la
+tabla completa) por la intersección de las listas de trigramas de la consulta;
+los candidatos se verifican contra el texto para conservar la semántica de
+"contiene" y se ordenan por calidad de coincidencia (código exacto, prefijo,
+inicio de palabra, ...).
+
+El índice se construye a partir del snapshot del catálogo (catalogo.py) y se
+mantiene al día aplicando sus cambios por versión: las escrituras de productos
+y de categorías de un producto reindexan solo esos productos; una recarga
+completa del catálogo (TTL o cambio de una categoría) reconstruye el índice.
+
+Consultas de menos de N caracteres no se pueden resolver con trigramas:
+buscar() retorna None y el llamador usa el LIKE de siempre.
+
+Con modo=difuso se usa IndiceDifuso, que tolera errores de tipeo por palabra
+(distancia de edición acotada) con un diccionario de borrados tipo SymSpell.
+"""
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from . import db
+from .catalogo import catalogo
+
+N = 3
+
+_RE_PALABRA = re.compile(r"[a-z0-9]+")
+
+# Puntajes por tipo de coincidencia (mayor = más relevante)
+_EXACTO_CODIGO = 100
+_PREFIJO_CODIGO = 80
+_EXACTO_NOMBRE = 70
+_PREFIJO_NOMBRE = 60
+_PALABRA_NOMBRE = 50
+_CONTIENE_CODIGO = 40
+_CONTIENE_NOMBRE = 30
+_PREFIJO_CATEGORIA = 20
+_CONTIENE_CATEGORIA = 10
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sin tildes y con espacios simples"""
+    texto = unicodedata.normalize("NFKD", str(texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+def ngramas(texto: str, n: int = N) -> set:
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+def puntaje(consulta: str, codigo: str, nombre: str, categorias) -> int:
+    """Calidad de la coincidencia de `consulta` (normalizada) o 0 si no la contiene"""
+    if consulta == codigo:
+        return _EXACTO_CODIGO
+    if codigo.startswith(consulta):
+        return _PREFIJO_CODIGO
+    if consulta == nombre:
+        return _EXACTO_NOMBRE
+    if nombre.startswith(consulta):
+        return _PREFIJO_NOMBRE
+    if f" {consulta}" in nombre:
+        return _PALABRA_NOMBRE
+    if consulta in codigo:
+        return _CONTIENE_CODIGO
+    if consulta in nombre:
+        return _CONTIENE_NOMBRE
+    if any(c.startswith(consulta) for c in categorias):
+        return _PREFIJO_CATEGORIA
+    if any(consulta in c for c in categorias):
+        return _CONTIENE_CATEGORIA
+    return 0
+
+
+class _IndiceCatalogo:
+    """
+    Base de los índices derivados del catálogo: se sincronizan por versión con
+    Catalogo.cambios_desde y se reconstruyen cuando el historial no alcanza.
+    Las subclases implementan _vaciar, _agregar(producto) y _quitar(idProducto).
+    """
+
+    def __init__(self, fuente):
+        self.fuente = fuente
+        self.version = None      # versión del catálogo ya indexada
+        self._lock = threading.RLock()
+        self.reconstrucciones = 0
+        self.actualizaciones = 0
+        self._vaciar()
+
+    def construir(self, version, productos):
+        """Reemplaza el índice completo"""
+        with self._lock:
+            self._vaciar()
+            for p in productos:
+                self._agregar(p)
+            self.version = version
+            self.reconstrucciones += 1
+
+    def sincronizar(self):
+        """Aplica los cambios del catálogo desde la última versión indexada"""
+        with self._lock:
+            delta = None if self.version is None else self.fuente.cambios_desde(self.version)
+            if delta is None:
+                self.construir(*self.fuente.snapshot())
+                return
+            version, cambiados, eliminados = delta
+            if version == self.version:
+                return
+            for p in cambiados:
+                self._quitar(p.idProducto)
+                self._agregar(p)
+            for id_p in eliminados:
+                self._quitar(id_p)
+            self.version = version
+            self.actualizaciones += 1
+
+
+class IndiceNgramas(_IndiceCatalogo):
+    """Índice invertido trigrama -> {idProducto} sincronizado con un Catalogo (thread-safe)"""
+
+    def _vaciar(self):
+        self._listas = {}        # trigrama -> set(idProducto)
+        self._docs = {}          # idProducto -> (codigo, nombre, categorias, estado, nombre original)
+
+    def _agregar(self, p):
+        codigo, nombre = normalizar(p.codigo), normalizar(p.nombre)
+        categorias = tuple(normalizar(c) for c in p.categorias)
+        self._docs[p.idProducto] = (codigo, nombre, categorias, p.estado, p.nombre)
+        gramas = ngramas(codigo) | ngramas(nombre)
+        for c in categorias:
+            gramas |= ngramas(c)
+        for g in gramas:
+            lista = self._listas.get(g)
+            if lista is None:
+                self._listas[g] = {p.idProducto}
+            else:
+                lista.add(p.idProducto)
+
+    def _quitar(self, id_producto):
+        doc = self._docs.pop(id_producto, None)
+        if doc is None:
+            return
+        codigo, nombre, categorias = doc[:3]
+        gramas = ngramas(codigo) | ngramas(nombre)
+        for c in categorias:
+            gramas |= ngramas(c)
+        for g in gramas:
+            lista = self._listas.get(g)
+            if lista is not None:
+                lista.discard(id_producto)
+                if not lista:
+                    del self._listas[g]
+
+    def buscar(self, texto, estado: str = None, en_categorias: bool = True):
+        """
+        idProducto que contienen `texto` en código, nombre o (si en_categorias)
+        categorías, del más relevante al menos relevante (empate: por nombre).
+        None si la consulta es más corta que N y no puede resolverse con el índice.
+        """
+        consulta = normalizar(texto)
+        if len(consulta) < N:
+            return None
+        self.sincronizar()
+        with self._lock:
+            listas = []
+            for g in ngramas(consulta):
+                lista = self._listas.get(g)
+                if not lista:
+                    return []
+                listas.append(lista)
+            listas.sort(key=len)
+            candidatos = listas[0].intersection(*listas[1:])
+            resultados = []
+            for id_p in candidatos:
+                codigo, nombre, categorias, est, original = self._docs[id_p]
+                if estado and est != estado:
+                    continue
+                score = puntaje(consulta, codigo, nombre, categorias if en_categorias else ())
+                if score:
+                    resultados.append((-score, original, id_p))
+        resultados.sort()
+        return [id_p for _, _, id_p in resultados]
+
+    def estadisticas(self) -> dict:
+        return {
+            "productos": len(self._docs),
+            "trigramas": len(self._listas),
+            "version": self.version,
+            "reconstrucciones": self.reconstrucciones,
+            "actualizaciones": self.actualizaciones,
+        }
+
+
+def distancia(a: str, b: str, maximo: int) -> int:
+    """
+    Distancia de edición con transposiciones (Damerau, variante OSA).
+    Corta en cuanto supera `maximo` y retorna maximo + 1.
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    previa2, previa = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            costo = 0 if a[i - 1] == b[j - 1] else 1
+            actual[j] = min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + costo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                actual[j] = min(actual[j], previa2[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+        previa2, previa = previa, actual
+    return previa[-1]
+
+
+def _palabras(texto: str) -> list:
+    return _RE_PALABRA.findall(normalizar(texto))
+
+
+def presupuesto(palabra: str, maximo: int) -> int:
+    """Errores tolerados según el largo de la palabra (las cortas y los números, ninguno)"""
+    if len(palabra) < 3 or palabra.isdigit():
+        return 0
+    return min(maximo, 1 if len(palabra) <= 5 else 2)
+
+
+class IndiceDifuso(_IndiceCatalogo):
+    """
+    Búsqueda tolerante a errores de tipeo (estilo SymSpell).
+
+    Por cada palabra del vocabulario (palabras del nombre) se guardan sus
+    variantes con hasta `maximo` letras borradas, calculadas sobre los primeros
+    `prefijo` caracteres. Una consulta genera las variantes de cada palabra
+    buscada y solo compara (distancia real) contra las palabras que comparten
+    alguna: no recorre el vocabulario completo.
+
+    Los códigos no entran: comparten prefijos largos (P000123...) y llenarían
+    cada variante de miles de palabras; para códigos está la búsqueda exacta.
+    """
+
+    def __init__(self, fuente, maximo: int = 2, prefijo: int = 7):
+        self.maximo = maximo
+        self.prefijo = prefijo
+        super().__init__(fuente)
+
+    def _vaciar(self):
+        self._borrados = {}      # variante -> set(palabra)
+        self._productos = {}     # palabra -> set(idProducto)
+        self._docs = {}          # idProducto -> (palabras, estado, nombre original)
+
+    def _variantes(self, palabra: str, maximo: int) -> set:
+        """La palabra (recortada al prefijo) y sus variantes con 1..maximo borrados"""
+        inicio = palabra[:self.prefijo]
+        variantes, frontera = {inicio}, [inicio]
+        for _ in range(maximo):
+            siguiente = []
+            for v in frontera:
+                for i in range(len(v)):
+                    b = v[:i] + v[i + 1:]
+                    if b not in variantes:
+                        variantes.add(b)
+                        siguiente.append(b)
+            frontera = siguiente
+        return variantes
+
+    def _agregar(self, p):
+        palabras = frozenset(_palabras(p.nombre))
+        self._docs[p.idProducto] = (palabras, p.estado, p.nombre)
+        for w in palabras:
+            ids = self._productos.get(w)
+            if ids is None:
+                self._productos[w] = {p.idProducto}
+                for v in self._variantes(w, presupuesto(w, self.maximo)):
+                    self._borrados.setdefault(v, set()).add(w)
+            else:
+                ids.add(p.idProducto)
+
+    def _quitar(self, id_producto):
+        doc = self._docs.pop(id_producto, None)
+        if doc is None:
+            return
+        for w in doc[0]:
+            ids = self._productos.get(w)
+            if ids is None:
+                continue
+            ids.discard(id_producto)
+            if ids:
+                continue
+            # Última aparición: la palabra sale del vocabulario
+            del self._productos[w]
+            for v in self._variantes(w, presupuesto(w, self.maximo)):
+                palabras = self._borrados.get(v)
+                if palabras is not None:
+                    palabras.discard(w)
+                    if not palabras:
+                        del self._borrados[v]
+
+    def cercanas(self, palabra: str, maximo: int) -> dict:
+        """{palabra del vocabulario: distancia} a distancia <= maximo de `palabra`"""
+        encontradas = {}
+        vistas = set()
+        for v in self._variantes(palabra, maximo):
+            for w in self._borrados.get(v, ()):
+                if w in vistas:
+                    continue
+                vistas.add(w)
+                d = distancia(palabra, w, maximo)
+                if d <= maximo:
+                    encontradas[w] = d
+        return encontradas
+
+    def buscar(self, texto, estado: str = None):
+        """
+        idProducto cuyo nombre tiene, para cada palabra buscada, alguna
+        palabra a distancia dentro del presupuesto. Orden: menos errores en total,
+        luego por nombre. None si la consulta no tiene palabras de 3+ letras.
+        """
+        palabras = [w for w in _palabras(texto) if len(w) >= 3]
+        if not palabras:
+            return None
+        self.sincronizar()
+        with self._lock:
+            errores = None  # idProducto -> errores acumulados
+            for w in palabras:
+                mejor = {}
+                for cercana, d in self.cercanas(w, presupuesto(w, self.maximo)).items():
+                    for id_p in self._productos[cercana]:
+                        if d < mejor.get(id_p, self.maximo + 1):
+                            mejor[id_p] = d
+                if errores is None:
+                    errores = mejor
+                else:
+                    errores = {i: e + mejor[i] for i, e in errores.items() if i in mejor}
+                if not errores:
+                    return []
+            resultados = []
+            for id_p, e in errores.items():
+                _, est, original = self._docs[id_p]
+                if estado and est != estado:
+                    continue
+                resultados.append((e, original, id_p))
+        resultados.sort()
+        return [id_p for _, _, id_p in resultados]
+
+    def estadisticas(self) -> dict:
+        return {
+            "productos": len(self._docs),
+            "palabras": len(self._productos),
+            "variantes": len(self._borrados),
+            "version": self.version,
+            "reconstrucciones": self.reconstrucciones,
+            "actualizaciones": self.actualizaciones,
+        }
+
+
+indice = IndiceNgramas(catalogo)
+indice_difuso = IndiceDifuso(catalogo, maximo=getattr(settings, "BUSQUEDA_DISTANCIA_MAX", 2))
+
+
+def listar_productos(buscar: str, id_categoria: int = None, estado: str = None,
+                     page: int = 1, page_size: int = 100, con_total: bool = True,
+                     con_categorias: bool = False, difuso: bool = False):
+    """
+    Igual que db.sp_producto_listar / sp_producto_listar_con_categorias pero
+    resolviendo `buscar` con el índice y ordenando por relevancia
+    (difuso=True: tolerando errores de tipeo).
+    Retorna None si la búsqueda no puede resolverse aquí (usar el LIKE).
+    """
+    if difuso:
+        ids = indice_difuso.buscar(buscar, estado)
+    elif not getattr(settings, "BUSQUEDA_INDICE", True):
+        return None
+    else:
+        # Sin categorías el LIKE original solo miraba código y nombre
+        ids = indice.buscar(buscar, estado, en_categorias=con_categorias)
+    if ids is None:
+        return None
+    if id_categoria:
+        en_categoria = db.productos_de_categoria(id_categoria)
+        ids = [i for i in ids if i in en_categoria]
+
+    page = max(1, int(page or 1))
+    page_size = max(1, int(page_size or 100))
+    pagina = ids[(page - 1) * page_size:page * page_size]
+    return {
+        'data': db.productos_por_ids(pagina, con_categorias),
+        'total': len(ids) if con_total else None,
+        'page': page,
+        'pageSize': page_size,
+        'hasMore': len(ids) > page * page_size,
+    }
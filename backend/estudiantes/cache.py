@@ -0,0 +1,616 @@
+"""
+Cachés de la capa de datos con backend intercambiable (CACHE_BACKEND):
+
+  - "memoria" (por defecto): diccionario LRU dentro de cada proceso.
+  - "sqlite:///ruta/cache.sqlite3": archivo SQLite compartido por los workers de
+    una misma máquina (modo WAL).
+  - "redis://host:6379/0": cualquier servidor que hable el protocolo de Redis
+    (RESP). El cliente es mínimo y no requiere dependencias.
+
+Con un backend compartido, lo que un worker guarda lo leen los demás, y la
+invalidación se difunde con contadores compartidos (INCR), sin recorrer claves:
+  - Versiones: una versión por clave (p. ej. por producto). Cada entrada se guarda
+    con la versión vigente y deja de valer cuando otro worker la incrementa.
+  - Generaciones: clear() e invalidar_grupo() incrementan un contador que forma
+    parte de la clave. Las entradas viejas quedan huérfanas y vencen por TTL.
+  - Difusion: cola de ids cambiados para índices que viven en memoria (catálogo,
+    autocompletado). Cada worker aplica solo los cambios de los demás.
+Cada worker recuerda los contadores leídos durante CACHE_SINCRONIZAR_SEGUNDOS.
+Ese es el retraso máximo con que ve una escritura de otro worker; las propias
+las ve al instante. Si el backend falla, la caché responde como vacía y cuenta
+el error en sus estadísticas: la fuente de verdad sigue siendo la base.
+"""
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+
+# Registro de cachés por nombre (para estadísticas de monitoreo)
+CACHES = {}
+
+# Valor que retornan los backends cuando la clave no existe o venció
+FALTA = object()
+# Difusion.pendientes(): los cambios de otros workers no se pueden aplicar uno a uno
+RECARGAR = object()
+
+
+class ErrorRESP(Exception):
+    """Respuesta de error del servidor (-ERR ...) o protocolo inesperado"""
+
+
+# Errores de backend que la caché absorbe (se comporta como vacía)
+_ERRORES = (OSError, sqlite3.Error, ErrorRESP, pickle.PickleError, EOFError)
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+class BackendMemoria:
+    """LRU con TTL dentro del proceso; get/set/add/delete son O(1)"""
+
+    compartido = False
+
+    def __init__(self, max_items: int | None = None):
+        self.max_items = max_items
+        self._datos = OrderedDict()  # clave -> (expira, valor)
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def _vigente(self, clave):
+        """Entrada vigente o None (requiere el lock)"""
+        item = self._datos.get(clave)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= time.monotonic():
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return item
+
+    def _guardar(self, clave, valor, ttl):
+        self._datos[clave] = (time.monotonic() + ttl if ttl else None, valor)
+        self._datos.move_to_end(clave)
+        if self.max_items:
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def get(self, clave):
+        with self._lock:
+            item = self._vigente(clave)
+            return FALTA if item is None else item[1]
+
+    def get_many(self, claves) -> list:
+        return [self.get(c) for c in claves]
+
+    def set(self, clave, valor, ttl=None):
+        with self._lock:
+            self._guardar(clave, valor, ttl)
+
+    def add(self, clave, valor, ttl=None) -> bool:
+        with self._lock:
+            if self._vigente(clave) is not None:
+                return False
+            self._guardar(clave, valor, ttl)
+            return True
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def incr(self, clave) -> int:
+        with self._lock:
+            valor = self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return valor
+
+    def contadores(self, claves) -> list:
+        return [self._contadores.get(c, 0) for c in claves]
+
+    def vaciar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class BackendSQLite:
+    """
+    Archivo SQLite compartido entre procesos (una conexión por hilo y proceso).
+    Las entradas vencidas se purgan cada PURGA_CADA escrituras y, si se supera
+    max_filas, se descartan las escritas hace más tiempo.
+    """
+
+    compartido = True
+    PURGA_CADA = 1000
+
+    def __init__(self, ruta: str, max_filas: int = 200000, timeout: float = 5.0):
+        self.ruta = ruta
+        self.max_filas = max_filas
+        self.timeout = timeout
+        self._local = threading.local()
+        self._escrituras = 0
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            # Tras un fork no se reutiliza la conexión del proceso padre
+            con = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("CREATE TABLE IF NOT EXISTS cache "
+                        "(clave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira REAL)")
+            con.execute("CREATE TABLE IF NOT EXISTS contador "
+                        "(clave TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    @staticmethod
+    def _expira(ttl):
+        # Reloj de pared: el archivo lo comparten procesos distintos
+        return time.time() + ttl if ttl else None
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            "SELECT valor, expira FROM cache WHERE clave = ?", (clave,)).fetchone()
+        if fila is None or (fila[1] is not None and fila[1] <= time.time()):
+            return FALTA
+        return pickle.loads(fila[0])
+
+    def get_many(self, claves) -> list:
+        claves = list(claves)
+        encontrados, ahora = {}, time.time()
+        con = self._conexion()
+        for i in range(0, len(claves), 500):
+            lote = claves[i:i + 500]
+            marcadores = ", ".join("?" * len(lote))
+            for clave, valor, expira in con.execute(
+                    f"SELECT clave, valor, expira FROM cache WHERE clave IN ({marcadores})", lote):
+                if expira is None or expira > ahora:
+                    encontrados[clave] = pickle.loads(valor)
+        return [encontrados.get(c, FALTA) for c in claves]
+
+    def set(self, clave, valor, ttl=None):
+        con = self._conexion()
+        con.execute("INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)",
+                    (clave, pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), self._expira(ttl)))
+        self._escrituras += 1
+        if self._escrituras % self.PURGA_CADA == 0:
+            self.purgar()
+
+    def add(self, clave, valor, ttl=None) -> bool:
+        # Una sola sentencia (atómica): inserta, o reemplaza solo si la existente venció
+        cur = self._conexion().execute(
+            "INSERT INTO cache (clave, valor, expira) VALUES (?, ?, ?) "
+            "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira "
+            "WHERE cache.expira IS NOT NULL AND cache.expira <= ?",
+            (clave, pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), self._expira(ttl), time.time()))
+        return cur.rowcount == 1
+
+    def delete(self, clave):
+        self._conexion().execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+    def incr(self, clave) -> int:
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("INSERT INTO contador (clave, valor) VALUES (?, 1) "
+                        "ON CONFLICT(clave) DO UPDATE SET valor = valor + 1", (clave,))
+            valor, = con.execute("SELECT valor FROM contador WHERE clave = ?", (clave,)).fetchone()
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return int(valor)
+
+    def contadores(self, claves) -> list:
+        claves = list(claves)
+        marcadores = ", ".join("?" * len(claves))
+        valores = dict(self._conexion().execute(
+            f"SELECT clave, valor FROM contador WHERE clave IN ({marcadores})", claves))
+        return [int(valores.get(c, 0)) for c in claves]
+
+    def purgar(self):
+        """Quita entradas vencidas y, si sobran filas, las escritas hace más tiempo"""
+        con = self._conexion()
+        con.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?", (time.time(),))
+        total, = con.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if total > self.max_filas:
+            # INSERT OR REPLACE asigna rowid nuevo: el orden de rowid es el de escritura
+            con.execute("DELETE FROM cache WHERE rowid IN "
+                        "(SELECT rowid FROM cache ORDER BY rowid LIMIT ?)", (total - self.max_filas,))
+
+
+class BackendRedis:
+    """
+    Cliente RESP mínimo (GET/MGET/SET NX PX/DEL/INCR) sobre un socket por hilo y
+    proceso. Sirve Redis, Valkey, KeyDB o cualquier sustituto local que hable RESP.
+    El tamaño lo acota el servidor (maxmemory-policy allkeys-lru).
+    """
+
+    compartido = True
+    ESPERA_RECONEXION = 1.0
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 6379, db: int = 0,
+                 password: str | None = None, timeout: float = 2.0):
+        self._caido_hasta = 0.0
+        self.host = host
+        self.puerto = puerto
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @staticmethod
+    def _codificar(args) -> bytes:
+        partes = [b"*%d\r\n" % len(args)]
+        for a in args:
+            if not isinstance(a, bytes):
+                a = str(a).encode()
+            partes.append(b"$%d\r\n%s\r\n" % (len(a), a))
+        return b"".join(partes)
+
+    @classmethod
+    def _leer(cls, archivo):
+        linea = archivo.readline()
+        if not linea.endswith(b"\r\n"):
+            raise ConnectionError("conexión RESP cerrada")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b"+":
+            return resto.decode()
+        if tipo == b"-":
+            raise ErrorRESP(resto.decode())
+        if tipo == b":":
+            return int(resto)
+        if tipo == b"$":
+            largo = int(resto)
+            if largo < 0:
+                return None
+            dato = archivo.read(largo + 2)
+            if len(dato) != largo + 2:
+                raise ConnectionError("conexión RESP cerrada")
+            return dato[:-2]
+        if tipo == b"*":
+            largo = int(resto)
+            return None if largo < 0 else [cls._leer(archivo) for _ in range(largo)]
+        raise ErrorRESP(f"respuesta RESP inesperada: {linea[:40]!r}")
+
+    def _conectar(self):
+        sock = socket.create_connection((self.host, self.puerto), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        con = (sock, sock.makefile("rb"))
+        if self.password:
+            self._enviar(con, ("AUTH", self.password))
+        if self.db:
+            self._enviar(con, ("SELECT", self.db))
+        self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def _enviar(self, con, args):
+        con[0].sendall(self._codificar(args))
+        return self._leer(con[1])
+
+    def _cerrar(self):
+        con = getattr(self._local, "con", None)
+        self._local.con = None
+        if con is not None:
+            try:
+                con[1].close()
+                con[0].close()
+            except OSError:
+                pass
+
+    def ejecutar(self, *args):
+        """Envía un comando y retorna la respuesta; reconecta una vez si se cayó la conexión"""
+        if time.monotonic() < self._caido_hasta:
+            # Servidor caído hace poco: no esperar el timeout en cada petición
+            raise ConnectionError("servidor RESP no disponible")
+        for intento in (1, 2):
+            try:
+                con = getattr(self._local, "con", None)
+                if con is None or self._local.pid != os.getpid():
+                    con = self._conectar()
+                return self._enviar(con, args)
+            except OSError:
+                self._cerrar()
+                if intento == 2:
+                    self._caido_hasta = time.monotonic() + self.ESPERA_RECONEXION
+                    raise
+
+    @staticmethod
+    def _ms(ttl):
+        return ("PX", max(1, int(ttl * 1000))) if ttl else ()
+
+    def get(self, clave):
+        valor = self.ejecutar("GET", clave)
+        return FALTA if valor is None else pickle.loads(valor)
+
+    def get_many(self, claves) -> list:
+        claves = list(claves)
+        if not claves:
+            return []
+        return [FALTA if v is None else pickle.loads(v) for v in self.ejecutar("MGET", *claves)]
+
+    def set(self, clave, valor, ttl=None):
+        self.ejecutar("SET", clave, pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), *self._ms(ttl))
+
+    def add(self, clave, valor, ttl=None) -> bool:
+        return self.ejecutar("SET", clave, pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), "NX",
+                             *self._ms(ttl)) is not None
+
+    def delete(self, clave):
+        self.ejecutar("DEL", clave)
+
+    def incr(self, clave) -> int:
+        return int(self.ejecutar("INCR", clave))
+
+    def contadores(self, claves) -> list:
+        claves = list(claves)
+        return [int(v) if v is not None else 0 for v in self.ejecutar("MGET", *claves)]
+
+
+def crear_backend(url: str | None, max_items: int | None = None):
+    """Backend a partir de una URL: memoria, sqlite:///ruta o redis://[:clave@]host:puerto/db"""
+    if not url or url == "memoria":
+        return BackendMemoria(max_items)
+    partes = urlsplit(url)
+    if partes.scheme == "sqlite":
+        ruta = url[len("sqlite://"):]
+        if not ruta:
+            raise ValueError("CACHE_BACKEND sqlite requiere una ruta: sqlite:///ruta/cache.sqlite3")
+        return BackendSQLite(ruta)
+    if partes.scheme == "redis":
+        return BackendRedis(
+            host=partes.hostname or "127.0.0.1",
+            puerto=partes.port or 6379,
+            db=int(partes.path.strip("/") or 0),
+            password=unquote(partes.password) if partes.password else None,
+        )
+    raise ValueError(f"CACHE_BACKEND no soportado: {url}")
+
+
+_compartido = None
+_compartido_lock = threading.Lock()
+
+
+def backend_compartido():
+    """Backend compartido configurado (uno por proceso), o None si CACHE_BACKEND es memoria"""
+    global _compartido
+    if _compartido is None:
+        with _compartido_lock:
+            if _compartido is None:
+                _compartido = crear_backend(getattr(settings, "CACHE_BACKEND", "memoria"))
+    return _compartido if _compartido.compartido else None
+
+
+def _intervalo(backend, intervalo):
+    """Segundos que se recuerda un contador leído (0 si el backend es del proceso)"""
+    if not backend.compartido:
+        return 0
+    return getattr(settings, "CACHE_SINCRONIZAR_SEGUNDOS", 1.0) if intervalo is None else intervalo
+
+
+# ---------------------------
+# Cachés
+# ---------------------------
+class Versiones:
+    """
+    Contador de versión por clave (p. ej. por idProducto). Quien escribe llama
+    incrementar(); quien lee toma actual() ANTES de consultar la base y guarda el
+    resultado con esa versión, de modo que una escritura concurrente lo invalida.
+    Con backend compartido el contador es común a todos los workers.
+    """
+
+    def __init__(self, nombre: str, backend=None, intervalo: float | None = None):
+        self.nombre = nombre
+        self.backend = backend or backend_compartido() or BackendMemoria()
+        self.intervalo = _intervalo(self.backend, intervalo)
+        self._memo = {}  # clave -> (version, leida_en)
+        self._lock = threading.Lock()
+        self.errores = 0
+
+    def _clave(self, clave) -> str:
+        return f"v:{self.nombre}:{clave}"
+
+    def actual(self, clave) -> int:
+        if self.intervalo:
+            memo = self._memo.get(clave)
+            if memo is not None and time.monotonic() - memo[1] < self.intervalo:
+                return memo[0]
+        try:
+            version, = self.backend.contadores([self._clave(clave)])
+        except _ERRORES:
+            self.errores += 1
+            memo = self._memo.get(clave)
+            return memo[0] if memo is not None else 0
+        if self.intervalo:
+            self._memo[clave] = (version, time.monotonic())
+        return version
+
+    def incrementar(self, claves):
+        for c in claves:
+            try:
+                version = self.backend.incr(self._clave(c))
+            except _ERRORES:
+                self.errores += 1
+                continue
+            if self.intervalo:
+                # Este worker ve su propia escritura al instante
+                with self._lock:
+                    self._memo[c] = (version, time.monotonic())
+
+
+class CacheLRU:
+    """
+    Caché con expiración por TTL sobre el backend configurado (desalojo LRU al
+    superar max_items cuando el backend es memoria).
+    Una entrada guardada con `version` solo es válida para get() con esa misma
+    versión (ver Versiones): así se invalida sin recorrer la caché.
+    Si la clave es una tupla, su primer elemento es el grupo que descarta
+    invalidar_grupo() (p. ej. todos los ("listar", ...)).
+    """
+
+    def __init__(self, nombre: str, max_items: int = 1024, ttl: float | None = None,
+                 backend=None, intervalo: float | None = None):
+        self.nombre = nombre
+        self.max_items = max_items
+        self.ttl = ttl
+        self.backend = backend or backend_compartido() or BackendMemoria(max_items)
+        self._generaciones = Versiones(f"{nombre}:gen", self.backend, intervalo)
+        self.hits = 0
+        self.misses = 0
+        self.errores = 0
+        CACHES[nombre] = self
+
+    def _clave(self, clave) -> str:
+        grupo = clave[0] if isinstance(clave, tuple) and clave else ""
+        return (f"c:{self.nombre}:{self._generaciones.actual('*')}."
+                f"{self._generaciones.actual(grupo) if grupo != '' else 0}:{clave!r}")
+
+    def get(self, clave, default=None, version=None):
+        try:
+            item = self.backend.get(self._clave(clave))
+        except _ERRORES:
+            self.errores += 1
+            item = FALTA
+        # Guardada con otra versión: ya no vale (la siguiente set() la reemplaza)
+        if item is FALTA or item[0] != version:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return item[1]
+
+    def set(self, clave, valor, ttl: float | None = None, version=None):
+        try:
+            self.backend.set(self._clave(clave), (version, valor), self.ttl if ttl is None else ttl)
+        except _ERRORES:
+            self.errores += 1
+
+    def add(self, clave, valor, ttl: float | None = None) -> bool:
+        """Guarda solo si la clave no existe (o venció). Retorna True si la guardó."""
+        try:
+            return self.backend.add(self._clave(clave), (None, valor), self.ttl if ttl is None else ttl)
+        except _ERRORES:
+            # Sin backend no hay forma de reservar: se deja pasar
+            self.errores += 1
+            return True
+
+    def delete(self, clave):
+        try:
+            self.backend.delete(self._clave(clave))
+        except _ERRORES:
+            self.errores += 1
+
+    def invalidar_grupo(self, grupo):
+        """Descarta todas las claves (grupo, ...) en todos los workers"""
+        self._generaciones.incrementar([grupo])
+
+    def clear(self):
+        self._generaciones.incrementar(["*"])
+        if not self.backend.compartido:
+            self.backend.vaciar()
+
+    def __len__(self):
+        return len(self.backend) if not self.backend.compartido else 0
+
+    def estadisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "nombre": self.nombre,
+            "backend": type(self.backend).__name__,
+            "items": len(self.backend) if not self.backend.compartido else None,
+            "maxItems": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+            "errores": self.errores + self._generaciones.errores,
+        }
+
+
+class Difusion:
+    """
+    Difunde entre workers los cambios de un índice en memoria. Cada cambio local
+    se publica como (secuencia compartida -> ids). Los demás, al consultar
+    pendientes() (como mucho cada intervalo), aplican solo los ids de las
+    secuencias que no son suyas. Si faltan entradas (vencidas), son demasiadas
+    o alguna fue "todo", piden recarga completa.
+    Sin backend compartido no hace nada.
+    """
+
+    MAX_PENDIENTES = 1000
+
+    def __init__(self, nombre: str, backend=None, intervalo: float | None = None, ttl: float = 3600):
+        self.nombre = nombre
+        self.backend = backend or backend_compartido()
+        self.intervalo = _intervalo(self.backend, intervalo) if self.backend is not None else 0
+        self.ttl = ttl
+        self._vista = None       # última secuencia aplicada
+        self._propias = set()    # secuencias publicadas por este worker
+        self._consultada_en = 0.0
+        self._lock = threading.Lock()
+        self.errores = 0
+
+    def _clave_secuencia(self) -> str:
+        return f"d:{self.nombre}:seq"
+
+    def base(self):
+        """Marca la secuencia actual como aplicada (llamar antes de una recarga completa)"""
+        if self.backend is None:
+            return
+        try:
+            actual, = self.backend.contadores([self._clave_secuencia()])
+        except _ERRORES:
+            self.errores += 1
+            return
+        with self._lock:
+            self._vista = actual
+            self._propias = {s for s in self._propias if s > actual}
+            self._consultada_en = time.monotonic()
+
+    def publicar(self, ids=None):
+        """Avisa a los demás workers que cambiaron `ids` (None = todo)"""
+        if self.backend is None:
+            return
+        # Con el lock: pendientes() no debe ver la secuencia antes de que sea "propia"
+        with self._lock:
+            try:
+                secuencia = self.backend.incr(self._clave_secuencia())
+                self._propias.add(secuencia)
+                self.backend.set(f"d:{self.nombre}:{secuencia}",
+                                 sorted({int(i) for i in ids}) if ids is not None else None, self.ttl)
+            except _ERRORES:
+                self.errores += 1
+
+    def pendientes(self):
+        """None si no hay cambios de otros workers; RECARGAR; o el set de ids a releer"""
+        if self.backend is None or time.monotonic() - self._consultada_en < self.intervalo:
+            return None
+        with self._lock:
+            self._consultada_en = time.monotonic()
+            try:
+                actual, = self.backend.contadores([self._clave_secuencia()])
+                if self._vista is None or actual <= self._vista:
+                    self._vista = actual if self._vista is None else self._vista
+                    return None
+                ajenas = [s for s in range(self._vista + 1, actual + 1) if s not in self._propias]
+                if len(ajenas) > self.MAX_PENDIENTES:
+                    resultado = RECARGAR
+                else:
+                    resultado = set()
+                    valores = self.backend.get_many(f"d:{self.nombre}:{s}" for s in ajenas)
+                    for ids in valores:
+                        if ids is FALTA or ids is None:
+                            resultado = RECARGAR
+                            break
+                        resultado.update(ids)
+            except _ERRORES:
+                self.errores += 1
+                return None
+            self._vista = actual
+            self._propias = {s for s in self._propias if s > actual}
+            return resultado or None
@@ -0,0 +1,277 @@
+"""
+Snapshot en memoria del catálogo de productos para lecturas del POS.
+
+Guarda por producto solo lo que cambia poco (código, nombre, precios, tope de
+descuento, estado y categorías) en registros compactos con __slots__, con
+índices hash por idProducto y por código. El stock NO está en el snapshot:
+cambia con cada venta y se lee siempre de la base.
+
+El snapshot se carga completo la primera vez que se usa, se refresca por
+producto con los eventos de escritura de db.py y se recarga entero cada
+CATALOGO_TTL_SEGUNDOS. Con CACHE_BACKEND compartido cada escritura se publica
+(cache.Difusion) y los demás workers releen esos productos en la siguiente
+lectura, con a lo sumo CACHE_SINCRONIZAR_SEGUNDOS de retraso.
+Cada cambio incrementa `version`; los clientes pueden pedir solo los cambios
+desde la versión que ya tienen (cambios_desde).
+
+Es solo para lecturas: las ventas validan estado, tope de descuento y costo
+contra tbProducto en su propia consulta, porque en otros workers el snapshot
+puede estar desactualizado.
+"""
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+from . import db
+from .cache import RECARGAR, Difusion
+
+
+class Producto:
+    __slots__ = ("idProducto", "codigo", "nombre", "precioCosto", "precioVenta",
+                 "descuentoMaximoPct", "stockMinimo", "estado", "categorias")
+
+    def __init__(self, id_producto, codigo, nombre, precio_costo, precio_venta,
+                 descuento_max, stock_minimo, estado, categorias=()):
+        self.idProducto = id_producto
+        self.codigo = codigo
+        self.nombre = nombre
+        self.precioCosto = precio_costo
+        self.precioVenta = precio_venta
+        self.descuentoMaximoPct = descuento_max
+        self.stockMinimo = stock_minimo
+        self.estado = estado
+        self.categorias = categorias
+
+    def como_dict(self) -> dict:
+        d = {c: getattr(self, c) for c in self.__slots__}
+        d["categorias"] = list(self.categorias)
+        return d
+
+
+_SQL_PRODUCTOS = """
+    SELECT idProducto, codigo, nombre, precioCosto, precioVenta,
+           descuentoMaximoPct, stockMinimo, estado
+    FROM dbo.tbProducto
+"""
+
+_SQL_CATEGORIAS = """
+    SELECT pc.idProducto, c.nombre
+    FROM dbo.tbProductoCategoria pc
+    JOIN dbo.tbCategoria c ON c.idCategoria = pc.idCategoria
+"""
+
+
+def _clave_codigo(codigo) -> str:
+    return str(codigo or "").strip().lower()
+
+
+class Catalogo:
+    """Snapshot versionado con índices por id y por código (thread-safe)"""
+
+    def __init__(self, ttl: float = 300, max_cambios: int = 10000, difusion: Difusion | None = None):
+        self.ttl = ttl
+        self.difusion = difusion
+        self.version = 0
+        self._por_id = {}
+        self._por_codigo = {}
+        self._cambios = deque(maxlen=max_cambios)  # (version, idProducto)
+        # Versión desde la que _cambios está completo: un refresco agrega una entrada por
+        # id con la misma versión y el deque puede descartar solo parte de ellas
+        self._cambios_completos_desde = 0
+        self._cargado_en = None
+        self._lock = threading.RLock()
+        self.recargas = 0
+        self.refrescos = 0
+
+    # ---------------------------
+    # Construcción
+    # ---------------------------
+    @staticmethod
+    def _registro(fila, categorias):
+        id_p, codigo, nombre, costo, venta, desc_max, stock_min, estado = fila
+        return Producto(
+            int(id_p), sys.intern(str(codigo)), str(nombre),
+            float(costo or 0), float(venta or 0), float(desc_max or 0),
+            int(stock_min or 0), sys.intern(str(estado)), categorias,
+        )
+
+    def cargar_filas(self, filas, categorias_por_producto: dict):
+        """Reemplaza el snapshot completo (filas como las de _SQL_PRODUCTOS)"""
+        por_id, por_codigo = {}, {}
+        for fila in filas:
+            p = self._registro(fila, categorias_por_producto.get(int(fila[0]), ()))
+            por_id[p.idProducto] = p
+            por_codigo[_clave_codigo(p.codigo)] = p
+        with self._lock:
+            self._por_id, self._por_codigo = por_id, por_codigo
+            self.version += 1
+            # Una recarga completa invalida los deltas anteriores
+            self._cambios.clear()
+            self._cambios_completos_desde = self.version
+            self._cargado_en = time.monotonic()
+            self.recargas += 1
+
+    def recargar(self):
+        """Carga el catálogo completo desde la base (2 consultas, lectura por bloques)"""
+        if self.difusion is not None:
+            # Antes de leer: lo que se publique durante la carga se vuelve a aplicar
+            self.difusion.base()
+        with connection.cursor() as cur:
+            cur.execute(_SQL_CATEGORIAS)
+            categorias = self._agrupar_categorias(cur)
+            cur.execute(_SQL_PRODUCTOS)
+            filas = []
+            while True:
+                bloque = cur.fetchmany(5000)
+                if not bloque:
+                    break
+                filas.extend(bloque)
+        self.cargar_filas(filas, categorias)
+
+    @staticmethod
+    def _agrupar_categorias(cur):
+        agrupadas = {}
+        for id_p, nombre in cur.fetchall():
+            agrupadas.setdefault(int(id_p), []).append(sys.intern(str(nombre)))
+        return {id_p: tuple(sorted(n)) for id_p, n in agrupadas.items()}
+
+    def refrescar(self, ids):
+        """Relee de la base solo los productos `ids` (los que ya no existen se quitan)"""
+        ids = sorted({int(i) for i in ids or ()})
+        if not ids or self._cargado_en is None:
+            return
+        filas, categorias = [], {}
+        with connection.cursor() as cur:
+            for lote in db._lotes(ids, 1):
+                marcadores = ", ".join(["%s"] * len(lote))
+                cur.execute(f"{_SQL_PRODUCTOS} WHERE idProducto IN ({marcadores})", lote)
+                filas.extend(cur.fetchall())
+                cur.execute(f"{_SQL_CATEGORIAS} WHERE pc.idProducto IN ({marcadores})", lote)
+                categorias.update(self._agrupar_categorias(cur))
+        nuevos = {int(f[0]): self._registro(f, categorias.get(int(f[0]), ())) for f in filas}
+        with self._lock:
+            self.version += 1
+            for id_p in ids:
+                anterior = self._por_id.pop(id_p, None)
+                if anterior is not None:
+                    self._por_codigo.pop(_clave_codigo(anterior.codigo), None)
+                p = nuevos.get(id_p)
+                if p is not None:
+                    self._por_id[id_p] = p
+                    self._por_codigo[_clave_codigo(p.codigo)] = p
+                if len(self._cambios) == self._cambios.maxlen:
+                    self._cambios_completos_desde = self._cambios[0][0]
+                self._cambios.append((self.version, id_p))
+            self.refrescos += 1
+
+    def invalidar(self):
+        """La próxima lectura recarga el catálogo completo"""
+        with self._lock:
+            self._cargado_en = None
+
+    def cambio_local(self, ids=None):
+        """Escritura confirmada en este proceso (ids=None: todo): se aplica y se publica"""
+        if ids is None:
+            self.invalidar()
+        else:
+            self.refrescar(ids)
+        if self.difusion is not None:
+            self.difusion.publicar(ids)
+
+    def _asegurar(self):
+        if self.difusion is not None and self._cargado_en is not None:
+            cambios = self.difusion.pendientes()
+            if cambios is RECARGAR:
+                self.invalidar()
+            elif cambios:
+                self.refrescar(cambios)
+        cargado = self._cargado_en
+        if cargado is None or (self.ttl and time.monotonic() - cargado > self.ttl):
+            with self._lock:
+                cargado = self._cargado_en
+                if cargado is None or (self.ttl and time.monotonic() - cargado > self.ttl):
+                    self.recargar()
+
+    # ---------------------------
+    # Lecturas
+    # ---------------------------
+    def obtener(self, id_producto) -> Producto | None:
+        self._asegurar()
+        return self._por_id.get(int(id_producto))
+
+    def por_codigo(self, codigo) -> Producto | None:
+        self._asegurar()
+        return self._por_codigo.get(_clave_codigo(codigo))
+
+    def por_codigos(self, codigos) -> dict:
+        """
+        {codigo pedido: Producto} de los códigos encontrados. Los que no están en el
+        snapshot se buscan en la base (pueden venir de otro proceso) y se incorporan.
+        """
+        self._asegurar()
+        encontrados, faltantes = {}, []
+        for c in codigos:
+            p = self._por_codigo.get(_clave_codigo(c))
+            if p is None:
+                faltantes.append(c)
+            else:
+                encontrados[c] = p
+        if faltantes:
+            ids = db.productos_id_por_codigo([str(c).strip() for c in faltantes])
+            if ids:
+                self.refrescar(ids.values())
+                for c in faltantes:
+                    p = self._por_codigo.get(_clave_codigo(c))
+                    if p is not None:
+                        encontrados[c] = p
+        return encontrados
+
+    def productos(self) -> list:
+        self._asegurar()
+        return list(self._por_id.values())
+
+    def snapshot(self):
+        """(version, lista de productos) consistentes entre sí"""
+        self._asegurar()
+        with self._lock:
+            return self.version, list(self._por_id.values())
+
+    def cambios_desde(self, version: int):
+        """
+        (version_actual, productos cambiados, ids eliminados) desde `version`,
+        o None si el historial de cambios ya no cubre esa versión (pedir snapshot completo).
+        """
+        self._asegurar()
+        with self._lock:
+            if version == self.version:
+                return self.version, [], []
+            if version > self.version or version < self._cambios_completos_desde:
+                return None
+            ids = {id_p for v, id_p in self._cambios if v > version}
+            cambiados = [self._por_id[i] for i in ids if i in self._por_id]
+            eliminados = sorted(i for i in ids if i not in self._por_id)
+            return self.version, cambiados, eliminados
+
+    def __len__(self):
+        return len(self._por_id)
+
+    def estadisticas(self) -> dict:
+        return {
+            "productos": len(self._por_id),
+            "version": self.version,
+            "recargas": self.recargas,
+            "refrescos": self.refrescos,
+            "cambiosEnHistorial": len(self._cambios),
+        }
+
+
+catalogo = Catalogo(ttl=getattr(settings, "CATALOGO_TTL_SEGUNDOS", 300), difusion=Difusion("catalogo"))
+
+db.suscribir("producto", lambda ids=(), **_: catalogo.cambio_local(ids))
+db.suscribir("producto_categoria", lambda ids=(), **_: catalogo.cambio_local(ids))
+# Renombrar/eliminar una categoría afecta a muchos productos: recarga completa diferida
+db.suscribir("categoria", lambda **_: catalogo.cambio_local(None))
@@ -1,4 +1,15 @@
-from django.db import connection
+import base64
+import datetime
+import decimal
+import json
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import CacheLRU, Versiones
 
 def _row_to_dict(row, cols):
     return {c: row[i] for i, c in enumerate(cols)}
@@ -35,6 +46,156 @@ def get_rc_message(rc: int) -> str:
     }
     return messages.get(rc, f"Error desconocido: {rc}")
 
+# ============ EVENTOS DE ESCRITURA ============
+# Los índices y cachés en memoria (catalogo, búsqueda, cachés) se suscriben aquí en
+# lugar de que db.py los importe: así no hay imports circulares.
+_suscriptores = {}
+
+
+def suscribir(evento: str, fn):
+    """
+    Registra fn(**datos) para `evento`. Eventos:
+      'producto' (ids), 'producto_categoria' (ids, categorias), 'categoria' (ids),
+      'estudiante' (ids), 'stock' (ids: productos cuyo stock cambió por inventario o ventas),
+      'venta' (ids: ventas registradas)
+    """
+    _suscriptores.setdefault(evento, []).append(fn)
+
+
+def _notificar(evento: str, **datos):
+    """Avisa a los suscriptores cuando la escritura se confirma (al instante en autocommit)"""
+    fns = _suscriptores.get(evento)
+    if not fns:
+        return
+
+    def _despachar():
+        for fn in list(fns):
+            try:
+                fn(**datos)
+            except Exception as e:
+                print(f"Error en suscriptor de '{evento}': {e}")
+    transaction.on_commit(_despachar)
+
+
+# ============ PAGINACIÓN POR CURSOR ============
+def cursor_codificar(valores) -> str:
+    """Cursor opaco (base64 de JSON) con los valores de la última fila de una página"""
+    def _tipo(v):
+        if isinstance(v, datetime.datetime):
+            return {"dt": v.isoformat()}
+        if isinstance(v, datetime.date):
+            return {"d": v.isoformat()}
+        if isinstance(v, decimal.Decimal):
+            return {"dec": str(v)}
+        return v
+    crudo = json.dumps([_tipo(v) for v in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def cursor_decodificar(cursor: str, n: int):
+    """Inverso de cursor_codificar; lanza ValueError si el cursor no es válido"""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(crudo.decode("utf-8"))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if not isinstance(valores, list) or len(valores) != n:
+        raise ValueError("cursor inválido")
+
+    def _valor(v):
+        if isinstance(v, dict):
+            if "dt" in v:
+                return datetime.datetime.fromisoformat(v["dt"])
+            if "d" in v:
+                return datetime.date.fromisoformat(v["d"])
+            if "dec" in v:
+                return decimal.Decimal(v["dec"])
+            raise ValueError("cursor inválido")
+        return v
+    return [_valor(v) for v in valores]
+
+
+def _keyset(columnas, valores, descendente: bool, tabla: str = None):
+    """
+    Condición "después de la fila `valores`" para ORDER BY columnas (todas ASC o todas DESC).
+    (a, b) DESC -> a < %s OR (a = %s AND b < %s)
+    Con `tabla`, la última columna debe ser el id de esa tabla: el valor de las demás se lee
+    de la fila del cursor en SQL (el del cursor queda de respaldo si la fila ya no existe),
+    así un datetime redondeado al pasar por Python no rompe la igualdad.
+    """
+    op = "<" if descendente else ">"
+    col_id = columnas[-1].split(".")[-1]
+
+    def _ref(i):
+        if tabla and i < len(columnas) - 1:
+            col = columnas[i].split(".")[-1]
+            return f"COALESCE((SELECT {col} FROM {tabla} WHERE {col_id} = %s), %s)", [valores[-1], valores[i]]
+        return "%s", [valores[i]]
+
+    partes, params = [], []
+    for i, col in enumerate(columnas):
+        condiciones = []
+        for j in range(i):
+            sql_ref, p_ref = _ref(j)
+            condiciones.append(f"{columnas[j]} = {sql_ref}")
+            params.extend(p_ref)
+        sql_ref, p_ref = _ref(i)
+        condiciones.append(f"{col} {op} {sql_ref}")
+        params.extend(p_ref)
+        partes.append("(" + " AND ".join(condiciones) + ")")
+    return "(" + " OR ".join(partes) + ")", params
+
+
+# ============ PAGINACIÓN POR PÁGINA ============
+def _paginar(columnas: str, origen: str, order_by: str, params: list,
+             page: int = 1, page_size: int = 100, con_total: bool = True,
+             conteo_separado: bool = False):
+    """
+    Página OFFSET y total en una sola sentencia (COUNT(*) OVER() se evalúa antes del OFFSET).
+    columnas: lista SELECT; origen: "FROM ... WHERE ..."; order_by sin la palabra ORDER BY.
+    Con con_total=False no se cuenta (scroll infinito): total=None.
+    conteo_separado=True emula el esquema anterior (COUNT aparte + datos); solo para el benchmark.
+    Retorna {data, total, page, pageSize, hasMore}
+    """
+    page = max(1, int(page or 1))
+    page_size = max(1, int(page_size or 100))
+    contar_en_ventana = con_total and not conteo_separado
+    sql = f"""
+    SELECT {columnas}{", COUNT(*) OVER() AS _total" if contar_en_ventana else ""}
+    {origen}
+    ORDER BY {order_by}
+    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
+    """
+    total = None
+    with connection.cursor() as cur:
+        if con_total and conteo_separado:
+            cur.execute(f"SELECT COUNT(*) {origen}", params)
+            total = cur.fetchone()[0]
+        # Una fila extra para saber si hay más sin contar
+        cur.execute(sql, list(params) + [(page - 1) * page_size, page_size + 1])
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        if contar_en_ventana:
+            if rows:
+                total = rows[0]["_total"]
+            elif page == 1:
+                total = 0
+            else:
+                # Página más allá del final: la ventana no trae filas, se cuenta aparte
+                cur.execute(f"SELECT COUNT(*) {origen}", params)
+                total = cur.fetchone()[0]
+    if contar_en_ventana:
+        for r in rows:
+            del r["_total"]
+    return {
+        'data': rows[:page_size],
+        'total': total,
+        'page': page,
+        'pageSize': page_size,
+        'hasMore': len(rows) > page_size,
+    }
+
+
 # ============ INSERTAR ============
 def insertar_estudiante(nombres: str, apellidos: str, correo: str, telefono: str):
     """
@@ -73,6 +234,86 @@ def listar_estudiantes():
     cols = ["idEstudiante", "nombres", "apellidos", "correo", "telefono", "fechaRegistro"]
     return [_row_to_dict(r, cols) for r in rows]
 
+ESTUDIANTES_ORDEN = ("idEstudiante", "nombres", "apellidos", "correo", "telefono", "fechaRegistro")
+
+
+def listar_estudiantes_pagina(buscar: str = None, correo: str = None, desde=None, hasta=None,
+                              orden: str = "idEstudiante", descendente: bool = False,
+                              page: int = None, page_size: int = 50, cursor: str = None,
+                              con_total: bool = True):
+    """
+    Listado paginado de estudiantes: {data, total, next}.
+    - buscar: nombres/apellidos (LIKE), correo: LIKE, desde/hasta: rango de fechaRegistro (date)
+    - orden: una de ESTUDIANTES_ORDEN; idEstudiante desempata para que el orden sea estable
+    - cursor (keyset, por defecto) o page (OFFSET, compatibilidad); `next` siempre es el
+      cursor de la siguiente página o None si no hay más
+    - total se cuenta en la misma sentencia (COUNT(*) OVER) y se omite con con_total=False;
+      el conteo recorre todo el filtro, por eso en páginas con cursor conviene omitirlo
+    Lanza ValueError si el orden o el cursor no son válidos.
+    """
+    if orden not in ESTUDIANTES_ORDEN:
+        raise ValueError("orden inválido")
+    columnas = [orden] if orden == "idEstudiante" else [orden, "idEstudiante"]
+
+    where, params = ["1=1"], []
+    if buscar:
+        where.append("(nombres LIKE %s OR apellidos LIKE %s OR CONCAT(nombres, ' ', apellidos) LIKE %s)")
+        params.extend([f"%{buscar}%"] * 3)
+    if correo:
+        where.append("correo LIKE %s")
+        params.append(f"%{correo}%")
+    if desde:
+        where.append("fechaRegistro >= %s")
+        params.append(desde)
+    if hasta:
+        where.append("fechaRegistro < DATEADD(DAY, 1, CAST(%s AS DATE))")
+        params.append(hasta)
+
+    total_col = ", COUNT(*) OVER() AS total" if con_total else ""
+    direccion = "DESC" if descendente else "ASC"
+    order_by = ", ".join(f"{c} {direccion}" for c in columnas)
+
+    sql = f"""
+    WITH f AS (
+      SELECT idEstudiante, nombres, apellidos, correo, telefono, fechaRegistro{total_col}
+      FROM dbo.tbEstudiante
+      WHERE {" AND ".join(where)}
+    )
+    SELECT {{top}} * FROM f
+    WHERE {{keyset}}
+    ORDER BY {order_by}
+    {{offset}}
+    """
+    top, keyset, offset = f"TOP ({int(page_size) + 1})", "1=1", ""
+    if cursor and not page:
+        keyset, p_keyset = _keyset(columnas, cursor_decodificar(cursor, len(columnas)), descendente,
+                                    tabla="dbo.tbEstudiante")
+        params.extend(p_keyset)
+    elif page:
+        top = ""
+        offset = "OFFSET %s ROWS FETCH NEXT %s ROWS ONLY"
+        params.extend([(int(page) - 1) * int(page_size), int(page_size) + 1])
+    sql = sql.format(top=top, keyset=keyset, offset=offset)
+
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    total = None
+    if con_total:
+        # Sin filas en una página intermedia el total no se puede leer de la ventana
+        if rows:
+            total = rows[0]["total"]
+        elif not cursor and int(page or 1) == 1:
+            total = 0
+    for r in rows:
+        r.pop("total", None)
+    data = rows[:page_size]
+    siguiente = cursor_codificar([data[-1][c] for c in columnas]) if len(rows) > page_size else None
+    return {"data": data, "total": total, "next": siguiente}
+
+
 def obtener_estudiante_por_id(id_est: int):
     """
     Consulta directa a la tabla (solo para detalle puntual).
@@ -236,8 +477,66 @@ def sp_est_insertar(n, a, c, t, id_usuario_accion: int):
     with connection.cursor() as cur:
         cur.execute(sql, [n, a, c, t, id_usuario_accion])
         rc, new_id = cur.fetchone()
+    if rc == RC_OK and new_id:
+        _notificar("estudiante", ids=[int(new_id)])
     return int(rc), int(new_id or 0)
 
+def estudiantes_correos_existentes(correos: list):
+    """Retorna el conjunto (en minúsculas) de los correos que ya están registrados"""
+    existentes = set()
+    with connection.cursor() as cur:
+        for lote in _lotes(list(correos), 1):
+            marcadores = ", ".join(["%s"] * len(lote))
+            cur.execute(f"SELECT correo FROM dbo.tbEstudiante WHERE correo IN ({marcadores})", lote)
+            existentes.update(c.lower() for c, in cur.fetchall())
+    return existentes
+
+
+def sp_est_insertar_lote(estudiantes: list, id_usuario_accion: int):
+    """
+    Inserta muchos estudiantes con sp_InsertarEstudiante agrupando las llamadas en
+    batches (cada llamada sigue registrando su bitácora con @idUsuarioAccion).
+    estudiantes: lista de (nombres, apellidos, correo, telefono)
+    Los correos ya registrados o repetidos en la lista responden rc 2 sin llegar al SP.
+    Retorna una lista (mismo orden) de (rc, idNuevo)
+    """
+    resultados = [None] * len(estudiantes)
+    vistos = estudiantes_correos_existentes([e[2] for e in estudiantes if e[2]])
+    pendientes, llamadas = [], []
+    for i, (n, a, c, t) in enumerate(estudiantes):
+        if c and c.lower() in vistos:
+            resultados[i] = (RC_DUPLICADO, 0)
+            continue
+        if c:
+            vistos.add(c.lower())
+        pendientes.append(i)
+        llamadas.append((
+            "EXEC @rc = dbo.sp_InsertarEstudiante @nombres=%s, @apellidos=%s, @correo=%s, "
+            "@telefono=%s, @idUsuarioAccion=%s, @idNuevo=@id OUTPUT;",
+            [n, a, c, t, id_usuario_accion],
+        ))
+
+    try:
+        rcs = _ejecutar_sp_por_lotes(llamadas)
+    except Exception as e:
+        # Un error dentro del batch lo aborta: se repite llamada por llamada
+        print(f"Error en sp_est_insertar_lote, se reintenta por fila: {e}")
+        rcs = []
+        for i in pendientes:
+            try:
+                rcs.append(sp_est_insertar(*estudiantes[i], id_usuario_accion))
+            except Exception as e_fila:
+                print(f"Error insertando estudiante: {e_fila}")
+                rcs.append((RC_ERROR_GENERAL, 0))
+
+    for i, res in zip(pendientes, rcs):
+        resultados[i] = res
+    creados = [int(id_nuevo) for rc, id_nuevo in resultados if rc == RC_OK and id_nuevo]
+    if creados:
+        _notificar("estudiante", ids=creados)
+    return resultados
+
+
 def sp_est_actualizar(id_est: int, n, a, c, t, id_usuario_accion: int):
     sql = """
     DECLARE @rc INT;
@@ -249,6 +548,8 @@ def sp_est_actualizar(id_est: int, n, a, c, t, id_usuario_accion: int):
     with connection.cursor() as cur:
         cur.execute(sql, [id_est, n, a, c, t, id_usuario_accion])
         rc, = cur.fetchone()
+    if rc == RC_OK:
+        _notificar("estudiante", ids=[int(id_est)])
     return int(rc)
 
 def sp_est_eliminar(id_est: int, id_usuario_accion: int):
@@ -261,6 +562,8 @@ def sp_est_eliminar(id_est: int, id_usuario_accion: int):
     with connection.cursor() as cur:
         cur.execute(sql, [id_est, id_usuario_accion])
         rc, = cur.fetchone()
+    if rc == RC_OK:
+        _notificar("estudiante", ids=[int(id_est)])
     return int(rc)
 
 
@@ -395,12 +698,7 @@ def actualizar_contrasena(id_usuario: int, pwd_actual: str, pwd_nueva: str, pwd_
 # -----------------------
 # Reportes
 # -----------------------
-def rep_accesos(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None, limit=500, offset=0):
-    """
-    estado: None = todos, True = éxitos, False = fallos
-    accion: 'login' | 'logout' | None
-    f_ini/f_fin: 'YYYY-MM-DD' (inclusive f_ini, exclusivo f_fin +1 día si quieres exacto por app)
-    """
+def _filtros_accesos(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None):
     where = []
     params = []
 
@@ -419,18 +717,33 @@ def rep_accesos(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None,
     if f_fin:
         where.append("a.fechaHora < DATEADD(day, 1, %s)")
         params.append(f_fin)
+    return where, params
 
-    sql = f"""
-    SELECT a.idAcceso,
+
+_SQL_ACCESOS = """
+    SELECT {top} a.idAcceso,
            COALESCE(u.usuario, a.usuarioTxt) AS usuario,
            a.fechaHora, a.exito, a.accion, a.ip, a.dispositivo, a.motivo,
            u.estado AS estadoUsuario                -- <--- NUEVO
     FROM dbo.tbBitacoraAcceso a
     LEFT JOIN dbo.tbUsuario u ON u.idUsuario = a.idUsuario
-    {"WHERE " + " AND ".join(where) if where else ""}
+    {where}
     ORDER BY a.fechaHora DESC, a.idAcceso DESC
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
+    {offset}
+"""
+
+
+def rep_accesos(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None, limit=500, offset=0):
     """
+    estado: None = todos, True = éxitos, False = fallos
+    accion: 'login' | 'logout' | None
+    f_ini/f_fin: 'YYYY-MM-DD' (inclusive f_ini, exclusivo f_fin +1 día si quieres exacto por app)
+    """
+    where, params = _filtros_accesos(usuario, estado, f_ini, f_fin, accion)
+    sql = _SQL_ACCESOS.format(
+        top="", where="WHERE " + " AND ".join(where) if where else "",
+        offset="OFFSET %s ROWS FETCH NEXT %s ROWS ONLY",
+    )
     params += [offset, limit]
     with connection.cursor() as cur:
         cur.execute(sql, params)
@@ -438,12 +751,41 @@ def rep_accesos(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None,
         cols = [c[0] for c in cur.description]
     return [dict(zip(cols, r)) for r in rows]
 
-# ------- Bitácora de Transacciones (con filtros) -------
-def rep_transacciones(usuario=None, entidad=None, operacion=None, f_ini=None, f_fin=None, limit=500, offset=0):
+
+def rep_accesos_pagina(usuario=None, estado=None, f_ini=None, f_fin=None, accion=None,
+                       limit=500, cursor=None):
     """
-    entidad: 'tbUsuario' | 'tbEstudiante' | None
-    operacion: 'INSERT','UPDATE','DELETE','CREATE','BLOCK','UNBLOCK','CHANGE_PASSWORD' | None
+    Igual que rep_accesos pero paginado por cursor sobre (fechaHora, idAcceso) DESC:
+    cualquier página cuesta lo mismo y no se desplaza cuando llegan accesos nuevos.
+    Retorna {data, next}; lanza ValueError si el cursor no es válido.
     """
+    where, params = _filtros_accesos(usuario, estado, f_ini, f_fin, accion)
+    return _pagina_cursor(_SQL_ACCESOS, where, params, ["a.fechaHora", "a.idAcceso"],
+                            "dbo.tbBitacoraAcceso", limit, cursor)
+
+
+def _pagina_cursor(plantilla, where, params, columnas, tabla, limit, cursor):
+    """
+    Página keyset en orden DESC: plantilla con {top}, {where} y {offset}, columnas del
+    ORDER BY (la última es el id de `tabla`). Retorna {data, next}.
+    """
+    limit = int(limit)
+    if cursor:
+        keyset, p_keyset = _keyset(columnas, cursor_decodificar(cursor, len(columnas)), True, tabla=tabla)
+        where = where + [keyset]
+        params = params + p_keyset
+    sql = plantilla.format(top=f"TOP ({limit + 1})", where="WHERE " + " AND ".join(where) if where else "", offset="")
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+    data = rows[:limit]
+    claves = [c.split(".")[-1] for c in columnas]
+    siguiente = cursor_codificar([data[-1][c] for c in claves]) if len(rows) > limit else None
+    return {"data": data, "next": siguiente}
+
+# ------- Bitácora de Transacciones (con filtros) -------
+def _filtros_transacciones(usuario=None, entidad=None, operacion=None, f_ini=None, f_fin=None):
     where, params = [], []
     if usuario:
         where.append("u.usuario = %s")
@@ -460,17 +802,31 @@ def rep_transacciones(usuario=None, entidad=None, operacion=None, f_ini=None, f_
     if f_fin:
         where.append("t.fechaHora < DATEADD(day, 1, %s)")
         params.append(f_fin)
+    return where, params
 
-    sql = f"""
-    SELECT t.idTransaccion, u.usuario, t.fechaHora, t.entidad, t.operacion, t.idAfectado,
+
+_SQL_TRANSACCIONES = """
+    SELECT {top} t.idTransaccion, u.usuario, t.fechaHora, t.entidad, t.operacion, t.idAfectado,
            t.datosAnterior, t.datosNuevo,
            u.estado AS estadoUsuario                -- <--- NUEVO
     FROM dbo.tbBitacoraTransacciones t
     JOIN dbo.tbUsuario u ON u.idUsuario = t.idUsuario
-    {"WHERE " + " AND ".join(where) if where else ""}
+    {where}
     ORDER BY t.fechaHora DESC, t.idTransaccion DESC
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
+    {offset}
+"""
+
+
+def rep_transacciones(usuario=None, entidad=None, operacion=None, f_ini=None, f_fin=None, limit=500, offset=0):
     """
+    entidad: 'tbUsuario' | 'tbEstudiante' | None
+    operacion: 'INSERT','UPDATE','DELETE','CREATE','BLOCK','UNBLOCK','CHANGE_PASSWORD' | None
+    """
+    where, params = _filtros_transacciones(usuario, entidad, operacion, f_ini, f_fin)
+    sql = _SQL_TRANSACCIONES.format(
+        top="", where="WHERE " + " AND ".join(where) if where else "",
+        offset="OFFSET %s ROWS FETCH NEXT %s ROWS ONLY",
+    )
     params += [offset, limit]
     with connection.cursor() as cur:
         cur.execute(sql, params)
@@ -478,6 +834,14 @@ def rep_transacciones(usuario=None, entidad=None, operacion=None, f_ini=None, f_
         cols = [c[0] for c in cur.description]
     return [dict(zip(cols, r)) for r in rows]
 
+
+def rep_transacciones_pagina(usuario=None, entidad=None, operacion=None, f_ini=None, f_fin=None,
+                             limit=500, cursor=None):
+    """Igual que rep_transacciones, con cursor sobre (fechaHora, idTransaccion) DESC: {data, next}"""
+    where, params = _filtros_transacciones(usuario, entidad, operacion, f_ini, f_fin)
+    return _pagina_cursor(_SQL_TRANSACCIONES, where, params, ["t.fechaHora", "t.idTransaccion"],
+                            "dbo.tbBitacoraTransacciones", limit, cursor)
+
 # ------- Vistas: última conexión y tiempo promedio -------
 def vw_ultima_conexion():
     with connection.cursor() as cur:
@@ -547,6 +911,9 @@ def sp_categoria_crear(id_usuario: int, nombre: str, estado: str = 'activa'):
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, nombre, estado])
         rc, id_cat = cur.fetchone()
+    if rc == 0:
+        _invalidar_categorias()
+        _notificar("categoria", ids=[int(id_cat)])
     return int(rc), int(id_cat or 0)
 
 
@@ -561,6 +928,10 @@ def sp_categoria_actualizar(id_usuario: int, id_categoria: int, nombre: str, est
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, id_categoria, nombre, estado])
         rc, = cur.fetchone()
+    if rc == 0:
+        _invalidar_categorias([id_categoria])
+        _invalidar_categorias_de_productos()
+        _notificar("categoria", ids=[id_categoria])
     return int(rc)
 
 
@@ -575,23 +946,71 @@ def sp_categoria_eliminar(id_usuario: int, id_categoria: int, modo: str = 'soft'
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, id_categoria, modo])
         rc, = cur.fetchone()
+    if rc == 0:
+        _invalidar_categorias([id_categoria])
+        _invalidar_categorias_de_productos()
+        _notificar("categoria", ids=[id_categoria])
     return int(rc)
 
 
+# Caché de lecturas de categorías: cambian muy poco y casi todas las pantallas de
+# productos las piden. Se invalida al escribir (en la misma petición) y otra vez al
+# confirmar la transacción (eventos), para que un lector concurrente no deje
+# guardado el dato previo. Con CACHE_BACKEND compartido la invalidación llega a los
+# demás workers en CACHE_SINCRONIZAR_SEGUNDOS; en memoria, el TTL acota la deriva.
+_cache_categorias = CacheLRU(
+    "categorias",
+    max_items=getattr(settings, "CACHE_CATEGORIAS_MAX", 256),
+    ttl=getattr(settings, "CACHE_CATEGORIAS_TTL_SEGUNDOS", 3600),
+)
+_SIN_FILA = object()
+
+
+def _invalidar_categorias(ids=None):
+    """
+    Descarta los listados (cualquier cambio puede moverlos de página) y el
+    detalle de las categorías `ids` (None = todas)
+    """
+    if ids is None:
+        _cache_categorias.clear()
+        return
+    _cache_categorias.invalidar_grupo("listar")
+    for id_categoria in ids:
+        _cache_categorias.delete(("obtener", int(id_categoria)))
+
+
+suscribir("categoria", lambda ids=(), **_: _invalidar_categorias())
+suscribir("producto_categoria", lambda categorias=(), **_: _invalidar_categorias(set(categorias or ())))
+
+
 def sp_categoria_obtener(id_categoria: int):
-    """Obtiene una categoría por ID"""
+    """Obtiene una categoría por ID (con caché)"""
+    clave = ("obtener", int(id_categoria))
+    fila = _cache_categorias.get(clave, _SIN_FILA)
+    if fila is not _SIN_FILA:
+        return dict(fila) if fila else None
     sql = "EXEC dbo.sp_Categoria_Obtener @idCategoria=%s"
     with connection.cursor() as cur:
         cur.execute(sql, [id_categoria])
         row = cur.fetchone()
-        if not row:
-            return None
-        cols = [c[0] for c in cur.description]
-    return dict(zip(cols, row))
+        fila = dict(zip([c[0] for c in cur.description], row)) if row else None
+    _cache_categorias.set(clave, fila)
+    return dict(fila) if fila else None
+
+
+def sp_categoria_listar(buscar: str = None, solo_activas: bool = False, page: int = 1, page_size: int = 100,
+                        con_total: bool = True, conteo_separado: bool = False):
+    """Lista categorías con paginación (con caché por parámetros)"""
+    clave = ("listar", (buscar or "").strip().lower(), bool(solo_activas), int(page or 1),
+             int(page_size or 100), bool(con_total), bool(conteo_separado))
+    result = _cache_categorias.get(clave)
+    if result is None:
+        result = _sp_categoria_listar_bd(buscar, solo_activas, page, page_size, con_total, conteo_separado)
+        _cache_categorias.set(clave, result)
+    return {**result, 'data': [dict(r) for r in result['data']]}
 
 
-def sp_categoria_listar(buscar: str = None, solo_activas: bool = False, page: int = 1, page_size: int = 100):
-    """Lista categorías con paginación (acceso directo optimizado)"""
+def _sp_categoria_listar_bd(buscar, solo_activas, page, page_size, con_total, conteo_separado=False):
     where = ["1=1"]
     params = []
     
@@ -602,43 +1021,57 @@ def sp_categoria_listar(buscar: str = None, solo_activas: bool = False, page: in
         where.append("nombre LIKE %s")
         params.append(f'%{buscar}%')
     
-    where_clause = " AND ".join(where)
-    
-    # Contar total
-    sql_count = f"SELECT COUNT(*) FROM dbo.tbCategoria WHERE {where_clause}"
-    
-    # Obtener datos paginados
-    sql_data = f"""
-    SELECT idCategoria, nombre, estado, fechaCreacion
-    FROM dbo.tbCategoria
-    WHERE {where_clause}
-    ORDER BY nombre
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
-    """
-    
-    with connection.cursor() as cur:
-        # Total
-        cur.execute(sql_count, params)
-        total = cur.fetchone()[0]
-        
-        # Datos
-        offset = (page - 1) * page_size
-        cur.execute(sql_data, params + [offset, page_size])
-        rows = cur.fetchall()
-        cols = [c[0] for c in cur.description]
-        data = [dict(zip(cols, r)) for r in rows]
-    
-    return {
-        'data': data,
-        'total': total,
-        'page': page,
-        'pageSize': page_size
-    }
+    return _paginar(
+        "idCategoria, nombre, estado, fechaCreacion",
+        f"FROM dbo.tbCategoria WHERE {' AND '.join(where)}",
+        "nombre, idCategoria", params, page, page_size, con_total, conteo_separado,
+    )
 
 
 # -----------------------
 # PRODUCTOS
 # -----------------------
+# Caché de detalle por producto (sp_producto_obtener / sp_producto_categoria_listar).
+# Cada escritura que toca un producto incrementa su versión antes de responder: quien
+# escribió nunca relee un stock viejo. El evento al confirmar la vuelve a incrementar
+# para descartar lo que un lector concurrente haya guardado mientras tanto. Con
+# CACHE_BACKEND compartido la versión es común a todos los workers; en memoria, el
+# TTL acota la deriva frente a escrituras de otros procesos.
+_cache_productos = CacheLRU(
+    "productos",
+    max_items=getattr(settings, "CACHE_PRODUCTOS_MAX", 5000),
+    ttl=getattr(settings, "CACHE_PRODUCTOS_TTL_SEGUNDOS", 30),
+)
+_versiones_producto = Versiones("productos")
+
+
+def _tocar_productos(ids):
+    """Invalida el detalle en caché de los productos `ids`"""
+    _versiones_producto.incrementar({int(i) for i in ids or ()})
+
+
+def _leer_producto(tipo: str, id_producto: int, cargar):
+    """Lectura con caché versionada: cargar(id_producto) solo si no hay entrada vigente"""
+    id_producto = int(id_producto)
+    # La versión se toma antes de leer la base: una escritura en medio la deja inválida
+    version = _versiones_producto.actual(id_producto)
+    valor = _cache_productos.get((tipo, id_producto), _SIN_FILA, version)
+    if valor is _SIN_FILA:
+        valor = cargar(id_producto)
+        _cache_productos.set((tipo, id_producto), valor, version=version)
+    return valor
+
+
+def _invalidar_categorias_de_productos():
+    """Renombrar o eliminar una categoría cambia las listas de categorías de sus productos"""
+    _cache_productos.invalidar_grupo("categorias")
+
+
+for _evento in ("producto", "producto_categoria", "stock"):
+    suscribir(_evento, lambda ids=(), **_: _tocar_productos(ids))
+suscribir("categoria", lambda **_: _invalidar_categorias_de_productos())
+
+
 def sp_producto_crear(id_usuario: int, codigo: str, nombre: str, descripcion: str = None,
                      precio_costo: float = 0, precio_venta: float = 0, stock_actual: int = 0, 
                      stock_minimo: int = 0, descuento_maximo_pct: float = 0, estado: str = 'activo'):
@@ -667,6 +1100,9 @@ def sp_producto_crear(id_usuario: int, codigo: str, nombre: str, descripcion: st
         with connection.cursor() as cur:
             cur.execute(sql_update, [stock_actual, id_prod])
     
+    if rc == 0:
+        _tocar_productos([int(id_prod)])
+        _notificar("producto", ids=[int(id_prod)])
     return int(rc), int(id_prod or 0)
 
 
@@ -696,6 +1132,8 @@ def sp_producto_actualizar(id_usuario: int, id_producto: int, codigo: str, nombr
         sql_update = "UPDATE dbo.tbProducto SET stockActual = %s WHERE idProducto = %s"
         with connection.cursor() as cur:
             cur.execute(sql_update, [stock_actual, id_producto])
+        _tocar_productos([id_producto])
+        _notificar("producto", ids=[id_producto])
     
     return int(rc)
 
@@ -711,11 +1149,19 @@ def sp_producto_eliminar(id_usuario: int, id_producto: int, modo: str = 'soft'):
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, id_producto, modo])
         rc, = cur.fetchone()
+    if rc == 0:
+        _tocar_productos([id_producto])
+        _notificar("producto", ids=[id_producto])
     return int(rc)
 
 
 def sp_producto_obtener(id_producto: int):
-    """Obtiene un producto por ID"""
+    """Obtiene un producto por ID (con caché versionada)"""
+    fila = _leer_producto("obtener", id_producto, _sp_producto_obtener_bd)
+    return dict(fila) if fila else None
+
+
+def _sp_producto_obtener_bd(id_producto: int):
     sql = "EXEC dbo.sp_Producto_Obtener @idProducto=%s"
     with connection.cursor() as cur:
         cur.execute(sql, [id_producto])
@@ -727,7 +1173,8 @@ def sp_producto_obtener(id_producto: int):
 
 
 def sp_producto_listar(buscar: str = None, id_categoria: int = None, estado: str = None,
-                      page: int = 1, page_size: int = 100):
+                      page: int = 1, page_size: int = 100, con_total: bool = True,
+                      conteo_separado: bool = False):
     """Lista productos con paginación (acceso directo optimizado)"""
     where = ["1=1"]
     params = []
@@ -744,44 +1191,17 @@ def sp_producto_listar(buscar: str = None, id_categoria: int = None, estado: str
         where.append("EXISTS(SELECT 1 FROM dbo.tbProductoCategoria pc WHERE pc.idProducto=p.idProducto AND pc.idCategoria=%s)")
         params.append(id_categoria)
     
-    where_clause = " AND ".join(where)
-    
-    sql_count = f"""
-    SELECT COUNT(DISTINCT p.idProducto)
-    FROM dbo.tbProducto p
-    WHERE {where_clause}
-    """
-    
-    sql_data = f"""
-    SELECT DISTINCT p.*
-    FROM dbo.tbProducto p
-    WHERE {where_clause}
-    ORDER BY p.nombre
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
-    """
-    
-    with connection.cursor() as cur:
-        # Total
-        cur.execute(sql_count, params)
-        total = cur.fetchone()[0]
-        
-        # Datos
-        offset = (page - 1) * page_size
-        cur.execute(sql_data, params + [offset, page_size])
-        rows = cur.fetchall()
-        cols = [c[0] for c in cur.description]
-        data = [dict(zip(cols, r)) for r in rows]
-    
-    return {
-        'data': data,
-        'total': total,
-        'page': page,
-        'pageSize': page_size
-    }
+    # Sin JOIN no hay filas repetidas: DISTINCT solo agregaba un sort
+    return _paginar(
+        "p.*",
+        f"FROM dbo.tbProducto p WHERE {' AND '.join(where)}",
+        "p.nombre, p.idProducto", params, page, page_size, con_total, conteo_separado,
+    )
 
 
 def sp_producto_listar_con_categorias(buscar: str = None, id_categoria: int = None,
-                                      estado: str = None, page: int = 1, page_size: int = 100):
+                                      estado: str = None, page: int = 1, page_size: int = 100,
+                                      con_total: bool = True, conteo_separado: bool = False):
     """Lista productos con categorías concatenadas usando vista"""
     where = ["1=1"]
     params = []
@@ -798,40 +1218,130 @@ def sp_producto_listar_con_categorias(buscar: str = None, id_categoria: int = No
         where.append("EXISTS(SELECT 1 FROM dbo.tbProductoCategoria pc WHERE pc.idProducto=v.idProducto AND pc.idCategoria=%s)")
         params.append(id_categoria)
     
-    where_clause = " AND ".join(where)
-    
-    sql_count = f"""
-    SELECT COUNT(*)
-    FROM dbo.vwProductoConCategorias v
-    WHERE {where_clause}
-    """
-    
-    sql_data = f"""
-    SELECT v.*
-    FROM dbo.vwProductoConCategorias v
-    WHERE {where_clause}
-    ORDER BY v.nombre
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
-    """
-    
+    return _paginar(
+        "v.*",
+        f"FROM dbo.vwProductoConCategorias v WHERE {' AND '.join(where)}",
+        "v.nombre, v.idProducto", params, page, page_size, con_total, conteo_separado,
+    )
+
+
+def productos_por_ids(ids: list, con_categorias: bool = False):
+    """Filas de productos (tbProducto o vwProductoConCategorias) en el orden de `ids`"""
+    origen = "dbo.vwProductoConCategorias" if con_categorias else "dbo.tbProducto"
+    por_id = {}
     with connection.cursor() as cur:
-        # Total
-        cur.execute(sql_count, params)
-        total = cur.fetchone()[0]
-        
-        # Datos
-        offset = (page - 1) * page_size
-        cur.execute(sql_data, params + [offset, page_size])
-        rows = cur.fetchall()
-        cols = [c[0] for c in cur.description]
-        data = [dict(zip(cols, r)) for r in rows]
-    
-    return {
-        'data': data,
-        'total': total,
-        'page': page,
-        'pageSize': page_size
-    }
+        for lote in _lotes(list(ids), 1):
+            marcadores = ", ".join(["%s"] * len(lote))
+            cur.execute(f"SELECT * FROM {origen} WHERE idProducto IN ({marcadores})", lote)
+            cols = [c[0] for c in cur.description]
+            for r in cur.fetchall():
+                fila = dict(zip(cols, r))
+                por_id[fila["idProducto"]] = fila
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def productos_de_categoria(id_categoria: int):
+    """Conjunto de idProducto asignados a una categoría"""
+    with connection.cursor() as cur:
+        cur.execute("SELECT idProducto FROM dbo.tbProductoCategoria WHERE idCategoria = %s", [id_categoria])
+        return {int(r[0]) for r in cur.fetchall()}
+
+
+def productos_id_por_codigo(codigos: list):
+    """Retorna {codigo en minúsculas: idProducto} de los códigos que existen"""
+    existentes = {}
+    with connection.cursor() as cur:
+        for lote in _lotes(list(codigos), 1):
+            marcadores = ", ".join(["%s"] * len(lote))
+            cur.execute(f"SELECT codigo, idProducto FROM dbo.tbProducto WHERE codigo IN ({marcadores})", lote)
+            for codigo, id_prod in cur.fetchall():
+                existentes[codigo.lower()] = int(id_prod)
+    return existentes
+
+
+def stock_por_producto(ids: list):
+    """Stock actual (lectura directa, sin caché) de varios productos: {idProducto: stockActual}"""
+    stock = {}
+    with connection.cursor() as cur:
+        for lote in _lotes(sorted(set(ids)), 1):
+            marcadores = ", ".join(["%s"] * len(lote))
+            cur.execute(f"SELECT idProducto, stockActual FROM dbo.tbProducto WHERE idProducto IN ({marcadores})", lote)
+            for id_prod, stock_actual in cur.fetchall():
+                stock[int(id_prod)] = int(stock_actual or 0)
+    return stock
+
+
+_SQL_PRODUCTO_CREAR = """
+EXEC @rc = dbo.sp_Producto_Crear
+  @idUsuario=%s, @codigo=%s, @nombre=%s, @descripcion=%s,
+  @precioCosto=%s, @precioVenta=%s, @stockMinimo=%s,
+  @descuentoMaximoPct=%s, @estado=%s, @idProducto=@id OUTPUT;"""
+
+_SQL_PRODUCTO_ACTUALIZAR = """
+SET @id = %s;
+EXEC @rc = dbo.sp_Producto_Actualizar
+  @idUsuario=%s, @idProducto=@id, @codigo=%s, @nombre=%s, @descripcion=%s,
+  @precioCosto=%s, @precioVenta=%s, @stockMinimo=%s,
+  @descuentoMaximoPct=%s, @estado=%s;"""
+
+
+def sp_producto_importar_lote(id_usuario: int, productos: list):
+    """
+    Crea o actualiza (por código) muchos productos con las mismas reglas de
+    sp_Producto_Crear / sp_Producto_Actualizar, agrupando las llamadas en batches.
+    productos: dicts {codigo, nombre, descripcion, precioCosto, precioVenta,
+                      stockMinimo, descuentoMaximoPct, estado, stockActual?}
+    stockActual solo se aplica a productos nuevos (carga inicial); en los existentes
+    el stock no se toca.
+    Retorna una lista (mismo orden) de (rc, idProducto, creado: bool)
+    """
+    existentes = productos_id_por_codigo([p['codigo'] for p in productos])
+    llamadas = []
+    for p in productos:
+        campos = [p['nombre'], p.get('descripcion') or '', p['precioCosto'], p['precioVenta'],
+                  p['stockMinimo'], p['descuentoMaximoPct'], p['estado']]
+        id_prod = existentes.get(p['codigo'].lower())
+        if id_prod:
+            llamadas.append((_SQL_PRODUCTO_ACTUALIZAR, [id_prod, id_usuario, p['codigo']] + campos))
+        else:
+            llamadas.append((_SQL_PRODUCTO_CREAR, [id_usuario, p['codigo']] + campos))
+
+    try:
+        rcs = _ejecutar_sp_por_lotes(llamadas)
+    except Exception as e:
+        # Un error dentro del batch lo aborta: se repite llamada por llamada
+        print(f"Error en sp_producto_importar_lote, se reintenta por fila: {e}")
+        rcs = []
+        for llamada in llamadas:
+            try:
+                rcs.extend(_ejecutar_sp_por_lotes([llamada]))
+            except Exception as e_fila:
+                print(f"Error importando producto: {e_fila}")
+                rcs.append((RC_ERROR_GENERAL, 0))
+
+    resultados = []
+    stock_inicial = []
+    for p, (rc, id_prod) in zip(productos, rcs):
+        creado = p['codigo'].lower() not in existentes
+        if rc == 0 and creado and (p.get('stockActual') or 0) > 0:
+            stock_inicial.append((id_prod, p['stockActual']))
+        resultados.append((rc, id_prod, creado))
+
+    # Stock inicial de los productos nuevos en una sola sentencia por lote
+    if stock_inicial:
+        with connection.cursor() as cur:
+            for lote in _lotes(stock_inicial, 2):
+                valores = ", ".join(["(%s, %s)"] * len(lote))
+                cur.execute(f"""
+                    UPDATE p SET p.stockActual = v.stock
+                    FROM dbo.tbProducto p
+                    JOIN (VALUES {valores}) AS v(idProducto, stock) ON v.idProducto = p.idProducto
+                """, [x for fila in lote for x in fila])
+    ids = [id_prod for rc, id_prod, _ in resultados if rc == 0]
+    if ids:
+        _tocar_productos(ids)
+        _notificar("producto", ids=ids)
+    return resultados
 
 
 # -----------------------
@@ -848,6 +1358,10 @@ def sp_producto_categoria_asignar(id_usuario: int, id_producto: int, id_categori
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, id_producto, id_categoria])
         rc, = cur.fetchone()
+    if rc == 0:
+        _invalidar_categorias([id_categoria])
+        _tocar_productos([id_producto])
+        _notificar("producto_categoria", ids=[id_producto], categorias=[id_categoria])
     return int(rc)
 
 
@@ -862,11 +1376,50 @@ def sp_producto_categoria_quitar(id_usuario: int, id_producto: int, id_categoria
     with connection.cursor() as cur:
         cur.execute(sql, [id_usuario, id_producto, id_categoria])
         rc, = cur.fetchone()
+    if rc == 0:
+        _invalidar_categorias([id_categoria])
+        _tocar_productos([id_producto])
+        _notificar("producto_categoria", ids=[id_producto], categorias=[id_categoria])
     return int(rc)
 
 
+def sp_producto_categoria_asignar_lote(id_usuario: int, pares: list):
+    """
+    Asigna muchas categorías con sp_ProductoCategoria_Asignar agrupando las llamadas en batches.
+    pares: lista de (idProducto, idCategoria). Retorna la lista de rc en el mismo orden.
+    """
+    llamadas = [
+        ("EXEC @rc = dbo.sp_ProductoCategoria_Asignar @idUsuario=%s, @idProducto=%s, @idCategoria=%s;",
+         [id_usuario, id_prod, id_cat])
+        for id_prod, id_cat in pares
+    ]
+    try:
+        rcs = [rc for rc, _ in _ejecutar_sp_por_lotes(llamadas)]
+    except Exception as e:
+        print(f"Error en sp_producto_categoria_asignar_lote, se reintenta por fila: {e}")
+        return [sp_producto_categoria_asignar(id_usuario, id_prod, id_cat) for id_prod, id_cat in pares]
+    asignados = [par for par, rc in zip(pares, rcs) if rc == 0]
+    if asignados:
+        _invalidar_categorias({c for _, c in asignados})
+        _tocar_productos(sorted({p for p, _ in asignados}))
+        _notificar("producto_categoria", ids=sorted({p for p, _ in asignados}),
+                   categorias=sorted({c for _, c in asignados}))
+    return rcs
+
+
+def categorias_id_por_nombre():
+    """Retorna {nombre en minúsculas: idCategoria} de todas las categorías"""
+    with connection.cursor() as cur:
+        cur.execute("SELECT idCategoria, nombre FROM dbo.tbCategoria")
+        return {nombre.strip().lower(): int(id_cat) for id_cat, nombre in cur.fetchall()}
+
+
 def sp_producto_categoria_listar(id_producto: int):
-    """Lista categorías de un producto"""
+    """Lista categorías de un producto (con caché versionada)"""
+    return [dict(r) for r in _leer_producto("categorias", id_producto, _sp_producto_categoria_listar_bd)]
+
+
+def _sp_producto_categoria_listar_bd(id_producto: int):
     sql = "EXEC dbo.sp_ProductoCategoria_Listar @idProducto=%s"
     with connection.cursor() as cur:
         cur.execute(sql, [id_producto])
@@ -885,7 +1438,7 @@ def sp_inventario_registrar_entrada(id_usuario: int, id_producto: int, cantidad:
     NOTA: El stock se actualiza automáticamente mediante el trigger tr_Inventario_AfterInsert
     """
     try:
-        with connection.cursor() as cur:
+        with transaction.atomic(), connection.cursor() as cur:
             # Verificar que el producto existe
             cur.execute("SELECT stockActual FROM dbo.tbProducto WHERE idProducto = %s", [id_producto])
             row = cur.fetchone()
@@ -905,257 +1458,751 @@ def sp_inventario_registrar_entrada(id_usuario: int, id_producto: int, cantidad:
                 (idProducto, tipo, cantidad, costoUnitario, motivo, idUsuario)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, [id_producto, tipo_movimiento, cantidad, costo_unit if costo_unit > 0 else None, motivo, id_usuario])
-            
-            connection.commit()
-            return 0  # Éxito
+            _acumular_estadisticas_movimientos(cur, [(id_producto, tipo_movimiento, cantidad)])
+        
+        _tocar_productos([id_producto])
+        _notificar("stock", ids=[id_producto])
+        return 0  # Éxito
     except Exception as e:
         print(f"Error en sp_inventario_registrar_entrada: {e}")
         connection.rollback()
         return 5  # Error general
 
 
+# Máximo de movimientos por transacción en la carga por lotes
+INVENTARIO_LOTE_MAX_TRANSACCION = 1000
+
+
+def sp_inventario_registrar_movimientos_lote(id_usuario: int, movimientos: list, tam_lote: int = 500):
+    """
+    Registra muchos movimientos de inventario (p. ej. la recepción de un proveedor).
+    movimientos: lista de dicts {idProducto, cantidad, tipoMovimiento, costoUnitario, motivo}
+    tam_lote: movimientos por transacción (0 = todos en una sola transacción)
+    Los productos se verifican con una sola consulta y las salidas se validan
+    contra el stock acumulado en el orden recibido.
+    Retorna una lista (mismo orden) de dicts {indice, rc} con los RC de sp_inventario_registrar_entrada.
+
+    NOTA: El stock se actualiza mediante el trigger tr_Inventario_AfterInsert; cada INSERT
+    multi-fila lleva a lo sumo un movimiento por producto (ver _rondas_por_producto).
+    """
+    resultados = [{'indice': i, 'rc': RC_ERROR_GENERAL} for i in range(len(movimientos))]
+
+    # 1. Normalizar filas
+    filas = []
+    for i, mov in enumerate(movimientos):
+        try:
+            id_producto = int(mov.get('idProducto') or 0)
+            cantidad = int(mov.get('cantidad') or 0)
+            tipo = (mov.get('tipoMovimiento') or 'E').strip().upper()
+            costo_unit = float(mov.get('costoUnitario') or 0)
+            motivo = (mov.get('motivo') or '').strip()
+        except (AttributeError, TypeError, ValueError):
+            resultados[i]['rc'] = RC_DATO_INVALIDO
+            continue
+        if id_producto <= 0 or cantidad <= 0 or tipo not in ('E', 'S') or costo_unit < 0:
+            resultados[i]['rc'] = RC_DATO_INVALIDO
+            continue
+        motivo = motivo or f"Movimiento tipo {tipo}"
+        filas.append((i, id_producto, tipo, cantidad, costo_unit if costo_unit > 0 else None, motivo))
+
+    # 2. Una sola consulta para todos los productos
+    try:
+        with connection.cursor() as cur:
+            productos = _obtener_productos(cur, {f[1] for f in filas})
+    except Exception as e:
+        print(f"Error en sp_inventario_registrar_movimientos_lote: {e}")
+        return resultados
+
+    # 3. Validar existencia y stock acumulado en orden
+    stock = {id_p: (info[0] or 0) for id_p, info in productos.items()}
+    aceptadas = []
+    for fila in filas:
+        i, id_producto, tipo, cantidad = fila[:4]
+        if id_producto not in productos:
+            resultados[i]['rc'] = RC_NO_EXISTE
+            continue
+        if tipo == 'S' and cantidad > stock[id_producto]:
+            resultados[i]['rc'] = RC_STOCK_INSUFICIENTE
+            continue
+        stock[id_producto] += cantidad if tipo == 'E' else -cantidad
+        aceptadas.append(fila)
+
+    # 4. Insertar por bloques; un bloque que falla se reintenta fila por fila
+    tam_lote = max(1, min(int(tam_lote or 0) or len(aceptadas) or 1, INVENTARIO_LOTE_MAX_TRANSACCION))
+    for inicio in range(0, len(aceptadas), tam_lote):
+        bloque = aceptadas[inicio:inicio + tam_lote]
+        if _escribir_bloque_movimientos(id_usuario, bloque):
+            for fila in bloque:
+                resultados[fila[0]]['rc'] = RC_OK
+            continue
+        for i, id_producto, tipo, cantidad, costo_unit, motivo in bloque:
+            resultados[i]['rc'] = sp_inventario_registrar_entrada(
+                id_usuario, id_producto, cantidad, costo_unit or 0, motivo, tipo)
+
+    return resultados
+
+
+def _escribir_bloque_movimientos(id_usuario: int, bloque: list) -> bool:
+    """Transacción de un bloque de movimientos ya validados; False si no se pudo escribir"""
+    salidas = {}
+    for _, id_producto, tipo, cantidad, _, _ in bloque:
+        if tipo == 'S':
+            salidas[id_producto] = salidas.get(id_producto, 0) + cantidad
+    try:
+        with transaction.atomic(), connection.cursor() as cur:
+            # Las salidas se reservan con bloqueo de fila (sin contar las entradas del mismo bloque)
+            if salidas and not _reservar_stock(cur, salidas, solo_activos=False):
+                raise _OperacionRechazada(RC_STOCK_INSUFICIENTE)
+            filas = [(id_producto, tipo, cantidad, costo_unit, motivo, id_usuario)
+                     for _, id_producto, tipo, cantidad, costo_unit, motivo in bloque]
+            for ronda in _rondas_por_producto(filas):
+                _insertar_filas(
+                    cur,
+                    "dbo.tbInventarioMovimiento (idProducto, tipo, cantidad, costoUnitario, motivo, idUsuario)",
+                    ronda,
+                    "(%s, %s, %s, %s, %s, %s)",
+                )
+            _acumular_estadisticas_movimientos(cur, [fila[:3] for fila in filas])
+        ids = sorted({fila[1] for fila in bloque})
+        _tocar_productos(ids)
+        _notificar("stock", ids=ids)
+        return True
+    except _OperacionRechazada:
+        return False
+    except Exception as e:
+        print(f"Error escribiendo bloque de movimientos: {e}")
+        return False
+
+
 def vw_inventario_actual(buscar: str = None, solo_criticos: bool = False, 
-                         page: int = 1, page_size: int = 100):
-    """Inventario actual desde tbProducto con paginación"""
+                         page: int = 1, page_size: int = 100, con_total: bool = True,
+                         conteo_separado: bool = False):
+    """
+    Inventario actual desde tbProducto con paginación.
+    UltimoMovimiento sale de las estadísticas de movimientos (fechaCreacion si el producto
+    no tiene movimientos o las estadísticas no están al día).
+    """
     where = ["1=1"]
     params = []
     
     if buscar:
-        where.append("(codigo LIKE %s OR nombre LIKE %s)")
+        where.append("(p.codigo LIKE %s OR p.nombre LIKE %s)")
         params.extend([f'%{buscar}%', f'%{buscar}%'])
     
-    # Contar total
-    sql_count = f"""
-        SELECT COUNT(*) FROM dbo.tbProducto
-        WHERE {" AND ".join(where)}
-    """
-    
-    # Obtener datos
-    sql_data = f"""
-        SELECT 
-            idProducto,
-            codigo,
-            nombre,
-            descripcion,
-            stockActual,
-            stockMinimo,
-            precioCosto,
-            precioVenta,
-            estado,
-            fechaCreacion,
-            fechaCreacion AS UltimoMovimiento
-        FROM dbo.tbProducto
-        WHERE {" AND ".join(where)}
-        ORDER BY nombre
-        OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
-    """
-    
-    with connection.cursor() as cur:
-        # Total
-        cur.execute(sql_count, params)
-        total = cur.fetchone()[0]
-        
-        # Datos
-        offset = (page - 1) * page_size
-        cur.execute(sql_data, params + [offset, page_size])
-        rows = cur.fetchall()
-        cols = [c[0] for c in cur.description]
-        items = [dict(zip(cols, r)) for r in rows]
+    if solo_criticos:
+        where.append("p.stockActual <= p.stockMinimo")
     
-    return {
-        'data': items,  # Cambiado de 'items' a 'data' para consistencia con otras APIs
-        'total': total,
-        'page': page,
-        'pageSize': page_size
-    }
+    columnas = """p.idProducto,
+            p.codigo,
+            p.nombre,
+            p.descripcion,
+            p.stockActual,
+            p.stockMinimo,
+            p.precioCosto,
+            p.precioVenta,
+            p.estado,
+            p.fechaCreacion,
+            {ultimo} AS UltimoMovimiento"""
+
+    def consultar(ultimo, join):
+        return _paginar(
+            columnas.format(ultimo=ultimo),
+            f"FROM dbo.tbProducto p {join} WHERE {' AND '.join(where)}",
+            "p.nombre, p.idProducto", params, page, page_size, con_total, conteo_separado,
+        )
+
+    return _desde_estadisticas(
+        lambda: consultar("ISNULL(e.ultimoMovimiento, p.fechaCreacion)",
+                          "LEFT JOIN dbo.tbProductoMovimientoEstadistica e ON e.idProducto = p.idProducto"),
+        lambda: consultar("p.fechaCreacion", ""),
+    )
 
 
 def sp_inventario_historial(id_producto: int):
     """Obtiene el historial de movimientos de inventario de un producto"""
-    sql = """
-    SELECT 
-        idMovimiento,
-        idProducto,
-        tipo,
-        cantidad,
-        motivo,
-        fecha,
-        idUsuario,
-        costoUnitario,
-        precioUnitario
-    FROM dbo.tbInventarioMovimiento
-    WHERE idProducto = %s
-    ORDER BY fecha DESC
-    """
+    return list(inventario_historial_stream(id_producto))
+
+
+def _filtros_historial(id_producto, desde=None, hasta=None, tipo=None):
+    where, params = ["m.idProducto = %s"], [id_producto]
+    if desde:
+        where.append("m.fecha >= %s")
+        params.append(desde)
+    if hasta:
+        where.append("m.fecha < DATEADD(DAY, 1, %s)")
+        params.append(hasta)
+    if tipo:
+        where.append("m.tipo = %s")
+        params.append(tipo)
+    return where, params
+
+
+_SQL_HISTORIAL = """
+    SELECT {top}
+        m.idMovimiento,
+        m.idProducto,
+        m.tipo,
+        m.cantidad,
+        m.motivo,
+        m.fecha,
+        m.idUsuario,
+        m.costoUnitario,
+        m.precioUnitario
+    FROM dbo.tbInventarioMovimiento m
+    {where}
+    ORDER BY m.fecha DESC, m.idMovimiento DESC
+    {offset}
+"""
+
+
+def inventario_historial_pagina(id_producto: int, desde=None, hasta=None, tipo=None,
+                                limit: int = 100, cursor: str = None):
+    """
+    Historial de un producto paginado por cursor sobre (fecha, idMovimiento) DESC.
+    desde/hasta: date (hasta inclusive), tipo: 'E' | 'S'. Retorna {data, next}.
+    """
+    where, params = _filtros_historial(id_producto, desde, hasta, tipo)
+    return _pagina_cursor(_SQL_HISTORIAL, where, params, ["m.fecha", "m.idMovimiento"],
+                          "dbo.tbInventarioMovimiento", limit, cursor)
+
+
+def inventario_historial_stream(id_producto: int, desde=None, hasta=None, tipo=None, tam_bloque: int = 1000):
+    """
+    Generador con el historial completo (mismo orden que la paginación) leído con
+    fetchmany: nunca arma la lista entera en memoria.
+    """
+    where, params = _filtros_historial(id_producto, desde, hasta, tipo)
+    sql = _SQL_HISTORIAL.format(top="", where="WHERE " + " AND ".join(where), offset="")
     with connection.cursor() as cur:
-        cur.execute(sql, [id_producto])
-        rows = cur.fetchall()
+        cur.execute(sql, params)
         cols = [c[0] for c in cur.description]
-        data = [dict(zip(cols, r)) for r in rows]
-    return data
+        while True:
+            rows = cur.fetchmany(tam_bloque)
+            if not rows:
+                break
+            for r in rows:
+                yield dict(zip(cols, r))
 
 
 # -----------------------
 # VENTAS
 # -----------------------
-def sp_registrar_venta(id_usuario: int, detalles: list):
+# SQL Server admite como máximo 2100 parámetros por sentencia y 1000 filas por VALUES;
+# dejamos margen para los parámetros fijos de cada sentencia.
+_MAX_PARAMS_SQL = 2000
+_MAX_FILAS_VALUES = 1000
+
+
+def _lotes(filas: list, params_por_fila: int):
+    """Parte filas en lotes que caben en una sola sentencia multi-fila"""
+    tam = max(1, min(_MAX_FILAS_VALUES, _MAX_PARAMS_SQL // max(1, params_por_fila)))
+    for i in range(0, len(filas), tam):
+        yield filas[i:i + tam]
+
+
+def _insertar_filas(cur, destino: str, filas: list, plantilla: str):
+    """
+    INSERT multi-fila: destino = "dbo.tabla (col1, col2, ...)", plantilla = "(%s, %s, ...)".
+    Un viaje a SQL Server por lote en lugar de uno por fila.
+    """
+    if not filas:
+        return
+    for lote in _lotes(filas, plantilla.count("%s")):
+        valores = ", ".join([plantilla] * len(lote))
+        params = [v for fila in lote for v in fila]
+        cur.execute(f"INSERT INTO {destino} VALUES {valores}", params)
+
+
+# Llamadas a SP agrupadas en un mismo batch T-SQL
+_EXEC_POR_BATCH = 100
+
+
+def _ejecutar_sp_por_lotes(llamadas: list):
+    """
+    Ejecuta muchas llamadas a stored procedures con un viaje a SQL Server por lote.
+    llamadas: lista de (fragmento, params); el fragmento debe dejar el código de
+    retorno en @rc y opcionalmente un id en @id, p. ej.
+        ("EXEC @rc = dbo.sp_X @a=%s, @id=@id OUTPUT;", [a])
+    Retorna una lista (mismo orden) de (rc, id).
+    """
+    resultados = []
+    params_max = max((len(p) for _, p in llamadas), default=1)
+    tam = max(1, min(_EXEC_POR_BATCH, _MAX_PARAMS_SQL // max(1, params_max)))
+    for i in range(0, len(llamadas), tam):
+        lote = llamadas[i:i + tam]
+        partes = ["SET NOCOUNT ON;", "DECLARE @res TABLE (orden INT, rc INT, id INT);", "DECLARE @rc INT, @id INT;"]
+        params = []
+        for orden, (fragmento, p) in enumerate(lote):
+            partes.append("SET @rc = NULL; SET @id = NULL;")
+            partes.append(fragmento)
+            partes.append(f"INSERT INTO @res VALUES ({orden}, @rc, @id);")
+            params.extend(p)
+        partes.append("SELECT rc, id FROM @res ORDER BY orden;")
+        partes.append("SET NOCOUNT OFF;")
+        with connection.cursor() as cur:
+            cur.execute("\n".join(partes), params)
+            resultados.extend((int(rc if rc is not None else RC_ERROR_GENERAL), int(id_ or 0))
+                              for rc, id_ in cur.fetchall())
+    return resultados
+
+
+def _rondas_por_producto(filas: list, idx_producto: int = 0):
+    """
+    Reparte movimientos de inventario en rondas donde cada idProducto aparece a lo
+    sumo una vez. tr_Inventario_AfterInsert actualiza tbProducto con un JOIN contra
+    inserted y UPDATE ... FROM aplica una sola fila por producto, así que un mismo
+    producto repetido en un INSERT descontaría el stock una sola vez.
+    """
+    rondas = []
+    vistos = {}
+    for fila in filas:
+        n = vistos.get(fila[idx_producto], 0)
+        vistos[fila[idx_producto]] = n + 1
+        if n == len(rondas):
+            rondas.append([])
+        rondas[n].append(fila)
+    return rondas
+
+
+def _obtener_productos(cur, ids: list):
+    """
+    Una consulta (por lote de ids) para todos los productos de una operación.
+    Retorna {idProducto: (stockActual, descuentoMaximoPct, estado, precioCosto)}
+    """
+    productos = {}
+    for lote in _lotes(list(ids), 1):
+        marcadores = ", ".join(["%s"] * len(lote))
+        cur.execute(f"""
+            SELECT idProducto, stockActual, descuentoMaximoPct, estado, precioCosto
+            FROM dbo.tbProducto
+            WHERE idProducto IN ({marcadores})
+        """, lote)
+        for row in cur.fetchall():
+            productos[int(row[0])] = tuple(row[1:])
+    return productos
+
+
+def _normalizar_detalles(detalles: list):
+    """
+    Convierte los detalles recibidos en tuplas (idProducto, cantidad, precioUnitario, descuentoPct).
+    Retorna None si alguna línea es inválida.
+    """
+    lineas = []
+    for det in detalles:
+        try:
+            linea = (
+                int(det['idProducto']),
+                int(det['cantidad']),
+                float(det['precioUnitario']),
+                float(det.get('descuentoPct') or 0),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+        _, cantidad, precio_unitario, descuento_pct = linea
+        if cantidad <= 0 or precio_unitario < 0 or descuento_pct < 0 or descuento_pct > 100:
+            return None
+        lineas.append(linea)
+    return lineas
+
+
+def _pedido_por_producto(lineas: list):
+    """Agrupa las cantidades pedidas por idProducto"""
+    pedido = {}
+    for id_producto, cantidad, _, _ in lineas:
+        pedido[id_producto] = pedido.get(id_producto, 0) + cantidad
+    return pedido
+
+
+def _validar_lineas_venta(lineas: list, productos: dict, stock_disponible: dict = None):
+    """
+    Valida las líneas de una venta contra la información de productos ya cargada.
+    stock_disponible: {idProducto: stock} a consumir (se descuenta si la venta es válida);
+    por defecto se usa el stockActual de productos.
+    RC: 0=OK, 1=inválido/inactivo/descuento excedido, 3=producto no existe, 11=sin stock
+    """
+    for id_producto, _, _, descuento_pct in lineas:
+        producto = productos.get(id_producto)
+        if not producto:
+            return 3
+        _, descuento_max, estado, _ = producto
+        if estado != 'activo':
+            return 1
+        if descuento_pct > (descuento_max or 0):
+            return 1
+    pedido = _pedido_por_producto(lineas)
+
+    # El stock se valida por producto agregando todas sus líneas del ticket
+    for id_producto, cantidad in pedido.items():
+        disponible = (stock_disponible.get(id_producto) if stock_disponible is not None
+                      else productos[id_producto][0])
+        if cantidad > (disponible or 0):
+            return 11
+
+    if stock_disponible is not None:
+        for id_producto, cantidad in pedido.items():
+            stock_disponible[id_producto] -= cantidad
+    return 0
+
+
+def _reservar_stock(cur, pedido: dict, solo_activos: bool = True) -> bool:
+    """
+    Verifica y bloquea en una sola sentencia las filas de tbProducto del pedido.
+    El UPDATE solo toca (y deja con bloqueo exclusivo de fila hasta el commit) los
+    productos activos cuyo stock cubre la cantidad pedida; si alguno no califica
+    el rowcount es menor que el número de productos y la venta se rechaza.
+    El descuento real lo hace tr_Inventario_AfterInsert al insertar los movimientos,
+    dentro de la misma transacción y con la fila ya bloqueada.
+    """
+    filas = sorted(pedido.items())
+    reservados = 0
+    for lote in _lotes(filas, 2):
+        valores = ", ".join(["(%s, %s)"] * len(lote))
+        cur.execute(f"""
+            UPDATE p SET p.stockActual = p.stockActual
+            FROM dbo.tbProducto p WITH (ROWLOCK)
+            JOIN (VALUES {valores}) AS r(idProducto, cantidad) ON r.idProducto = p.idProducto
+            WHERE p.stockActual >= r.cantidad {"AND p.estado = 'activo'" if solo_activos else ""}
+        """, [v for fila in lote for v in fila])
+        reservados += cur.rowcount
+    return reservados == len(filas)
+
+
+# Número nativo de SQL Server en el mensaje del driver: "[SQL Server]... (1205) (SQLExecDirectW)"
+_ERROR_NATIVO_BLOQUEO = re.compile(r"\((1205|1222)\)")
+
+
+def _es_conflicto_bloqueo(exc) -> bool:
+    """
+    Deadlock (1205) o timeout de bloqueo (1222) de SQL Server: la transacción se puede reintentar.
+    Se mira el SQLSTATE (args[0] de pyodbc, 40001 = deadlock) y el número nativo del
+    mensaje del driver (args[1]), en la excepción y en la de pyodbc que envuelve Django.
+    """
+    while exc is not None:
+        args = getattr(exc, "args", ())
+        if args and args[0] == "40001":
+            return True
+        if len(args) > 1 and isinstance(args[1], str) and _ERROR_NATIVO_BLOQUEO.search(args[1]):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def _espera_reintento(intento: int) -> float:
+    """Backoff exponencial con jitter para reintentos por deadlock"""
+    base = 0.02 * (2 ** intento)
+    return base + random.uniform(0, base)
+
+
+class _OperacionRechazada(Exception):
+    """Aborta una transacción de escritura devolviendo un RC de negocio"""
+
+    def __init__(self, rc: int):
+        super().__init__(rc)
+        self.rc = rc
+
+
+def _totales_venta(lineas: list):
+    """Calcula (subtotal, descuentos, total) de las líneas de una venta"""
+    subtotal = 0
+    descuentos = 0
+    for _, cantidad, precio_unitario, descuento_pct in lineas:
+        subtotal_linea = cantidad * precio_unitario
+        subtotal += subtotal_linea
+        descuentos += subtotal_linea * (descuento_pct / 100.0)
+    return subtotal, descuentos, subtotal - descuentos
+
+
+def _insertar_venta(cur, id_usuario: int, subtotal, descuentos, total) -> int:
+    """
+    Inserta la cabecera en tbVenta y devuelve su idVenta en el mismo viaje.
+    OUTPUT ... INTO una variable tabla funciona aunque tbVenta tenga triggers
+    y no depende de MAX(idVenta), que fallaba con dos pestañas del mismo cajero.
+    """
+    cur.execute("""
+        SET NOCOUNT ON;
+        DECLARE @venta TABLE (idVenta INT);
+        INSERT INTO dbo.tbVenta (idUsuario, subtotal, descuentos, total)
+        OUTPUT INSERTED.idVenta INTO @venta
+        VALUES (%s, %s, %s, %s);
+        SELECT idVenta FROM @venta;
+        SET NOCOUNT OFF;
+    """, [id_usuario, subtotal, descuentos, total])
+    row = cur.fetchone()
+    if not row or row[0] is None:
+        raise RuntimeError("No se pudo obtener el ID de la venta insertada")
+    return int(row[0])
+
+
+def _insertar_lineas_ventas(cur, id_usuario: int, ventas: list, productos: dict):
+    """
+    Inserta detalles y movimientos de salida en lotes multi-fila.
+    ventas: lista de (idVenta, lineas); admite varias ventas en las mismas sentencias.
+    """
+    filas_detalle = []
+    filas_movimiento = []
+    for id_venta, lineas in ventas:
+        for id_producto, cantidad, precio_unitario, descuento_pct in lineas:
+            subtotal_linea = cantidad * precio_unitario
+            total_linea = subtotal_linea * (1 - descuento_pct / 100.0)
+            costo_unitario = productos[id_producto][3] or 0
+            filas_detalle.append((id_venta, id_producto, cantidad, precio_unitario,
+                                  descuento_pct, subtotal_linea, total_linea))
+            filas_movimiento.append((id_producto, cantidad, costo_unitario, precio_unitario,
+                                     id_venta, id_usuario))
+
+    _insertar_filas(
+        cur,
+        "dbo.tbVentaDetalle (idVenta, idProducto, cantidad, precioUnitario, descuentoPct, subtotalLinea, totalLinea)",
+        filas_detalle,
+        "(%s, %s, %s, %s, %s, %s, %s)",
+    )
+    # El trigger tr_Inventario_AfterInsert descuenta el stock de cada movimiento
+    for ronda in _rondas_por_producto(filas_movimiento):
+        _insertar_filas(
+            cur,
+            "dbo.tbInventarioMovimiento (idProducto, tipo, cantidad, costoUnitario, precioUnitario, motivo, idVenta, idUsuario)",
+            ronda,
+            "(%s, 'S', %s, %s, %s, 'venta', %s, %s)",
+        )
+    _acumular_estadisticas_movimientos(cur, [(fila[0], 'S', fila[1]) for fila in filas_movimiento])
+
+
+def _insertar_bitacora_ventas(cur, id_usuario: int, ventas: list):
+    """Registra en bitácora la creación de ventas: lista de (idVenta, subtotal, descuentos, total)"""
+    filas = [
+        (id_usuario, id_venta, json.dumps({
+            'idVenta': id_venta,
+            'subtotal': float(subtotal),
+            'descuentos': float(descuentos),
+            'total': float(total)
+        }))
+        for id_venta, subtotal, descuentos, total in ventas
+    ]
+    _insertar_filas(
+        cur,
+        "dbo.tbBitacoraTransacciones (idUsuario, entidad, operacion, idAfectado, datosNuevo)",
+        filas,
+        "(%s, 'tbVenta', 'CREATE', %s, %s)",
+    )
+
+
+def sp_registrar_venta(id_usuario: int, detalles: list, bloquear_stock: bool = None):
     """
     Registra una venta con sus detalles directamente (sin usar TVP por limitaciones de pyodbc).
     detalles: lista de dicts con {idProducto, cantidad, precioUnitario, descuentoPct}
-    RC: 0=OK, 1=inválido, 6=usuario no existe, 11=sin stock, 5=error
+    bloquear_stock: reserva el stock con bloqueo de fila dentro de la transacción
+        (por defecto settings.VENTAS_BLOQUEO_STOCK); evita sobreventas entre cajas concurrentes.
+    RC: 0=OK, 1=inválido, 3=producto no existe, 6=usuario no existe, 11=sin stock, 5=error
+
+    Todos los productos se validan con una sola consulta y los detalles/movimientos
+    se insertan en lotes multi-fila dentro de una transacción, de modo que el número
+    de viajes a SQL Server no crece con las líneas del ticket.
     """
+    if bloquear_stock is None:
+        bloquear_stock = getattr(settings, "VENTAS_BLOQUEO_STOCK", True)
     try:
         with connection.cursor() as cur:
             # 1. Validar usuario
             cur.execute("SELECT 1 FROM dbo.tbUsuario WHERE idUsuario = %s AND estado = 'activo'", [id_usuario])
             if not cur.fetchone():
                 return 6, 0  # Usuario no válido
-            
-            # 2. Validar que hay detalles
-            if not detalles or len(detalles) == 0:
+
+            # 2. Validar detalles
+            lineas = _normalizar_detalles(detalles or [])
+            if not lineas:
                 return 1, 0  # Datos inválidos
-            
-            # 3. Validar cada detalle y verificar stock (guardamos info de productos para usarla después)
-            productos_info = {}
-            for det in detalles:
-                id_producto = det['idProducto']
-                cantidad = det['cantidad']
-                precio_unitario = det['precioUnitario']
-                descuento_pct = det.get('descuentoPct', 0)
-                
-                # Validaciones básicas
-                if cantidad <= 0 or precio_unitario < 0 or descuento_pct < 0 or descuento_pct > 100:
-                    return 1, 0  # Datos inválidos
-                
-                # Verificar producto activo y obtener info
-                cur.execute("""
-                    SELECT stockActual, descuentoMaximoPct, estado, precioCosto
-                    FROM dbo.tbProducto 
-                    WHERE idProducto = %s
-                """, [id_producto])
-                producto = cur.fetchone()
-                
-                if not producto:
-                    return 3, 0  # Producto no existe
-                
-                stock_actual, descuento_max, estado, precio_costo = producto
-                
-                # Guardar info del producto para usar después
-                productos_info[id_producto] = {
-                    'precioCosto': precio_costo or 0
-                }
-                
-                if estado != 'activo':
-                    return 1, 0  # Producto no activo
-                
-                # Validar descuento
-                if descuento_pct > descuento_max:
-                    return 1, 0  # Descuento excede el máximo
-                
-                # ✅ VALIDAR STOCK ESTRICTAMENTE
-                print(f"🔍 Validando stock para producto {id_producto}:")
-                print(f"   Cantidad solicitada: {cantidad}")
-                print(f"   Stock disponible: {stock_actual}")
-                
-                if cantidad > stock_actual:
-                    print(f"   ❌ STOCK INSUFICIENTE - RECHAZANDO VENTA")
-                    print(f"   Producto: {id_producto}, Solicitado: {cantidad}, Disponible: {stock_actual}")
-                    connection.rollback()  # ← Asegurar rollback
-                    return 11, 0  # Stock insuficiente
-                
-                print(f"   ✅ Stock OK")
-            
-            # 4. Calcular totales
-            subtotal = 0
-            descuentos = 0
-            
-            for det in detalles:
-                subtotal_linea = det['cantidad'] * det['precioUnitario']
-                descuento_linea = subtotal_linea * (det.get('descuentoPct', 0) / 100.0)
-                subtotal += subtotal_linea
-                descuentos += descuento_linea
-            
-            total = subtotal - descuentos
-            
-            # 5. Insertar venta y obtener ID
-            print(f"💳 Insertando venta: subtotal={subtotal}, descuentos={descuentos}, total={total}")
-            print(f"   Detalles: {len(detalles)} productos")
-            for det in detalles:
-                print(f"      - Producto {det['idProducto']}: {det['cantidad']} x Q{det['precioUnitario']} (desc: {det.get('descuentoPct', 0)}%)")
-            
-            # Insertar la venta
-            cur.execute("""
-                INSERT INTO dbo.tbVenta (idUsuario, subtotal, descuentos, total)
-                VALUES (%s, %s, %s, %s)
-            """, [id_usuario, subtotal, descuentos, total])
-            
-            # Obtener el último ID insertado usando MAX
-            cur.execute("SELECT MAX(idVenta) FROM dbo.tbVenta WHERE idUsuario = %s", [id_usuario])
-            result = cur.fetchone()
-            
-            if not result or result[0] is None:
-                print("❌ ERROR: No se pudo obtener el ID de la venta insertada")
-                return 5, 0
-            
-            id_venta = int(result[0])
-            print(f"✅ Venta insertada con ID: {id_venta}")
-            
-            # 6. Insertar detalles y movimientos de inventario
-            print(f"📝 Insertando {len(detalles)} detalles de venta...")
-            for i, det in enumerate(detalles, 1):
-                id_producto = det['idProducto']
-                cantidad = det['cantidad']
-                precio_unitario = det['precioUnitario']
-                descuento_pct = det.get('descuentoPct', 0)
-                
-                # Obtener el costo del producto
-                costo_unitario = productos_info[id_producto]['precioCosto']
-                
-                subtotal_linea = cantidad * precio_unitario
-                total_linea = subtotal_linea * (1 - descuento_pct / 100.0)
-                
-                print(f"   Detalle {i}: producto={id_producto}, cant={cantidad}, precio={precio_unitario}, desc={descuento_pct}%, subtotal={subtotal_linea}, total={total_linea}")
-                
-                # Insertar detalle
-                cur.execute("""
-                    INSERT INTO dbo.tbVentaDetalle 
-                    (idVenta, idProducto, cantidad, precioUnitario, descuentoPct, subtotalLinea, totalLinea)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, [id_venta, id_producto, cantidad, precio_unitario, descuento_pct, subtotal_linea, total_linea])
-                print(f"   ✅ Detalle insertado en tbVentaDetalle")
-                
-                # Insertar movimiento de inventario (salida) con costoUnitario y precioUnitario
-                cur.execute("""
-                    INSERT INTO dbo.tbInventarioMovimiento 
-                    (idProducto, tipo, cantidad, costoUnitario, precioUnitario, motivo, idVenta, idUsuario)
-                    VALUES (%s, 'S', %s, %s, %s, 'venta', %s, %s)
-                """, [id_producto, cantidad, costo_unitario, precio_unitario, id_venta, id_usuario])
-                print(f"   ✅ Movimiento insertado en tbInventarioMovimiento (costo={costo_unitario})")
-            
-            # 7. Registrar en bitácora
-            import json
-            payload = json.dumps({
-                'idVenta': id_venta,
-                'subtotal': float(subtotal),
-                'descuentos': float(descuentos),
-                'total': float(total)
-            })
-            
-            cur.execute("""
-                INSERT INTO dbo.tbBitacoraTransacciones (idUsuario, entidad, operacion, idAfectado, datosNuevo)
-                VALUES (%s, 'tbVenta', 'CREATE', %s, %s)
-            """, [id_usuario, id_venta, payload])
-            
-            connection.commit()
-            return 0, id_venta
-            
+
+            # 3. Una sola consulta para todos los productos del ticket (pre-validación sin bloqueo).
+            #    Estado, tope de descuento y costo se leen de tbProducto, no del catálogo en
+            #    memoria: en otros workers el snapshot puede estar desactualizado.
+            productos = _obtener_productos(cur, {l[0] for l in lineas})
+            rc = _validar_lineas_venta(lineas, productos)
+            if rc != 0:
+                return rc, 0
+
+        # 4. Calcular totales
+        subtotal, descuentos, total = _totales_venta(lineas)
+        pedido = _pedido_por_producto(lineas)
+
+        # 5. Escribir la venta completa en una sola transacción. Si es la transacción
+        #    externa, un deadlock se reintenta con backoff; dentro de otra transacción
+        #    SQL Server ya la abortó completa y el error se propaga.
+        reintentos = 0 if connection.in_atomic_block else getattr(settings, "VENTAS_REINTENTOS_DEADLOCK", 3)
+        for intento in range(reintentos + 1):
+            try:
+                return 0, _escribir_venta(id_usuario, lineas, productos, pedido,
+                                          subtotal, descuentos, total, bloquear_stock)
+            except _OperacionRechazada as e:
+                return e.rc, 0
+            except Exception as e:
+                if intento < reintentos and _es_conflicto_bloqueo(e):
+                    print(f"Conflicto de bloqueo en sp_registrar_venta, reintento {intento + 1}: {e}")
+                    time.sleep(_espera_reintento(intento))
+                    continue
+                raise
+
     except Exception as e:
         print(f"Error en sp_registrar_venta: {e}")
-        connection.rollback()
         return 5, 0  # Error general
 
 
-def listar_ventas(fecha_inicio=None, fecha_fin=None, id_usuario=None, page: int = 1, page_size: int = 100):
+def _escribir_venta(id_usuario, lineas, productos, pedido, subtotal, descuentos, total, bloquear_stock):
+    """Transacción de escritura de sp_registrar_venta; retorna idVenta"""
+    with transaction.atomic(), connection.cursor() as cur:
+        # Reserva condicional: verifica stock y bloquea las filas en la misma sentencia
+        if bloquear_stock and not _reservar_stock(cur, pedido):
+            raise _OperacionRechazada(11)
+
+        id_venta = _insertar_venta(cur, id_usuario, subtotal, descuentos, total)
+
+        # Detalles y movimientos de inventario en lotes
+        _insertar_lineas_ventas(cur, id_usuario, [(id_venta, lineas)], productos)
+
+        # Registrar en bitácora
+        _insertar_bitacora_ventas(cur, id_usuario, [(id_venta, subtotal, descuentos, total)])
+
+        # Resumen diario (misma transacción)
+        _acumular_resumen_ventas(cur, [id_venta])
+    _tocar_productos(pedido)
+    _tocar_reportes_de_ventas()
+    _notificar("stock", ids=sorted(pedido))
+    _notificar("venta", ids=[id_venta])
+    return id_venta
+
+
+# Máximo de ventas por transacción en la carga por lotes
+VENTAS_LOTE_MAX_TRANSACCION = 200
+
+
+def sp_registrar_ventas_lote(id_usuario: int, ventas: list, tam_lote: int = 50, bloquear_stock: bool = None):
+    """
+    Registra muchas ventas (p. ej. la cola de una caja que estuvo sin conexión).
+    ventas: lista de dicts {detalles: [...], ref?: identificador del cliente}
+    Todas las ventas se validan contra una sola lectura de productos, consumiendo
+    el stock en el orden recibido, y las aceptadas se escriben en transacciones de
+    `tam_lote` ventas con sentencias multi-fila.
+    Retorna una lista (mismo orden) de dicts {indice, ref, rc, idVenta} con los RC de sp_registrar_venta.
+    """
+    if bloquear_stock is None:
+        bloquear_stock = getattr(settings, "VENTAS_BLOQUEO_STOCK", True)
+    tam_lote = max(1, min(int(tam_lote or 1), VENTAS_LOTE_MAX_TRANSACCION))
+    resultados = [
+        {'indice': i, 'ref': (v.get('ref') if isinstance(v, dict) else None), 'rc': RC_ERROR_GENERAL, 'idVenta': 0}
+        for i, v in enumerate(ventas)
+    ]
+
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1 FROM dbo.tbUsuario WHERE idUsuario = %s AND estado = 'activo'", [id_usuario])
+            if not cur.fetchone():
+                for r in resultados:
+                    r['rc'] = RC_USUARIO_NO_EXISTE
+                return resultados
+
+            # 1. Normalizar todas las ventas
+            normalizadas = []
+            for i, venta in enumerate(ventas):
+                lineas = _normalizar_detalles(venta.get('detalles') or []) if isinstance(venta, dict) else None
+                if not lineas:
+                    resultados[i]['rc'] = RC_DATO_INVALIDO
+                    continue
+                normalizadas.append((i, lineas))
+
+            # 2. Una sola lectura de todos los productos involucrados (snapshot)
+            productos = _obtener_productos(cur, {l[0] for _, lineas in normalizadas for l in lineas})
+    except Exception as e:
+        print(f"Error en sp_registrar_ventas_lote: {e}")
+        return resultados
+
+    # 3. Validar en orden consumiendo el stock del snapshot
+    stock = {id_p: (info[0] or 0) for id_p, info in productos.items()}
+    aceptadas = []
+    for i, lineas in normalizadas:
+        rc = _validar_lineas_venta(lineas, productos, stock)
+        if rc != 0:
+            resultados[i]['rc'] = rc
+            continue
+        aceptadas.append((i, lineas))
+
+    # 4. Escribir por bloques; si un bloque no se puede reservar o falla, sus ventas
+    #    se registran una a una para obtener el RC exacto de cada una
+    for inicio in range(0, len(aceptadas), tam_lote):
+        bloque = aceptadas[inicio:inicio + tam_lote]
+        ids = _escribir_bloque_ventas_con_reintentos(id_usuario, bloque, productos, bloquear_stock)
+        if ids is None:
+            for i, lineas in bloque:
+                detalles = [{'idProducto': p, 'cantidad': c, 'precioUnitario': pu, 'descuentoPct': d}
+                            for p, c, pu, d in lineas]
+                rc, id_venta = sp_registrar_venta(id_usuario, detalles, bloquear_stock)
+                resultados[i]['rc'], resultados[i]['idVenta'] = rc, id_venta
+            continue
+        for (i, _), id_venta in zip(bloque, ids):
+            resultados[i]['rc'], resultados[i]['idVenta'] = RC_OK, id_venta
+
+    return resultados
+
+
+def _escribir_bloque_ventas_con_reintentos(id_usuario, bloque, productos, bloquear_stock):
+    """Escribe un bloque de ventas; reintenta ante deadlock. Retorna los idVenta o None si no se pudo."""
+    reintentos = 0 if connection.in_atomic_block else getattr(settings, "VENTAS_REINTENTOS_DEADLOCK", 3)
+    for intento in range(reintentos + 1):
+        try:
+            return _escribir_bloque_ventas(id_usuario, bloque, productos, bloquear_stock)
+        except _OperacionRechazada:
+            return None
+        except Exception as e:
+            if intento < reintentos and _es_conflicto_bloqueo(e):
+                time.sleep(_espera_reintento(intento))
+                continue
+            print(f"Error escribiendo bloque de ventas: {e}")
+            return None
+    return None
+
+
+def _escribir_bloque_ventas(id_usuario, bloque, productos, bloquear_stock):
+    """Transacción de un bloque de ventas ya validadas; retorna los idVenta en el orden del bloque"""
+    totales = [_totales_venta(lineas) for _, lineas in bloque]
+    with transaction.atomic(), connection.cursor() as cur:
+        if bloquear_stock:
+            pedido = _pedido_por_producto([l for _, lineas in bloque for l in lineas])
+            if not _reservar_stock(cur, pedido):
+                raise _OperacionRechazada(RC_STOCK_INSUFICIENTE)
+
+        # Cabeceras: MERGE permite devolver cada idVenta junto con su posición en el bloque
+        valores = ", ".join(["(%s, %s, %s, %s, %s)"] * len(bloque))
+        params = []
+        for orden, (subtotal, descuentos, total) in enumerate(totales):
+            params += [orden, id_usuario, subtotal, descuentos, total]
+        cur.execute(f"""
+            SET NOCOUNT ON;
+            DECLARE @ventas TABLE (orden INT, idVenta INT);
+            MERGE dbo.tbVenta AS t
+            USING (VALUES {valores}) AS s(orden, idUsuario, subtotal, descuentos, total)
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT (idUsuario, subtotal, descuentos, total)
+                VALUES (s.idUsuario, s.subtotal, s.descuentos, s.total)
+            OUTPUT s.orden, INSERTED.idVenta INTO @ventas;
+            SELECT orden, idVenta FROM @ventas ORDER BY orden;
+            SET NOCOUNT OFF;
+        """, params)
+        ids = [int(row[1]) for row in cur.fetchall()]
+        if len(ids) != len(bloque):
+            raise RuntimeError("No se obtuvieron los ID de todas las ventas del bloque")
+
+        _insertar_lineas_ventas(cur, id_usuario, [(id_venta, lineas) for id_venta, (_, lineas) in zip(ids, bloque)], productos)
+        _insertar_bitacora_ventas(cur, id_usuario, [(id_venta, *t) for id_venta, t in zip(ids, totales)])
+        _acumular_resumen_ventas(cur, ids)
+    vendidos = sorted({l[0] for _, lineas in bloque for l in lineas})
+    _tocar_productos(vendidos)
+    _tocar_reportes_de_ventas()
+    _notificar("stock", ids=vendidos)
+    _notificar("venta", ids=ids)
+    return ids
+
+
+def listar_ventas(fecha_inicio=None, fecha_fin=None, id_usuario=None, page: int = 1, page_size: int = 100,
+                  con_total: bool = True, conteo_separado: bool = False):
     """Lista ventas con filtros y paginación"""
     where = []
     params = []
@@ -1172,36 +2219,41 @@ def listar_ventas(fecha_inicio=None, fecha_fin=None, id_usuario=None, page: int
         where.append("v.idUsuario = %s")
         params.append(id_usuario)
     
-    sql_count = f"""
-    SELECT COUNT(*) FROM dbo.tbVenta v
-    {"WHERE " + " AND ".join(where) if where else ""}
-    """
-    
-    sql_data = f"""
-    SELECT v.idVenta, v.fecha, u.usuario, v.subtotal, v.descuentos, v.total
+    return _paginar(
+        "v.idVenta, v.fecha, u.usuario, v.subtotal, v.descuentos, v.total",
+        f"""FROM dbo.tbVenta v
+    JOIN dbo.tbUsuario u ON u.idUsuario = v.idUsuario
+    {"WHERE " + " AND ".join(where) if where else ""}""",
+        "v.fecha DESC, v.idVenta DESC", params, page, page_size, con_total, conteo_separado,
+    )
+
+
+_SQL_VENTAS = """
+    SELECT {top} v.idVenta, v.fecha, u.usuario, v.subtotal, v.descuentos, v.total
     FROM dbo.tbVenta v
     JOIN dbo.tbUsuario u ON u.idUsuario = v.idUsuario
-    {"WHERE " + " AND ".join(where) if where else ""}
+    {where}
     ORDER BY v.fecha DESC, v.idVenta DESC
-    OFFSET %s ROWS FETCH NEXT %s ROWS ONLY
+    {offset}
+"""
+
+
+def listar_ventas_pagina(fecha_inicio=None, fecha_fin=None, id_usuario=None, limit: int = 100, cursor: str = None):
     """
-    
-    with connection.cursor() as cur:
-        # Total
-        cur.execute(sql_count, params)
-        total = cur.fetchone()[0]
-        
-        # Datos
-        cur.execute(sql_data, params + [(page-1)*page_size, page_size])
-        rows = cur.fetchall()
-        cols = [c[0] for c in cur.description]
-    
-    return {
-        'data': [dict(zip(cols, r)) for r in rows],
-        'total': total,
-        'page': page,
-        'pageSize': page_size
-    }
+    Historial de ventas paginado por cursor sobre (fecha, idVenta) DESC: la latencia no
+    depende de la profundidad. Retorna {data, next}; lanza ValueError si el cursor no es válido.
+    """
+    where, params = [], []
+    if fecha_inicio:
+        where.append("v.fecha >= %s")
+        params.append(fecha_inicio)
+    if fecha_fin:
+        where.append("v.fecha < DATEADD(DAY, 1, %s)")
+        params.append(fecha_fin)
+    if id_usuario:
+        where.append("v.idUsuario = %s")
+        params.append(id_usuario)
+    return _pagina_cursor(_SQL_VENTAS, where, params, ["v.fecha", "v.idVenta"], "dbo.tbVenta", limit, cursor)
 
 
 def obtener_venta_detalle(id_venta: int):
@@ -1220,9 +2272,566 @@ def obtener_venta_detalle(id_venta: int):
     return [dict(zip(cols, r)) for r in rows]
 
 
+# -----------------------
+# RESUMEN DIARIO DE VENTAS
+# -----------------------
+# tbVentaResumenDiario acumula por (fecha, idUsuario): subtotal, descuentos,
+# total, tickets y unidades. No tiene dimensión de categoría: el filtro por
+# categoría de los reportes usa las categorías actuales de tbProductoCategoria,
+# que pueden reasignarse, así que esos reportes siempre agregan tbVenta. Así el
+# resumen depende solo de tbVenta y da lo mismo que la consulta de respaldo.
+# Las ventas lo actualizan en su propia transacción; la tabla y el respaldo
+# histórico los crea el comando resumen_ventas, que al terminar marca la tabla
+# como completa. Los reportes solo la leen con esa marca y, si no existe, vuelven
+# a agregar tbVenta. La aplicación no modifica ni borra ventas; una corrección
+# hecha a mano en tbVenta se lleva al resumen con `resumen_ventas --verificar --reparar`.
+RESUMEN_VENTAS_TABLA = "dbo.tbVentaResumenDiario"
+
+_SQL_RESUMEN_CREAR = """
+IF OBJECT_ID('dbo.tbVentaResumenDiario') IS NULL
+BEGIN
+    CREATE TABLE dbo.tbVentaResumenDiario (
+        fecha DATE NOT NULL,
+        idUsuario INT NOT NULL,
+        subtotal DECIMAL(19, 4) NOT NULL,
+        descuentos DECIMAL(19, 4) NOT NULL,
+        total DECIMAL(19, 4) NOT NULL,
+        tickets INT NOT NULL,
+        unidades INT NOT NULL,
+        CONSTRAINT PK_tbVentaResumenDiario PRIMARY KEY (fecha, idUsuario)
+    );
+END
+"""
+
+# Agregado de tbVenta en el formato del resumen; {filtro} se aplica a `v`
+_SQL_RESUMEN_FUENTE = """
+    SELECT CAST(v.fecha AS DATE), v.idUsuario,
+           SUM(v.subtotal), SUM(v.descuentos), SUM(v.total), COUNT(*), SUM(ISNULL(u.unidades, 0))
+    FROM dbo.tbVenta v {hint}
+    OUTER APPLY (SELECT SUM(vd.cantidad) AS unidades
+                 FROM dbo.tbVentaDetalle vd WHERE vd.idVenta = v.idVenta) u
+    WHERE {filtro}
+    GROUP BY CAST(v.fecha AS DATE), v.idUsuario
+"""
+
+_COLUMNAS_RESUMEN = "fecha, idUsuario, subtotal, descuentos, total, tickets, unidades"
+
+_resumen_ventas = {"listo": None, "leido_en": 0.0}
+
+
+def _acumular_resumen_ventas(cur, ids_venta):
+    """
+    Suma las ventas `ids_venta` (ya insertadas, misma transacción) al resumen diario.
+    Si la tabla no existe no hace nada: la condición se evalúa en el servidor.
+    """
+    if not ids_venta:
+        return
+    marcadores = ", ".join(["%s"] * len(ids_venta))
+    fuente = _SQL_RESUMEN_FUENTE.format(hint="", filtro=f"v.idVenta IN ({marcadores})")
+    cur.execute(f"""
+        IF OBJECT_ID('dbo.tbVentaResumenDiario') IS NOT NULL
+        MERGE dbo.tbVentaResumenDiario WITH (HOLDLOCK) AS r
+        USING ({fuente}) AS s ({_COLUMNAS_RESUMEN})
+        ON r.fecha = s.fecha AND r.idUsuario = s.idUsuario
+        WHEN MATCHED THEN UPDATE SET
+            subtotal = r.subtotal + s.subtotal, descuentos = r.descuentos + s.descuentos,
+            total = r.total + s.total, tickets = r.tickets + s.tickets, unidades = r.unidades + s.unidades
+        WHEN NOT MATCHED THEN
+            INSERT ({_COLUMNAS_RESUMEN})
+            VALUES (s.fecha, s.idUsuario, s.subtotal, s.descuentos, s.total, s.tickets, s.unidades);
+    """, list(ids_venta))
+
+
+def resumen_ventas_crear():
+    """Crea tbVentaResumenDiario si no existe (sin marcarla como completa)"""
+    with connection.cursor() as cur:
+        cur.execute(_SQL_RESUMEN_CREAR)
+
+
+def resumen_ventas_existe() -> bool:
+    with connection.cursor() as cur:
+        cur.execute("SELECT OBJECT_ID('dbo.tbVentaResumenDiario')")
+        return cur.fetchone()[0] is not None
+
+
+def _leer_propiedad_tabla(tabla: str, nombre: str):
+    """Valor (texto) de la propiedad extendida `nombre` de dbo.<tabla>, o None"""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT CAST(value AS NVARCHAR(100)) FROM sys.extended_properties
+            WHERE major_id = OBJECT_ID(%s) AND minor_id = 0 AND name = %s
+        """, [f"dbo.{tabla}", nombre])
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _fijar_propiedad_tabla(tabla: str, nombre: str, valor):
+    """Crea o actualiza la propiedad extendida `nombre` de dbo.<tabla>"""
+    sql = """
+    IF EXISTS (SELECT 1 FROM sys.extended_properties
+               WHERE major_id = OBJECT_ID(%s) AND minor_id = 0 AND name = %s)
+        EXEC sys.sp_updateextendedproperty @name = %s, @value = %s,
+             @level0type = N'SCHEMA', @level0name = N'dbo',
+             @level1type = N'TABLE', @level1name = %s;
+    ELSE
+        EXEC sys.sp_addextendedproperty @name = %s, @value = %s,
+             @level0type = N'SCHEMA', @level0name = N'dbo',
+             @level1type = N'TABLE', @level1name = %s;
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [f"dbo.{tabla}", nombre, nombre, valor, tabla, nombre, valor, tabla])
+
+
+def resumen_ventas_marcar(completo: bool):
+    """Marca (o desmarca) el resumen como completo: los reportes lo leen solo si lo está"""
+    _fijar_propiedad_tabla("tbVentaResumenDiario", "respaldoCompleto", 1 if completo else 0)
+    _resumen_ventas["listo"] = None
+    # Los períodos cerrados se guardan sin vencimiento: cambia la fuente de todos
+    _cache_reportes.clear()
+
+
+def _resumen_ventas_listo() -> bool:
+    """True si la tabla existe y está marcada como completa (se relee cada minuto)"""
+    if _resumen_ventas["listo"] is None or time.monotonic() - _resumen_ventas["leido_en"] > 60:
+        _resumen_ventas["listo"] = _leer_propiedad_tabla("tbVentaResumenDiario", "respaldoCompleto") == "1"
+        _resumen_ventas["leido_en"] = time.monotonic()
+    return _resumen_ventas["listo"]
+
+
+def _desde_resumen(consultar_resumen, consultar_bd):
+    """consultar_resumen() si el resumen está listo; si no (o falla), consultar_bd()"""
+    if _resumen_ventas_listo():
+        try:
+            return consultar_resumen()
+        except Exception as e:
+            print(f"Resumen diario no disponible, se usa tbVenta: {e}")
+            _resumen_ventas["listo"] = False
+            _resumen_ventas["leido_en"] = time.monotonic()
+    return consultar_bd()
+
+
+def resumen_ventas_recalcular(desde: datetime.date, hasta: datetime.date, bloquear: bool = False) -> int:
+    """
+    Reemplaza las filas del resumen de [desde, hasta] por el agregado de tbVenta.
+    bloquear=True (días que aún reciben ventas) toma bloqueos de rango sobre tbVenta
+    hasta confirmar: una venta concurrente espera y luego suma sobre lo recalculado.
+    Retorna las filas escritas.
+    """
+    filtro = "v.fecha >= %s AND v.fecha < DATEADD(DAY, 1, %s)"
+    fuente = _SQL_RESUMEN_FUENTE.format(hint="WITH (HOLDLOCK)" if bloquear else "", filtro=filtro)
+    params = [str(desde), str(hasta)]
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("DELETE FROM dbo.tbVentaResumenDiario WITH (HOLDLOCK) WHERE fecha >= %s AND fecha <= %s",
+                    params)
+        cur.execute(f"INSERT INTO dbo.tbVentaResumenDiario ({_COLUMNAS_RESUMEN}) {fuente}", params)
+        filas = cur.rowcount
+    # Un reporte de período cerrado calculado con las filas anteriores no vencería nunca
+    _cache_reportes.clear()
+    return filas
+
+
+def resumen_ventas_diferencias(desde: datetime.date, hasta: datetime.date) -> list:
+    """
+    Filas de [desde, hasta] donde el resumen no coincide con tbVenta:
+    [{fecha, idUsuario, resumen: (...)|None, esperado: (...)|None}]
+    """
+    fuente = _SQL_RESUMEN_FUENTE.format(hint="", filtro="v.fecha >= %s AND v.fecha < DATEADD(DAY, 1, %s)")
+    params = [str(desde), str(hasta)]
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT {_COLUMNAS_RESUMEN} FROM dbo.tbVentaResumenDiario "
+                    f"WHERE fecha >= %s AND fecha <= %s", params)
+        actual = {tuple(r[:2]): r[2:] for r in cur.fetchall()}
+        cur.execute(fuente, params)
+        esperado = {tuple(r[:2]): r[2:] for r in cur.fetchall()}
+
+    def iguales(a, b):
+        return all(abs(float(x or 0) - float(y or 0)) < 0.005 for x, y in zip(a, b))
+
+    diferencias = []
+    for clave in sorted(set(actual) | set(esperado), key=lambda c: (str(c[0]), c[1])):
+        a, e = actual.get(clave), esperado.get(clave)
+        if a is None or e is None or not iguales(a, e):
+            fecha, id_usuario = clave
+            diferencias.append({"fecha": _fecha_parametro(fecha), "idUsuario": id_usuario,
+                                "resumen": a, "esperado": e})
+    return diferencias
+
+
+def resumen_ventas_rango():
+    """(primera, última) fecha con ventas en tbVenta, o (None, None)"""
+    with connection.cursor() as cur:
+        cur.execute("SELECT CAST(MIN(fecha) AS DATE), CAST(MAX(fecha) AS DATE) FROM dbo.tbVenta")
+        primera, ultima = cur.fetchone()
+    return _fecha_parametro(primera) if primera else None, _fecha_parametro(ultima) if ultima else None
+
+
+# -----------------------
+# ESTADÍSTICAS DE MOVIMIENTOS
+# -----------------------
+# tbProductoMovimientoEstadistica guarda por producto la fecha del último
+# movimiento y las entradas/salidas de la ventana de 30 días, para servir los
+# reportes de inventario con una sola pasada sobre tbProducto. Cada movimiento la
+# actualiza en su propia transacción sumando a los contadores; la pasada nocturna
+# (`estadisticas_inventario --recortar`) los recalcula desde la medianoche de hace
+# 30 días, descarta lo que salió de la ventana y guarda ese inicio en la propiedad
+# ventanaDesde. Entre pasadas la ventana es de 30 días más las horas transcurridas
+# desde la última. Los reportes solo la leen si la pasada corrió hoy o ayer; si no,
+# vuelven a calcular sobre tbInventarioMovimiento.
+MOVIMIENTOS_ESTADISTICA_TABLA = "dbo.tbProductoMovimientoEstadistica"
+MOVIMIENTOS_VENTANA_DIAS = 30
+
+_SQL_ESTADISTICA_CREAR = """
+IF OBJECT_ID('dbo.tbProductoMovimientoEstadistica') IS NULL
+    CREATE TABLE dbo.tbProductoMovimientoEstadistica (
+        idProducto INT NOT NULL CONSTRAINT PK_tbProductoMovimientoEstadistica PRIMARY KEY,
+        ultimoMovimiento DATETIME NULL,
+        entradas30 INT NOT NULL,
+        salidas30 INT NOT NULL
+    );
+"""
+
+# Agregado de tbInventarioMovimiento por producto; los contadores desde {desde}
+_SQL_ESTADISTICA_FUENTE = """
+    SELECT m.idProducto, MAX(m.fecha),
+           SUM(CASE WHEN m.tipo = 'E' AND m.fecha >= %s THEN m.cantidad ELSE 0 END),
+           SUM(CASE WHEN m.tipo = 'S' AND m.fecha >= %s THEN m.cantidad ELSE 0 END)
+    FROM dbo.tbInventarioMovimiento m {hint}
+    {filtro}
+    GROUP BY m.idProducto
+"""
+
+_estadisticas_movimientos = {"listo": None, "leido_en": 0.0}
+
+
+def _acumular_estadisticas_movimientos(cur, movimientos):
+    """
+    Suma movimientos recién insertados (misma transacción) a las estadísticas.
+    movimientos: [(idProducto, tipo, cantidad)]. Si la tabla no existe no hace nada.
+    """
+    por_producto = {}
+    for id_producto, tipo, cantidad in movimientos:
+        entradas, salidas = por_producto.get(id_producto, (0, 0))
+        if tipo == 'E':
+            entradas += cantidad
+        else:
+            salidas += cantidad
+        por_producto[id_producto] = (entradas, salidas)
+    # Ids en orden: las transacciones concurrentes bloquean las filas en el mismo orden
+    filas = [(id_p, e, s) for id_p, (e, s) in sorted(por_producto.items())]
+    for lote in _lotes(filas, 3):
+        valores = ", ".join(["(%s, %s, %s)"] * len(lote))
+        cur.execute(f"""
+            IF OBJECT_ID('dbo.tbProductoMovimientoEstadistica') IS NOT NULL
+            MERGE dbo.tbProductoMovimientoEstadistica WITH (HOLDLOCK) AS e
+            USING (VALUES {valores}) AS s (idProducto, entradas, salidas)
+            ON e.idProducto = s.idProducto
+            WHEN MATCHED THEN UPDATE SET
+                ultimoMovimiento = GETDATE(),
+                entradas30 = e.entradas30 + s.entradas, salidas30 = e.salidas30 + s.salidas
+            WHEN NOT MATCHED THEN
+                INSERT (idProducto, ultimoMovimiento, entradas30, salidas30)
+                VALUES (s.idProducto, GETDATE(), s.entradas, s.salidas);
+        """, [v for fila in lote for v in fila])
+
+
+def estadisticas_movimientos_crear():
+    """Crea tbProductoMovimientoEstadistica si no existe (los reportes no la usan hasta recalcular)"""
+    with connection.cursor() as cur:
+        cur.execute(_SQL_ESTADISTICA_CREAR)
+
+
+def estadisticas_movimientos_existe() -> bool:
+    with connection.cursor() as cur:
+        cur.execute("SELECT OBJECT_ID('dbo.tbProductoMovimientoEstadistica')")
+        return cur.fetchone()[0] is not None
+
+
+def _inicio_ventana_movimientos(cur) -> datetime.date:
+    """Medianoche de hace MOVIMIENTOS_VENTANA_DIAS días según el reloj de SQL Server"""
+    cur.execute("SELECT CAST(DATEADD(DAY, %s, CAST(GETDATE() AS DATE)) AS DATE)", [-MOVIMIENTOS_VENTANA_DIAS])
+    return _fecha_parametro(cur.fetchone()[0])
+
+
+def estadisticas_movimientos_recalcular(completo: bool = False):
+    """
+    Recalcula los contadores desde el inicio de la ventana y lo guarda en ventanaDesde.
+    completo=False (pasada nocturna) solo lee los movimientos de la ventana: adelanta
+    ultimoMovimiento si hace falta y pone en cero a los productos que quedaron fuera.
+    completo=True (creación y reparación) relee todo el historial y reemplaza también
+    ultimoMovimiento. El bloqueo de rango sobre tbInventarioMovimiento hace que los
+    movimientos concurrentes esperen y luego sumen sobre lo recalculado.
+    Retorna (filas escritas, inicio de la ventana).
+    """
+    with transaction.atomic(), connection.cursor() as cur:
+        desde = _inicio_ventana_movimientos(cur)
+        fuente = _SQL_ESTADISTICA_FUENTE.format(
+            hint="WITH (HOLDLOCK)", filtro="" if completo else "WHERE m.fecha >= %s")
+        if completo:
+            ultimo = "s.ultimo"
+            sin_movimientos = "WHEN NOT MATCHED BY SOURCE THEN DELETE"
+        else:
+            ultimo = ("CASE WHEN e.ultimoMovimiento IS NULL OR e.ultimoMovimiento < s.ultimo "
+                      "THEN s.ultimo ELSE e.ultimoMovimiento END")
+            sin_movimientos = ("WHEN NOT MATCHED BY SOURCE AND (e.entradas30 <> 0 OR e.salidas30 <> 0) "
+                               "THEN UPDATE SET entradas30 = 0, salidas30 = 0")
+        cur.execute(f"""
+            MERGE dbo.tbProductoMovimientoEstadistica WITH (HOLDLOCK) AS e
+            USING ({fuente}) AS s (idProducto, ultimo, entradas, salidas)
+            ON e.idProducto = s.idProducto
+            WHEN MATCHED THEN UPDATE SET
+                ultimoMovimiento = {ultimo}, entradas30 = s.entradas, salidas30 = s.salidas
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT (idProducto, ultimoMovimiento, entradas30, salidas30)
+                VALUES (s.idProducto, s.ultimo, s.entradas, s.salidas)
+            {sin_movimientos};
+        """, [str(desde)] * (2 if completo else 3))
+        filas = cur.rowcount
+        _fijar_propiedad_tabla("tbProductoMovimientoEstadistica", "ventanaDesde", str(desde))
+    _estadisticas_movimientos["listo"] = None
+    _versiones_reportes.incrementar(["inventario"])
+    return filas, desde
+
+
+def estadisticas_movimientos_desactivar():
+    """Borra ventanaDesde: los reportes vuelven a calcular sobre tbInventarioMovimiento"""
+    _fijar_propiedad_tabla("tbProductoMovimientoEstadistica", "ventanaDesde", "")
+    _estadisticas_movimientos["listo"] = None
+    _versiones_reportes.incrementar(["inventario"])
+
+
+def estadisticas_movimientos_ventana():
+    """Inicio de la ventana de la última pasada (date), o None si no hay"""
+    if not estadisticas_movimientos_existe():
+        return None
+    return _fecha_parametro(_leer_propiedad_tabla("tbProductoMovimientoEstadistica", "ventanaDesde"))
+
+
+def _estadisticas_movimientos_listas() -> bool:
+    """True si la última pasada de ventana corrió hoy o ayer (se relee cada minuto)"""
+    if (_estadisticas_movimientos["listo"] is None
+            or time.monotonic() - _estadisticas_movimientos["leido_en"] > 60):
+        desde = estadisticas_movimientos_ventana()
+        minimo = _fecha_hoy_bd() - datetime.timedelta(days=MOVIMIENTOS_VENTANA_DIAS + 1)
+        _estadisticas_movimientos["listo"] = desde is not None and desde >= minimo
+        _estadisticas_movimientos["leido_en"] = time.monotonic()
+    return _estadisticas_movimientos["listo"]
+
+
+def _desde_estadisticas(consultar_estadisticas, consultar_bd):
+    """consultar_estadisticas() si están al día; si no (o falla), consultar_bd()"""
+    if _estadisticas_movimientos_listas():
+        try:
+            return consultar_estadisticas()
+        except Exception as e:
+            print(f"Estadísticas de movimientos no disponibles, se usa tbInventarioMovimiento: {e}")
+            _estadisticas_movimientos["listo"] = False
+            _estadisticas_movimientos["leido_en"] = time.monotonic()
+    return consultar_bd()
+
+
+def estadisticas_movimientos_diferencias() -> list:
+    """
+    Productos cuyas estadísticas no coinciden con tbInventarioMovimiento (ventana desde
+    ventanaDesde): [{idProducto, actual: (ultimo, entradas, salidas)|None, esperado: ...}]
+    """
+    desde = estadisticas_movimientos_ventana()
+    if desde is None:
+        return []
+    fuente = _SQL_ESTADISTICA_FUENTE.format(hint="", filtro="")
+    with connection.cursor() as cur:
+        cur.execute("SELECT idProducto, ultimoMovimiento, entradas30, salidas30 "
+                    "FROM dbo.tbProductoMovimientoEstadistica")
+        actual = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+        cur.execute(fuente, [str(desde)] * 2)
+        esperado = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+
+    def iguales(a, b):
+        a, b = a or (None, 0, 0), b or (None, 0, 0)
+        # El ultimoMovimiento incremental es el GETDATE() de la transacción, no la fecha de la fila
+        if (a[0] is None) != (b[0] is None):
+            return False
+        if a[0] is not None and abs((a[0] - b[0]).total_seconds()) >= 2:
+            return False
+        return (a[1] or 0) == (b[1] or 0) and (a[2] or 0) == (b[2] or 0)
+
+    return [{"idProducto": id_p, "actual": actual.get(id_p), "esperado": esperado.get(id_p)}
+            for id_p in sorted(set(actual) | set(esperado))
+            if not iguales(actual.get(id_p), esperado.get(id_p))]
+
+
 # -----------------------
 # REPORTES
 # -----------------------
+# Caché de resultados de reportes por parámetros normalizados. Las ventas solo se
+# agregan con la fecha del servidor (GETDATE), así que un período que terminó antes
+# de ayer ya no cambia: sus resultados se guardan sin vencimiento. Lo que toca el
+# período abierto (desde ayer) lleva la versión "hoy", que cada venta confirmada
+# incrementa. Ayer queda abierto para cubrir ventas que confirman pasada la medianoche
+# y la diferencia de reloj con SQL Server. Los reportes que muestran nombres de
+# producto o filtran por categoría llevan además la versión "maestros".
+_cache_reportes = CacheLRU(
+    "reportes",
+    max_items=getattr(settings, "REPORTES_CACHE_MAX", 512),
+    ttl=getattr(settings, "REPORTES_CACHE_TTL_SEGUNDOS", 300),
+)
+_versiones_reportes = Versiones("reportes")
+_hoy_bd = {"fecha": None, "leida_en": 0.0}
+
+
+def _tocar_reportes_de_ventas():
+    _versiones_reportes.incrementar(["hoy"])
+
+
+suscribir("venta", lambda **_: _tocar_reportes_de_ventas())
+for _evento in ("stock", "producto"):
+    suscribir(_evento, lambda **_: _versiones_reportes.incrementar(["inventario"]))
+for _evento in ("producto", "producto_categoria", "categoria"):
+    suscribir(_evento, lambda **_: _versiones_reportes.incrementar(["maestros"]))
+
+
+def _fecha_hoy_bd() -> datetime.date:
+    """
+    Fecha actual de SQL Server (la que usa tbVenta.fecha), releída cada minuto.
+    Una lectura vieja solo puede adelantar el inicio del período abierto.
+    """
+    if _hoy_bd["fecha"] is None or time.monotonic() - _hoy_bd["leida_en"] > 60:
+        with connection.cursor() as cur:
+            cur.execute("SELECT CAST(GETDATE() AS DATE)")
+            fecha = cur.fetchone()[0]
+        fecha = _fecha_parametro(fecha)
+        _hoy_bd["fecha"], _hoy_bd["leida_en"] = fecha, time.monotonic()
+    return _hoy_bd["fecha"]
+
+
+def _inicio_periodo_abierto() -> datetime.date:
+    """Primer día que todavía puede recibir ventas (ayer)"""
+    return _fecha_hoy_bd() - datetime.timedelta(days=1)
+
+
+def _fecha_parametro(valor):
+    """'YYYY-MM-DD' (o date/datetime) como date; None si no se puede interpretar"""
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    try:
+        return datetime.date.fromisoformat(str(valor).strip()[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _leer_reporte(clave: tuple, abierto: bool, cargar, maestros: bool = False,
+                  grupo: str = "hoy"):
+    """
+    Filas del reporte `clave` desde la caché, o cargar() si no hay entrada vigente.
+    Las versiones se toman antes de consultar: una venta en medio deja la entrada inválida.
+    """
+    version = (
+        _versiones_reportes.actual(grupo) if abierto else 0,
+        _versiones_reportes.actual("maestros") if maestros else 0,
+    )
+    clave = (grupo if abierto else "cerrado",) + clave
+    filas = _cache_reportes.get(clave, None, version)
+    if filas is None:
+        filas = cargar()
+        # ttl=0: un período cerrado no vence (solo lo desaloja el LRU)
+        _cache_reportes.set(clave, filas, ttl=None if abierto else 0, version=version)
+    return [dict(f) for f in filas]
+
+
+def _reporte_por_dias(clave: tuple, desde, hasta, consultar, maestros: bool = False):
+    """
+    consultar(desde, hasta) -> filas por día ordenadas por fecha DESC, partido en el
+    tramo cerrado (en caché sin vencimiento) y el abierto (se invalida con cada venta).
+    Si las fechas no se pueden interpretar se consulta directo, como antes.
+    """
+    d, h = _fecha_parametro(desde), _fecha_parametro(hasta)
+    if d is None or h is None or d > h:
+        return consultar(desde, hasta)
+    limite = _inicio_periodo_abierto()
+    filas = []
+    if h >= limite:
+        inicio = max(d, limite)
+        filas += _leer_reporte(clave + (inicio, h), True, lambda: consultar(inicio, h), maestros)
+    if d < limite:
+        fin = min(h, limite - datetime.timedelta(days=1))
+        filas += _leer_reporte(clave + (d, fin), False, lambda: consultar(d, fin), maestros)
+    return filas
+
+
+def _reporte_por_tramos(clave: tuple, primero, ultimo, corte: int, consultar):
+    """
+    consultar(primero, ultimo) -> filas por mes o año en orden ascendente, partido en
+    `corte`: los períodos anteriores son cerrados y los demás abiertos (None = sin límite).
+    """
+    filas = []
+    if primero is None or primero < corte:
+        fin = corte - 1 if ultimo is None else min(ultimo, corte - 1)
+        filas += _leer_reporte(clave + (primero, fin), False, lambda: consultar(primero, fin))
+    if ultimo is None or ultimo >= corte:
+        inicio = corte if primero is None else max(primero, corte)
+        filas += _leer_reporte(clave + (inicio, ultimo), True, lambda: consultar(inicio, ultimo))
+    return filas
+
+
+def _ventas_por_fecha_bd(desde, hasta, id_usuario_filtro, id_categoria):
+    """
+    Total por día entre desde y hasta (inclusive), fecha DESC. Con categoría siempre
+    agrega tbVenta: el filtro usa las categorías actuales y el resumen no las tiene.
+    """
+    desde, hasta = _fecha_parametro(desde), _fecha_parametro(hasta)
+    if desde is None or hasta is None:
+        return []
+    if id_categoria is not None:
+        return _ventas_por_fecha_tbventa(desde, hasta, id_usuario_filtro, id_categoria)
+    return _desde_resumen(
+        lambda: _ventas_por_fecha_resumen(desde, hasta, id_usuario_filtro),
+        lambda: _ventas_por_fecha_tbventa(desde, hasta, id_usuario_filtro, id_categoria),
+    )
+
+
+def _ventas_por_fecha_resumen(desde, hasta, id_usuario_filtro):
+    sql = """
+    SELECT fecha, SUM(total) AS total
+    FROM dbo.tbVentaResumenDiario
+    WHERE fecha >= CAST(%s AS DATE) AND fecha <= CAST(%s AS DATE)
+      AND (%s IS NULL OR idUsuario = %s)
+    GROUP BY fecha
+    ORDER BY fecha DESC
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [str(desde), str(hasta), id_usuario_filtro, id_usuario_filtro])
+        rows = cur.fetchall()
+    return [{'fecha': _fecha_parametro(fecha), 'total': total} for fecha, total in rows]
+
+
+def _ventas_por_fecha_tbventa(desde, hasta, id_usuario_filtro, id_categoria):
+    sql = """
+    SELECT 
+        CAST(v.fecha AS DATE) AS fecha,
+        SUM(v.total) AS total
+    FROM dbo.tbVenta v
+    WHERE v.fecha >= CAST(%s AS DATETIME)
+      AND v.fecha < DATEADD(DAY, 1, CAST(%s AS DATETIME))
+      AND (%s IS NULL OR v.idUsuario = %s)
+      AND (
+           %s IS NULL OR EXISTS(
+             SELECT 1
+             FROM dbo.tbVentaDetalle vd
+             JOIN dbo.tbProductoCategoria pc ON pc.idProducto = vd.idProducto
+             WHERE vd.idVenta = v.idVenta AND pc.idCategoria = %s
+           )
+      )
+    GROUP BY CAST(v.fecha AS DATE)
+    ORDER BY fecha DESC
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [str(desde), str(hasta), id_usuario_filtro, id_usuario_filtro, id_categoria, id_categoria])
+        rows = cur.fetchall()
+        cols = [c[0].lower() for c in cur.description] if rows else []
+    return [dict(zip(cols, r)) for r in rows]
+
+
 def sp_reporte_ventas_por_fecha(desde, hasta, id_usuario_filtro=None, id_categoria=None, id_usuario_accion=None, exportar=None):
     """Reporte de ventas por fecha
     
@@ -1237,30 +2846,12 @@ def sp_reporte_ventas_por_fecha(desde, hasta, id_usuario_filtro=None, id_categor
     Retorna: fecha, total
     """
     try:
-        # 1. Obtener datos del reporte
-        with connection.cursor() as cur:
-            sql = """
-            SELECT 
-                CAST(v.fecha AS DATE) AS fecha,
-                SUM(v.total) AS total
-            FROM dbo.tbVenta v
-            WHERE v.fecha >= CAST(%s AS DATETIME)
-              AND v.fecha < DATEADD(DAY, 1, CAST(%s AS DATETIME))
-              AND (%s IS NULL OR v.idUsuario = %s)
-              AND (
-                   %s IS NULL OR EXISTS(
-                     SELECT 1
-                     FROM dbo.tbVentaDetalle vd
-                     JOIN dbo.tbProductoCategoria pc ON pc.idProducto = vd.idProducto
-                     WHERE vd.idVenta = v.idVenta AND pc.idCategoria = %s
-                   )
-              )
-            GROUP BY CAST(v.fecha AS DATE)
-            ORDER BY fecha DESC
-            """
-            cur.execute(sql, [desde, hasta, id_usuario_filtro, id_usuario_filtro, id_categoria, id_categoria])
-            rows = cur.fetchall()
-            cols = [c[0].lower() for c in cur.description] if rows else []
+        # 1. Obtener datos del reporte (caché por tramo cerrado/abierto)
+        rows = _reporte_por_dias(
+            ("ventas_fecha", id_usuario_filtro, id_categoria), desde, hasta,
+            lambda d, h: _ventas_por_fecha_bd(d, h, id_usuario_filtro, id_categoria),
+            maestros=id_categoria is not None,
+        )
         
         # 2. Registrar en bitácora SOLO si se está exportando
         if id_usuario_accion and exportar:
@@ -1283,10 +2874,7 @@ def sp_reporte_ventas_por_fecha(desde, hasta, id_usuario_filtro=None, id_categor
             connection.commit()
             print(f"✅ Exportación registrada en bitácora: EXPORTAR_VENTAS_FECHA ({exportar.upper()}), usuario={id_usuario_accion}")
         
-        if not rows:
-            return []
-        
-        return [dict(zip(cols, r)) for r in rows]
+        return rows
     except Exception as e:
         print(f"❌ Error en sp_reporte_ventas_por_fecha: {e}")
         import traceback
@@ -1306,36 +2894,9 @@ def sp_reporte_inventario_actual(solo_criticos: bool = False, id_usuario_accion=
     Retorna: idProducto, nombre, stockActual, stockMinimo, entradas30, salidas30
     """
     try:
-        # 1. Obtener datos del reporte
-        with connection.cursor() as cur:
-            sql = """
-            SELECT 
-                p.idProducto,
-                p.codigo,
-                p.nombre,
-                p.estado,
-                p.stockActual,
-                p.stockMinimo,
-                CASE WHEN p.stockActual <= p.stockMinimo THEN 1 ELSE 0 END AS Critico,
-                (SELECT MAX(fecha) FROM dbo.tbInventarioMovimiento m WHERE m.idProducto = p.idProducto) AS UltimoMovimiento,
-                ISNULL((SELECT SUM(cantidad) FROM dbo.tbInventarioMovimiento m 
-                        WHERE m.idProducto = p.idProducto 
-                          AND m.tipo = 'E' 
-                          AND m.fecha >= DATEADD(DAY, -30, GETDATE())), 0) AS EntradasUlt30,
-                ISNULL((SELECT SUM(cantidad) FROM dbo.tbInventarioMovimiento m 
-                        WHERE m.idProducto = p.idProducto 
-                          AND m.tipo = 'S' 
-                          AND m.fecha >= DATEADD(DAY, -30, GETDATE())), 0) AS SalidasUlt30
-            FROM dbo.tbProducto p
-            WHERE (%s = 0 OR p.stockActual <= p.stockMinimo)
-              AND p.estado = 'activo'
-            ORDER BY 
-                CASE WHEN p.stockActual <= p.stockMinimo THEN 0 ELSE 1 END,
-                p.nombre
-            """
-            cur.execute(sql, [1 if solo_criticos else 0])
-            rows = cur.fetchall()
-            cols_orig = [c[0] for c in cur.description] if rows else []
+        # 1. Obtener datos del reporte (caché; cualquier cambio de stock lo invalida)
+        rows = _leer_reporte(("inventario", bool(solo_criticos)), True,
+                             lambda: _inventario_actual_bd(solo_criticos), grupo="inventario")
         
         # 2. Registrar en bitácora SOLO si se está exportando
         if id_usuario_accion and exportar:
@@ -1355,27 +2916,7 @@ def sp_reporte_inventario_actual(solo_criticos: bool = False, id_usuario_accion=
             connection.commit()
             print(f"✅ Exportación registrada en bitácora: EXPORTAR_INVENTARIO ({exportar.upper()}), usuario={id_usuario_accion}")
         
-        if not rows:
-            return []
-        
-        # Mapear a los nombres que espera el frontend
-        result = []
-        for row in rows:
-            data_dict = dict(zip(cols_orig, row))
-            normalized = {
-                'idProducto': data_dict.get('idProducto'),
-                'nombre': data_dict.get('nombre'),
-                'stockActual': data_dict.get('stockActual'),
-                'stockMinimo': data_dict.get('stockMinimo'),
-                'entradas30': data_dict.get('EntradasUlt30', 0),
-                'salidas30': data_dict.get('SalidasUlt30', 0),
-                'codigo': data_dict.get('codigo'),
-                'estado': data_dict.get('estado'),
-                'critico': data_dict.get('Critico', 0)
-            }
-            result.append(normalized)
-        
-        return result
+        return rows
     except Exception as e:
         print(f"❌ Error en sp_reporte_inventario_actual: {e}")
         import traceback
@@ -1384,6 +2925,81 @@ def sp_reporte_inventario_actual(solo_criticos: bool = False, id_usuario_accion=
         return []
 
 
+_SQL_INVENTARIO_ACTUAL = """
+    SELECT 
+        p.idProducto,
+        p.codigo,
+        p.nombre,
+        p.estado,
+        p.stockActual,
+        p.stockMinimo,
+        CASE WHEN p.stockActual <= p.stockMinimo THEN 1 ELSE 0 END AS Critico,
+        {movimientos}
+    FROM dbo.tbProducto p
+    {join}
+    WHERE (%s = 0 OR p.stockActual <= p.stockMinimo)
+      AND p.estado = 'activo'
+    ORDER BY 
+        CASE WHEN p.stockActual <= p.stockMinimo THEN 0 ELSE 1 END,
+        p.nombre
+"""
+
+# Una sola pasada por tbProducto con las estadísticas mantenidas por los movimientos
+_INVENTARIO_DESDE_ESTADISTICAS = {
+    "movimientos": """e.ultimoMovimiento AS UltimoMovimiento,
+        ISNULL(e.entradas30, 0) AS EntradasUlt30,
+        ISNULL(e.salidas30, 0) AS SalidasUlt30""",
+    "join": "LEFT JOIN dbo.tbProductoMovimientoEstadistica e ON e.idProducto = p.idProducto",
+}
+
+# Respaldo: tres subconsultas correlacionadas sobre tbInventarioMovimiento por producto
+_INVENTARIO_DESDE_MOVIMIENTOS = {
+    "movimientos": """(SELECT MAX(fecha) FROM dbo.tbInventarioMovimiento m WHERE m.idProducto = p.idProducto) AS UltimoMovimiento,
+        ISNULL((SELECT SUM(cantidad) FROM dbo.tbInventarioMovimiento m 
+                WHERE m.idProducto = p.idProducto 
+                  AND m.tipo = 'E' 
+                  AND m.fecha >= DATEADD(DAY, -30, GETDATE())), 0) AS EntradasUlt30,
+        ISNULL((SELECT SUM(cantidad) FROM dbo.tbInventarioMovimiento m 
+                WHERE m.idProducto = p.idProducto 
+                  AND m.tipo = 'S' 
+                  AND m.fecha >= DATEADD(DAY, -30, GETDATE())), 0) AS SalidasUlt30""",
+    "join": "",
+}
+
+
+def _inventario_actual_bd(solo_criticos: bool):
+    """Filas de sp_reporte_inventario_actual con los nombres que espera el frontend"""
+    def consultar(partes):
+        with connection.cursor() as cur:
+            cur.execute(_SQL_INVENTARIO_ACTUAL.format(**partes), [1 if solo_criticos else 0])
+            rows = cur.fetchall()
+            return rows, [c[0] for c in cur.description] if rows else []
+
+    rows, cols_orig = _desde_estadisticas(
+        lambda: consultar(_INVENTARIO_DESDE_ESTADISTICAS),
+        lambda: consultar(_INVENTARIO_DESDE_MOVIMIENTOS),
+    )
+    
+    # Mapear a los nombres que espera el frontend
+    result = []
+    for row in rows:
+        data_dict = dict(zip(cols_orig, row))
+        normalized = {
+            'idProducto': data_dict.get('idProducto'),
+            'nombre': data_dict.get('nombre'),
+            'stockActual': data_dict.get('stockActual'),
+            'stockMinimo': data_dict.get('stockMinimo'),
+            'entradas30': data_dict.get('EntradasUlt30', 0),
+            'salidas30': data_dict.get('SalidasUlt30', 0),
+            'codigo': data_dict.get('codigo'),
+            'estado': data_dict.get('estado'),
+            'critico': data_dict.get('Critico', 0)
+        }
+        result.append(normalized)
+    
+    return result
+
+
 def sp_reporte_productos_mas_vendidos(top_n: int = 10, desde=None, hasta=None, id_usuario_accion=None, exportar=None):
     """Reporte de productos más vendidos
     
@@ -1397,26 +3013,16 @@ def sp_reporte_productos_mas_vendidos(top_n: int = 10, desde=None, hasta=None, i
     Retorna: nombre, codigo, cantidad, ingresos
     """
     try:
-        # 1. Obtener datos del reporte
-        with connection.cursor() as cur:
-            sql = """
-            SELECT TOP(%s)
-                p.idProducto,
-                p.codigo,
-                p.nombre,
-                SUM(vd.cantidad) AS Cantidad,
-                SUM(vd.totalLinea) AS Ingreso
-            FROM dbo.tbVentaDetalle vd
-            JOIN dbo.tbVenta v ON v.idVenta = vd.idVenta
-            JOIN dbo.tbProducto p ON p.idProducto = vd.idProducto
-            WHERE (%s IS NULL OR v.fecha >= CAST(%s AS DATETIME))
-              AND (%s IS NULL OR v.fecha < DATEADD(DAY, 1, CAST(%s AS DATETIME)))
-            GROUP BY p.idProducto, p.codigo, p.nombre
-            ORDER BY SUM(vd.cantidad) DESC, SUM(vd.totalLinea) DESC
-            """
-            cur.execute(sql, [top_n, desde, desde, hasta, hasta])
-            rows = cur.fetchall()
-            cols_orig = [c[0] for c in cur.description] if rows else []
+        # 1. Obtener datos del reporte (caché; el ranking no se puede partir por tramos,
+        #    así que solo es cerrado si el rango termina antes del período abierto)
+        d = _fecha_parametro(desde) if desde else None
+        h = _fecha_parametro(hasta) if hasta else None
+        if (desde and d is None) or (hasta and h is None):
+            rows = _mas_vendidos_bd(top_n, desde, hasta)
+        else:
+            abierto = h is None or h >= _inicio_periodo_abierto()
+            rows = _leer_reporte(("mas_vendidos", int(top_n), d, h), abierto,
+                                 lambda: _mas_vendidos_bd(top_n, d, h), maestros=True)
         
         # 2. Registrar en bitácora SOLO si se está exportando
         if id_usuario_accion and exportar:
@@ -1438,23 +3044,7 @@ def sp_reporte_productos_mas_vendidos(top_n: int = 10, desde=None, hasta=None, i
             connection.commit()
             print(f"✅ Exportación registrada en bitácora: EXPORTAR_MAS_VENDIDOS ({exportar.upper()}), usuario={id_usuario_accion}")
         
-        if not rows:
-            return []
-        
-        # Mapear a los nombres que espera el frontend
-        result = []
-        for row in rows:
-            data_dict = dict(zip(cols_orig, row))
-            normalized = {
-                'idProducto': data_dict.get('idProducto'),
-                'nombre': data_dict.get('nombre'),
-                'codigo': data_dict.get('codigo'),
-                'cantidad': data_dict.get('Cantidad', 0),
-                'ingresos': float(data_dict.get('Ingreso', 0))
-            }
-            result.append(normalized)
-        
-        return result
+        return rows
     except Exception as e:
         print(f"❌ Error en sp_reporte_productos_mas_vendidos: {e}")
         import traceback
@@ -1463,6 +3053,46 @@ def sp_reporte_productos_mas_vendidos(top_n: int = 10, desde=None, hasta=None, i
         return []
 
 
+def _mas_vendidos_bd(top_n, desde, hasta):
+    """Top N productos por cantidad vendida entre desde y hasta (inclusive, opcionales)"""
+    desde = str(desde) if desde else None
+    hasta = str(hasta) if hasta else None
+    with connection.cursor() as cur:
+        sql = """
+        SELECT TOP(%s)
+            p.idProducto,
+            p.codigo,
+            p.nombre,
+            SUM(vd.cantidad) AS Cantidad,
+            SUM(vd.totalLinea) AS Ingreso
+        FROM dbo.tbVentaDetalle vd
+        JOIN dbo.tbVenta v ON v.idVenta = vd.idVenta
+        JOIN dbo.tbProducto p ON p.idProducto = vd.idProducto
+        WHERE (%s IS NULL OR v.fecha >= CAST(%s AS DATETIME))
+          AND (%s IS NULL OR v.fecha < DATEADD(DAY, 1, CAST(%s AS DATETIME)))
+        GROUP BY p.idProducto, p.codigo, p.nombre
+        ORDER BY SUM(vd.cantidad) DESC, SUM(vd.totalLinea) DESC
+        """
+        cur.execute(sql, [top_n, desde, desde, hasta, hasta])
+        rows = cur.fetchall()
+        cols_orig = [c[0] for c in cur.description] if rows else []
+    
+    # Mapear a los nombres que espera el frontend
+    result = []
+    for row in rows:
+        data_dict = dict(zip(cols_orig, row))
+        normalized = {
+            'idProducto': data_dict.get('idProducto'),
+            'nombre': data_dict.get('nombre'),
+            'codigo': data_dict.get('codigo'),
+            'cantidad': data_dict.get('Cantidad', 0),
+            'ingresos': float(data_dict.get('Ingreso', 0))
+        }
+        result.append(normalized)
+    
+    return result
+
+
 def sp_reporte_ingresos_totales(modo: str = 'mensual', anio: int = None, id_usuario_accion=None, exportar=None):
     """Reporte de ingresos totales (mensual/anual)
     
@@ -1475,38 +3105,17 @@ def sp_reporte_ingresos_totales(modo: str = 'mensual', anio: int = None, id_usua
     Retorna: mes/anio, ingresos
     """
     try:
-        # 1. Obtener datos del reporte
-        with connection.cursor() as cur:
+        # 1. Obtener datos del reporte (caché: meses/años cerrados + período abierto)
+        limite = _inicio_periodo_abierto()
+        if modo == 'mensual':
             # Si no se especifica año, usar el actual
-            if modo == 'mensual' and anio is None:
-                cur.execute("SELECT YEAR(GETDATE())")
-                anio = cur.fetchone()[0]
-            
-            # Consulta directa
-            if modo == 'mensual':
-                sql = """
-                SELECT 
-                    MONTH(v.fecha) AS Mes,
-                    SUM(v.total) AS Ingresos
-                FROM dbo.tbVenta v
-                WHERE YEAR(v.fecha) = %s
-                GROUP BY MONTH(v.fecha)
-                ORDER BY Mes
-                """
-                cur.execute(sql, [anio])
-            else:  # anual
-                sql = """
-                SELECT 
-                    YEAR(v.fecha) AS Anio,
-                    SUM(v.total) AS Ingresos
-                FROM dbo.tbVenta v
-                GROUP BY YEAR(v.fecha)
-                ORDER BY Anio
-                """
-                cur.execute(sql)
-            
-            rows = cur.fetchall()
-            cols_orig = [c[0] for c in cur.description] if rows else []
+            if anio is None:
+                anio = _fecha_hoy_bd().year
+            corte = 13 if anio < limite.year else (1 if anio > limite.year else limite.month)
+            rows = _reporte_por_tramos(("ingresos_mes", anio), 1, 12, corte,
+                                       lambda m1, m2: _ingresos_mensuales_bd(anio, m1, m2))
+        else:  # anual
+            rows = _reporte_por_tramos(("ingresos_anio",), None, None, limite.year, _ingresos_anuales_bd)
         
         # 2. Registrar en bitácora SOLO si se está exportando
         if id_usuario_accion and exportar:
@@ -1527,29 +3136,93 @@ def sp_reporte_ingresos_totales(modo: str = 'mensual', anio: int = None, id_usua
             connection.commit()
             print(f"✅ Exportación registrada en bitácora: EXPORTAR_INGRESOS ({exportar.upper()}), usuario={id_usuario_accion}")
         
-        if not rows:
-            return []
-        
-        # Mapear a los nombres que espera el frontend
-        result = []
-        for row in rows:
-            data_dict = dict(zip(cols_orig, row))
-            if modo == 'mensual':
-                normalized = {
-                    'mes': data_dict.get('Mes'),
-                    'ingresos': float(data_dict.get('Ingresos', 0))
-                }
-            else:
-                normalized = {
-                    'anio': data_dict.get('Anio'),
-                    'ingresos': float(data_dict.get('Ingresos', 0))
-                }
-            result.append(normalized)
-        
-        return result
+        return rows
     except Exception as e:
         print(f"❌ Error en sp_reporte_ingresos_totales: {e}")
         import traceback
         traceback.print_exc()
         connection.rollback()
-        return []
\ No newline at end of file
+        return []
+
+
+def _ingresos_mensuales_bd(anio: int, mes_desde: int, mes_hasta: int):
+    """Ingresos por mes de `anio` entre mes_desde y mes_hasta"""
+    return _desde_resumen(
+        lambda: _ingresos_mensuales_resumen(anio, mes_desde, mes_hasta),
+        lambda: _ingresos_mensuales_tbventa(anio, mes_desde, mes_hasta),
+    )
+
+
+def _ingresos_mensuales_resumen(anio: int, mes_desde: int, mes_hasta: int):
+    sql = """
+    SELECT MONTH(fecha) AS Mes, SUM(total) AS Ingresos
+    FROM dbo.tbVentaResumenDiario
+    WHERE fecha >= DATEFROMPARTS(%s, %s, 1)
+      AND fecha < DATEADD(MONTH, 1, DATEFROMPARTS(%s, %s, 1))
+    GROUP BY MONTH(fecha)
+    ORDER BY Mes
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [anio, mes_desde, anio, mes_hasta])
+        rows = cur.fetchall()
+    return [{'mes': mes, 'ingresos': float(ingresos or 0)} for mes, ingresos in rows]
+
+
+def _ingresos_mensuales_tbventa(anio: int, mes_desde: int, mes_hasta: int):
+    """Misma consulta sobre tbVenta (rango sobre v.fecha, usa el índice)"""
+    sql = """
+    SELECT 
+        MONTH(v.fecha) AS Mes,
+        SUM(v.total) AS Ingresos
+    FROM dbo.tbVenta v
+    WHERE v.fecha >= DATEFROMPARTS(%s, %s, 1)
+      AND v.fecha < DATEADD(MONTH, 1, DATEFROMPARTS(%s, %s, 1))
+    GROUP BY MONTH(v.fecha)
+    ORDER BY Mes
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [anio, mes_desde, anio, mes_hasta])
+        rows = cur.fetchall()
+    return [{'mes': mes, 'ingresos': float(ingresos or 0)} for mes, ingresos in rows]
+
+
+def _ingresos_anuales_bd(anio_desde=None, anio_hasta=None):
+    """Ingresos por año entre anio_desde y anio_hasta (None = sin límite)"""
+    return _desde_resumen(
+        lambda: _ingresos_anuales_resumen(anio_desde, anio_hasta),
+        lambda: _ingresos_anuales_tbventa(anio_desde, anio_hasta),
+    )
+
+
+def _ingresos_anuales_resumen(anio_desde, anio_hasta):
+    sql = """
+    SELECT YEAR(fecha) AS Anio, SUM(total) AS Ingresos
+    FROM dbo.tbVentaResumenDiario
+    WHERE (%s IS NULL OR fecha >= DATEFROMPARTS(%s, 1, 1))
+      AND (%s IS NULL OR fecha < DATEFROMPARTS(%s, 1, 1))
+    GROUP BY YEAR(fecha)
+    ORDER BY Anio
+    """
+    hasta = anio_hasta + 1 if anio_hasta is not None else None
+    with connection.cursor() as cur:
+        cur.execute(sql, [anio_desde, anio_desde, hasta, hasta])
+        rows = cur.fetchall()
+    return [{'anio': a, 'ingresos': float(ingresos or 0)} for a, ingresos in rows]
+
+
+def _ingresos_anuales_tbventa(anio_desde, anio_hasta):
+    sql = """
+    SELECT 
+        YEAR(v.fecha) AS Anio,
+        SUM(v.total) AS Ingresos
+    FROM dbo.tbVenta v
+    WHERE (%s IS NULL OR v.fecha >= DATEFROMPARTS(%s, 1, 1))
+      AND (%s IS NULL OR v.fecha < DATEFROMPARTS(%s, 1, 1))
+    GROUP BY YEAR(v.fecha)
+    ORDER BY Anio
+    """
+    hasta = anio_hasta + 1 if anio_hasta is not None else None
+    with connection.cursor() as cur:
+        cur.execute(sql, [anio_desde, anio_desde, hasta, hasta])
+        rows = cur.fetchall()
+    return [{'anio': a, 'ingresos': float(ingresos or 0)} for a, ingresos in rows]
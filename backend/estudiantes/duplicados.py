@@ -0,0 +1,286 @@
+"""
+Detección de estudiantes probablemente duplicados.
+
+sp_InsertarEstudiante solo rechaza el correo exacto (RC 2); aquí se buscan
+registros casi iguales ("Maria Lopez" / "María López", jlopez@ / j.lopez@).
+Comparar todos contra todos es O(n²): en su lugar cada estudiante cae en
+unos pocos bloques (claves de bloqueo) y solo se comparan pares dentro del
+mismo bloque:
+  - prefijo del primer apellido + inicial del primer nombre
+  - dominio del correo + prefijo de la parte local (sin puntos ni dígitos)
+  - teléfono
+Los bloques de más de MAX_BLOQUE registros (apellidos comunes, que crecen con
+el padrón) no se comparan completos: se ordenan por nombre y se compara cada
+registro con sus VENTANA vecinos (vecindario ordenado). Así el número de pares
+es a lo sumo claves × n × VENTANA: lineal en el tamaño del padrón.
+
+El puntaje combina Jaro-Winkler del nombre completo y de la parte local del
+correo con la coincidencia de teléfono. En modo incremental (desde_id) solo se
+evalúan los pares donde al menos uno es un estudiante nuevo, y
+cargar_registros_nuevos lee solo los bloques donde caen los nuevos en lugar de
+todo el padrón (lo que usa la API; el padrón completo queda para el comando
+detectar_duplicados).
+"""
+import re
+
+from django.db import connection
+
+from .busqueda import normalizar
+
+UMBRAL = 0.85
+VENTANA = 10
+MAX_BLOQUE = 2 * VENTANA
+
+_PESO_NOMBRE = 0.55
+_PESO_CORREO = 0.30
+_PESO_TELEFONO = 0.15
+
+_SQL_ESTUDIANTES = "SELECT idEstudiante, nombres, apellidos, correo, telefono FROM dbo.tbEstudiante"
+
+# Estudiantes nuevos por consulta en cargar_registros_nuevos
+NUEVOS_POR_CONSULTA = 500
+# Filtros (claves de bloqueo) por sentencia al buscar los bloques de los nuevos
+_FILTROS_POR_SENTENCIA = 200
+# Sin tildes ni mayúsculas, como normalizar()
+_COLACION = "Latin1_General_CI_AI"
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    """Similitud Jaro-Winkler en [0, 1]"""
+    if a == b:
+        return 1.0 if a else 0.0
+    la, lb = len(a), len(b)
+    if not la or not lb:
+        return 0.0
+    rango = max(la, lb) // 2 - 1
+    usados_b = [False] * lb
+    coincidencias_a = []
+    for i, c in enumerate(a):
+        inicio = i - rango if i > rango else 0
+        fin = i + rango + 1
+        if fin > lb:
+            fin = lb
+        j = b.find(c, inicio, fin)
+        while j != -1 and usados_b[j]:
+            j = b.find(c, j + 1, fin)
+        if j != -1:
+            usados_b[j] = True
+            coincidencias_a.append(c)
+    m = len(coincidencias_a)
+    if not m:
+        return 0.0
+    coincidencias_b = [c for c, usado in zip(b, usados_b) if usado]
+    transposiciones = 0
+    for x, y in zip(coincidencias_a, coincidencias_b):
+        if x != y:
+            transposiciones += 1
+    transposiciones /= 2
+    jaro = (m / la + m / lb + (m - transposiciones) / m) / 3
+    prefijo = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefijo += 1
+    return jaro + prefijo * 0.1 * (1 - jaro)
+
+
+class Registro:
+    __slots__ = ("idEstudiante", "nombres", "apellidos", "correo", "telefono",
+                 "nombre_n", "local_n", "dominio", "telefono_n")
+
+    def __init__(self, id_est, nombres, apellidos, correo, telefono):
+        self.idEstudiante = int(id_est)
+        self.nombres = nombres or ""
+        self.apellidos = apellidos or ""
+        self.correo = correo or ""
+        self.telefono = telefono or ""
+        self.nombre_n = normalizar(f"{self.nombres} {self.apellidos}")
+        local, _, dominio = normalizar(self.correo).partition("@")
+        self.local_n = re.sub(r"[^a-z]", "", local)
+        self.dominio = dominio
+        self.telefono_n = re.sub(r"\D", "", self.telefono)
+
+    def claves(self):
+        nombres = normalizar(self.nombres).split()
+        apellidos = normalizar(self.apellidos).split()
+        claves = []
+        if apellidos:
+            claves.append(f"a:{apellidos[0][:4]}:{nombres[0][:1] if nombres else ''}")
+        if self.dominio and self.local_n:
+            claves.append(f"c:{self.dominio}:{self.local_n[:3]}")
+        if len(self.telefono_n) >= 8:
+            claves.append(f"t:{self.telefono_n}")
+        return claves
+
+    def filtros_sql(self):
+        """
+        (condición, params) por clave de bloqueo: cada una deja pasar a todos los
+        estudiantes que pueden tener esa clave (y algunos más, que se descartan con claves()).
+        """
+        nombres = normalizar(self.nombres).split()
+        apellidos = normalizar(self.apellidos).split()
+        filtros = []
+        if apellidos:
+            filtros.append((
+                f"LTRIM(ISNULL(apellidos, '')) COLLATE {_COLACION} LIKE %s "
+                f"AND LTRIM(ISNULL(nombres, '')) COLLATE {_COLACION} LIKE %s",
+                [_like(apellidos[0][:4]) + "%", _like(nombres[0][:1] if nombres else "") + "%"],
+            ))
+        if self.dominio and self.local_n:
+            # Las letras del prefijo en orden (la parte local puede tener puntos y dígitos entre ellas)
+            patron = "%" + "%".join(_like(c) for c in self.local_n[:3]) + "%@" + _like(self.dominio) + "%"
+            filtros.append((f"correo COLLATE {_COLACION} LIKE %s", [patron]))
+        if len(self.telefono_n) >= 8:
+            filtros.append(("telefono LIKE %s", ["%" + "%".join(self.telefono_n) + "%"]))
+        return filtros
+
+    def como_dict(self) -> dict:
+        return {
+            "idEstudiante": self.idEstudiante,
+            "nombres": self.nombres,
+            "apellidos": self.apellidos,
+            "correo": self.correo,
+            "telefono": self.telefono,
+        }
+
+
+def comparar(a: Registro, b: Registro, umbral: float = 0.0):
+    """(puntaje, motivos) de la pareja a-b, o None si no puede llegar a `umbral`"""
+    s_nombre = jaro_winkler(a.nombre_n, b.nombre_n)
+    # Cota superior con correo idéntico y mismo teléfono: evita el resto del cálculo
+    if _PESO_NOMBRE * s_nombre + _PESO_CORREO + _PESO_TELEFONO < umbral:
+        return None
+    s_correo = jaro_winkler(a.local_n, b.local_n) if a.local_n and b.local_n else 0.0
+    mismo_tel = bool(a.telefono_n) and a.telefono_n == b.telefono_n
+    puntaje = _PESO_NOMBRE * s_nombre + _PESO_CORREO * s_correo + (_PESO_TELEFONO if mismo_tel else 0.0)
+    motivos = []
+    if s_nombre >= 0.9:
+        motivos.append(f"nombre similar ({s_nombre:.2f})")
+    if s_correo >= 0.9:
+        motivos.append(f"correo similar ({s_correo:.2f})")
+    if mismo_tel:
+        motivos.append("mismo teléfono")
+    return puntaje, motivos
+
+
+def _pares_del_bloque(registros, es_nuevo):
+    """Pares a comparar dentro de un bloque (todos, o vecindario ordenado si es grande)"""
+    if len(registros) <= MAX_BLOQUE:
+        for i in range(len(registros)):
+            for j in range(i + 1, len(registros)):
+                if es_nuevo(registros[i]) or es_nuevo(registros[j]):
+                    yield registros[i], registros[j]
+        return
+    orden = sorted(registros, key=lambda r: r.nombre_n)
+    for i, r in enumerate(orden):
+        for s in orden[i + 1:i + 1 + VENTANA]:
+            if es_nuevo(r) or es_nuevo(s):
+                yield r, s
+
+
+def detectar(registros, desde_id: int = None, umbral: float = UMBRAL, limite: int = None):
+    """
+    Pares candidatos ordenados por puntaje (mayor primero):
+    [{a, b, puntaje, motivos}, ...]. Con desde_id solo pares donde al menos
+    uno tiene idEstudiante > desde_id.
+    """
+    if desde_id is None:
+        def es_nuevo(r):
+            return True
+    else:
+        def es_nuevo(r):
+            return r.idEstudiante > desde_id
+
+    bloques = {}
+    for r in registros:
+        for c in r.claves():
+            bloques.setdefault(c, []).append(r)
+
+    vistos, candidatos = set(), []
+    for miembros in bloques.values():
+        if len(miembros) < 2 or not any(es_nuevo(r) for r in miembros):
+            continue
+        for a, b in _pares_del_bloque(miembros, es_nuevo):
+            clave = (a.idEstudiante, b.idEstudiante) if a.idEstudiante < b.idEstudiante \
+                else (b.idEstudiante, a.idEstudiante)
+            if clave in vistos:
+                continue
+            vistos.add(clave)
+            resultado = comparar(a, b, umbral)
+            if resultado is None:
+                continue
+            puntaje, motivos = resultado
+            if puntaje >= umbral:
+                if a.idEstudiante > b.idEstudiante:
+                    a, b = b, a
+                candidatos.append({
+                    "a": a.como_dict(),
+                    "b": b.como_dict(),
+                    "puntaje": round(puntaje, 3),
+                    "motivos": motivos,
+                })
+    candidatos.sort(key=lambda p: (-p["puntaje"], p["a"]["idEstudiante"], p["b"]["idEstudiante"]))
+    return candidatos[:limite] if limite else candidatos
+
+
+def cargar_registros():
+    """Todos los estudiantes como Registro (lectura por bloques)"""
+    registros = []
+    with connection.cursor() as cur:
+        cur.execute(f"{_SQL_ESTUDIANTES} ORDER BY idEstudiante")
+        while True:
+            bloque = cur.fetchmany(5000)
+            if not bloque:
+                break
+            registros.extend(Registro(*fila) for fila in bloque)
+    return registros
+
+
+def cargar_registros_nuevos(desde_id: int, max_nuevos: int = NUEVOS_POR_CONSULTA):
+    """
+    Los primeros `max_nuevos` estudiantes con id > desde_id y, de los anteriores, solo
+    los que comparten alguna clave de bloqueo con ellos: los bloques con nuevos quedan
+    completos, así que detectar(registros, desde_id) da lo mismo que con el padrón.
+    Retorna (registros, ultimo_id, hay_mas); ultimo_id es el desde_id de la siguiente consulta.
+    """
+    with connection.cursor() as cur:
+        cur.execute("SELECT TOP (%s) idEstudiante, nombres, apellidos, correo, telefono "
+                    "FROM dbo.tbEstudiante WHERE idEstudiante > %s ORDER BY idEstudiante",
+                    [max_nuevos + 1, desde_id])
+        filas = cur.fetchall()
+    hay_mas = len(filas) > max_nuevos
+    nuevos = [Registro(*fila) for fila in filas[:max_nuevos]]
+    if not nuevos:
+        return [], desde_id, False
+
+    claves = set()
+    filtros = {}
+    for r in nuevos:
+        claves.update(r.claves())
+        for condicion, params in r.filtros_sql():
+            filtros[(condicion, tuple(params))] = None
+    filtros = list(filtros)
+
+    anteriores = {}
+    with connection.cursor() as cur:
+        for inicio in range(0, len(filtros), _FILTROS_POR_SENTENCIA):
+            lote = filtros[inicio:inicio + _FILTROS_POR_SENTENCIA]
+            condiciones = " OR ".join(f"({condicion})" for condicion, _ in lote)
+            cur.execute(f"{_SQL_ESTUDIANTES} WHERE idEstudiante <= %s AND ({condiciones})",
+                        [desde_id] + [p for _, params in lote for p in params])
+            for fila in cur.fetchall():
+                r = Registro(*fila)
+                if r.idEstudiante not in anteriores and claves.intersection(r.claves()):
+                    anteriores[r.idEstudiante] = r
+    # En orden de id como cargar_registros: el vecindario de los bloques grandes no cambia
+    registros = sorted(nuevos + list(anteriores.values()), key=lambda r: r.idEstudiante)
+    return registros, nuevos[-1].idEstudiante, hay_mas
+
+
+def _like(texto: str) -> str:
+    """Texto literal dentro de un patrón LIKE"""
+    return texto.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+
+
+def ultimo_id(registros) -> int:
+    return max((r.idEstudiante for r in registros), default=0)
@@ -0,0 +1,73 @@
+"""
+Claves de idempotencia (cabecera Idempotency-Key) para POST que crean registros.
+
+El primer resultado exitoso de una clave se guarda y se reproduce en los
+reintentos del mismo usuario dentro de la ventana configurada; así un cliente
+POS con red inestable puede reintentar sin duplicar ventas. Con CACHE_BACKEND
+compartido la reserva (add atómico) vale entre workers: el reintento puede
+llegar a cualquier proceso.
+"""
+import hashlib
+
+from django.conf import settings
+
+from .cache import CacheLRU
+
+_EN_PROCESO = "en_proceso"
+_COMPLETADA = "completada"
+
+# Tiempo máximo que una clave queda reservada mientras su petición se procesa
+_TTL_EN_PROCESO = 120
+
+_claves = CacheLRU(
+    "idempotencia",
+    max_items=getattr(settings, "IDEMPOTENCIA_MAX_CLAVES", 10000),
+    ttl=getattr(settings, "IDEMPOTENCIA_TTL_SEGUNDOS", 86400),
+)
+
+MAX_LARGO_CLAVE = 255
+
+
+def _clave(id_usuario, clave: str) -> str:
+    # Cada usuario tiene su propio espacio de claves
+    return f"{id_usuario}:{clave}"
+
+
+def huella(cuerpo: bytes) -> str:
+    """Hash del cuerpo de la petición, para detectar la misma clave con otro contenido"""
+    return hashlib.sha256(cuerpo or b"").hexdigest()
+
+
+def iniciar(id_usuario, clave: str, huella_cuerpo: str):
+    """
+    Reserva la clave para procesar la petición.
+    Retorna (estado, respuesta):
+      ('nueva', None)        -> procesar y luego llamar completar() o liberar()
+      ('repetida', dict)     -> reproducir la respuesta guardada
+      ('en_proceso', None)   -> otra petición con la misma clave aún no termina
+      ('conflicto', None)    -> la clave ya se usó con un cuerpo distinto
+    """
+    k = _clave(id_usuario, clave)
+    if _claves.add(k, (_EN_PROCESO, huella_cuerpo, None), ttl=_TTL_EN_PROCESO):
+        return "nueva", None
+
+    estado, huella_guardada, respuesta = _claves.get(k) or (None, None, None)
+    if estado is None:
+        # Venció entre add() y get(): reintentar la reserva una vez
+        return ("nueva", None) if _claves.add(k, (_EN_PROCESO, huella_cuerpo, None), ttl=_TTL_EN_PROCESO) \
+            else ("en_proceso", None)
+    if huella_guardada != huella_cuerpo:
+        return "conflicto", None
+    if estado == _EN_PROCESO:
+        return "en_proceso", None
+    return "repetida", respuesta
+
+
+def completar(id_usuario, clave: str, huella_cuerpo: str, respuesta: dict):
+    """Guarda la respuesta exitosa para reproducirla en reintentos"""
+    _claves.set(_clave(id_usuario, clave), (_COMPLETADA, huella_cuerpo, respuesta))
+
+
+def liberar(id_usuario, clave: str):
+    """Libera la clave cuando la petición falló, para que el cliente pueda reintentar"""
+    _claves.delete(_clave(id_usuario, clave))
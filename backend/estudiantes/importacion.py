@@ -0,0 +1,364 @@
+"""
+Importación masiva por streaming (CSV/XLSX/JSON).
+
+Los archivos se recorren fila por fila y se procesan en bloques de tamaño fijo:
+la validación de cada bloque corre en un pool de hilos y la escritura en BD se
+hace por lotes. Los errores se escriben a un CSV en disco a medida que aparecen,
+así la memoria no depende del tamaño del archivo.
+"""
+import csv
+import io
+import os
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+
+
+class ArchivoInvalido(Exception):
+    """Formato de archivo no soportado o ilegible"""
+
+
+# ---------------------------
+# Lectura por streaming
+# ---------------------------
+def _normalizar_encabezado(h) -> str:
+    return str(h or "").strip()
+
+
+def _filas_csv(archivo_binario):
+    texto = io.TextIOWrapper(archivo_binario, encoding="utf-8-sig", newline="")
+    try:
+        muestra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(texto, dialecto)
+        encabezados = [_normalizar_encabezado(h) for h in next(lector, [])]
+        for valores in lector:
+            if not any(v.strip() for v in valores):
+                continue
+            yield dict(zip(encabezados, valores))
+    finally:
+        texto.detach()
+
+
+def _filas_xlsx(archivo_binario):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ArchivoInvalido("Instala openpyxl para importar XLSX: pip install openpyxl")
+    libro = load_workbook(archivo_binario, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [_normalizar_encabezado(h) for h in next(filas, ())]
+        for valores in filas:
+            if not any(v not in (None, "") for v in valores):
+                continue
+            yield {h: ("" if v is None else v) for h, v in zip(encabezados, valores)}
+    finally:
+        libro.close()
+
+
+def _filas_json(archivo_binario):
+    import json
+    try:
+        datos = json.load(io.TextIOWrapper(archivo_binario, encoding="utf-8-sig"))
+    except ValueError:
+        raise ArchivoInvalido("JSON inválido")
+    if isinstance(datos, dict):
+        datos = datos.get("data") or datos.get("filas") or []
+    if not isinstance(datos, list):
+        raise ArchivoInvalido("El JSON debe ser una lista de objetos")
+    for fila in datos:
+        if isinstance(fila, dict):
+            yield fila
+
+
+def leer_filas(archivo_binario, nombre: str, formatos=("csv", "xlsx")):
+    """
+    Generador de dicts {encabezado: valor} a partir de un archivo binario abierto.
+    El formato se deduce de la extensión de `nombre`.
+    """
+    ext = os.path.splitext(nombre or "")[1].lower().lstrip(".")
+    if ext not in formatos:
+        raise ArchivoInvalido(f"Formato no soportado: .{ext or '?'} (usa {', '.join(formatos)})")
+    if ext == "csv":
+        return _filas_csv(archivo_binario)
+    if ext == "xlsx":
+        return _filas_xlsx(archivo_binario)
+    return _filas_json(archivo_binario)
+
+
+# ---------------------------
+# Conversión de campos
+# ---------------------------
+def texto(fila, campo, max_len=None):
+    v = str(fila.get(campo) or "").strip()
+    if max_len and len(v) > max_len:
+        raise ValueError(f"{campo} excede {max_len} caracteres")
+    return v
+
+
+def decimal(fila, campo, defecto=0.0, minimo=None, maximo=None):
+    v = fila.get(campo)
+    if v is None or str(v).strip() == "":
+        return defecto
+    try:
+        n = float(str(v).strip().replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{campo} no es numérico")
+    if (minimo is not None and n < minimo) or (maximo is not None and n > maximo):
+        raise ValueError(f"{campo} fuera de rango")
+    return n
+
+
+def entero(fila, campo, defecto=0, minimo=None):
+    n = decimal(fila, campo, defecto, minimo)
+    if int(n) != n:
+        raise ValueError(f"{campo} debe ser entero")
+    return int(n)
+
+
+# ---------------------------
+# Reporte de errores
+# ---------------------------
+def _dir_reportes():
+    ruta = getattr(settings, "IMPORTACION_DIR", None) or os.path.join(tempfile.gettempdir(), "crud_importaciones")
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+_TOKEN_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ReporteErrores:
+    """CSV de errores que se escribe a disco a medida que se encuentran"""
+
+    def __init__(self, ruta: str = None):
+        self.token = None
+        if ruta is None:
+            self.token = uuid.uuid4().hex
+            ruta = os.path.join(_dir_reportes(), f"errores_{self.token}.csv")
+        self.ruta = ruta
+        self.total = 0
+        self._archivo = open(ruta, "w", encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._archivo)
+        self._csv.writerow(["fila", "clave", "error"])
+
+    def agregar(self, fila: int, clave, error: str):
+        self.total += 1
+        self._csv.writerow([fila, clave, error])
+
+    def cerrar(self):
+        self._archivo.close()
+        if self.total == 0 and self.token:
+            os.remove(self.ruta)
+            self.token = None
+
+
+def ruta_reporte(token: str):
+    """Ruta del reporte de errores de un token, o None si no existe"""
+    if not _TOKEN_RE.match(token or ""):
+        return None
+    ruta = os.path.join(_dir_reportes(), f"errores_{token}.csv")
+    return ruta if os.path.exists(ruta) else None
+
+
+# ---------------------------
+# Procesamiento por bloques
+# ---------------------------
+def procesar(filas, validar, escribir, reporte: ReporteErrores, clave=None,
+             tam_bloque: int = 500, hilos: int = 4):
+    """
+    Recorre `filas` en bloques de `tam_bloque`:
+      validar(fila) -> datos normalizados (lanza ValueError con el motivo si es inválida)
+      escribir(lista de (num_fila, datos)) -> lista de (num_fila, error | None)
+    La validación de cada bloque corre en un pool de `hilos`. Retorna un resumen.
+    """
+    clave = clave or (lambda fila: "")
+    resumen = {"procesadas": 0, "escritas": 0, "errores": 0}
+
+    def _validar(item):
+        num, fila = item
+        try:
+            return num, validar(fila), None
+        except ValueError as e:
+            return num, None, str(e)
+
+    numeradas = enumerate(filas, start=2)  # fila 1 = encabezados
+    with ThreadPoolExecutor(max_workers=max(1, hilos)) as pool:
+        while True:
+            bloque = list(islice(numeradas, tam_bloque))
+            if not bloque:
+                break
+            originales = dict(bloque)
+            validos = []
+            for num, datos, error in pool.map(_validar, bloque):
+                if error:
+                    reporte.agregar(num, clave(originales[num]), error)
+                else:
+                    validos.append((num, datos))
+            for num, error in escribir(validos):
+                if error:
+                    reporte.agregar(num, clave(originales[num]), error)
+                else:
+                    resumen["escritas"] += 1
+            resumen["procesadas"] += len(bloque)
+
+    resumen["errores"] = reporte.total
+    return resumen
+
+
+# ---------------------------
+# Catálogo de productos
+# ---------------------------
+MSG_PRODUCTO = {
+    1: "Dato inválido",
+    2: "Código duplicado",
+    3: "Producto no existe",
+    5: "Error al guardar el producto",
+    6: "Usuario no existe",
+}
+
+_ESTADOS_PRODUCTO = ("activo", "inactivo")
+
+
+def validar_producto(fila: dict) -> dict:
+    """Normaliza una fila del catálogo; lanza ValueError con el motivo si es inválida"""
+    f = {str(k).strip().lower(): v for k, v in fila.items()}
+    codigo = texto(f, "codigo", 50)
+    if not codigo or " " in codigo:
+        raise ValueError("codigo vacío o con espacios")
+    nombre = texto(f, "nombre", 120)
+    if not nombre:
+        raise ValueError("nombre requerido")
+    estado = (texto(f, "estado") or "activo").lower()
+    if estado not in _ESTADOS_PRODUCTO:
+        raise ValueError("estado debe ser activo o inactivo")
+    categorias = [c.strip() for c in texto(f, "categorias").split("|") if c.strip()]
+    return {
+        "codigo": codigo,
+        "nombre": nombre,
+        "descripcion": texto(f, "descripcion", 255),
+        "precioCosto": decimal(f, "preciocosto", 0.0, minimo=0),
+        "precioVenta": decimal(f, "precioventa", 0.0, minimo=0),
+        "stockActual": entero(f, "stockactual", 0, minimo=0),
+        "stockMinimo": entero(f, "stockminimo", 0, minimo=0),
+        "descuentoMaximoPct": decimal(f, "descuentomaximopct", 0.0, minimo=0, maximo=100),
+        "estado": estado,
+        "categorias": categorias,
+    }
+
+
+def importar_productos(filas, id_usuario: int, reporte: ReporteErrores,
+                       tam_bloque: int = 500, hilos: int = 4):
+    """
+    Upsert por código del catálogo de productos.
+    Columnas: codigo, nombre, descripcion, precioCosto, precioVenta, stockActual,
+    stockMinimo, descuentoMaximoPct, estado, categorias (nombres separados por '|').
+    stockActual solo se aplica a productos nuevos. Retorna el resumen de `procesar`
+    más los contadores creados/actualizados.
+    """
+    from .db import sp_producto_importar_lote, sp_producto_categoria_asignar_lote, categorias_id_por_nombre
+
+    categorias = categorias_id_por_nombre()
+    conteo = {"creados": 0, "actualizados": 0}
+
+    def escribir(validos):
+        # Un mismo código repetido en el bloque: gana la última fila
+        ultimo = {}
+        for num, datos in validos:
+            ultimo[datos["codigo"].lower()] = num
+        unicos = [(num, datos) for num, datos in validos if ultimo[datos["codigo"].lower()] == num]
+        if not unicos:
+            return [(num, None) for num, _ in validos]
+
+        rcs = sp_producto_importar_lote(id_usuario, [datos for _, datos in unicos])
+        errores = {}
+        pares, origen = [], []
+        for (num, datos), (rc, id_prod, creado) in zip(unicos, rcs):
+            if rc != 0:
+                errores[num] = MSG_PRODUCTO.get(rc, f"Error (rc={rc})")
+                continue
+            conteo["creados" if creado else "actualizados"] += 1
+            for nombre in datos["categorias"]:
+                id_cat = categorias.get(nombre.lower())
+                if id_cat is None:
+                    reporte.agregar(num, datos["codigo"], f"Producto importado; categoría no encontrada: {nombre}")
+                else:
+                    pares.append((id_prod, id_cat))
+                    origen.append((num, datos["codigo"], nombre))
+
+        if pares:
+            # rc 2 = la categoría ya estaba asignada
+            for (num, codigo, nombre), rc in zip(origen, sp_producto_categoria_asignar_lote(id_usuario, pares)):
+                if rc not in (0, 2):
+                    reporte.agregar(num, codigo, f"Producto importado; no se pudo asignar la categoría {nombre} (rc={rc})")
+
+        return [(num, errores.get(ultimo[datos["codigo"].lower()])) for num, datos in validos]
+
+    resumen = procesar(filas, validar_producto, escribir, reporte,
+                       clave=lambda fila: next((v for k, v in fila.items() if str(k).strip().lower() == "codigo"), ""),
+                       tam_bloque=tam_bloque, hilos=hilos)
+    resumen.update(conteo)
+    return resumen
+
+
+# ---------------------------
+# Estudiantes
+# ---------------------------
+MSG_ESTUDIANTE = {
+    1: "Dato inválido",
+    2: "Correo ya registrado",
+    5: "Error al guardar el estudiante",
+    6: "Usuario no existe",
+}
+
+_CORREO_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
+_TELEFONO_RE = re.compile(r"^\d{8}$")
+
+
+def validar_estudiante(fila: dict) -> tuple:
+    """Mismas reglas que el formulario de registro; retorna (nombres, apellidos, correo, telefono)"""
+    f = {str(k).strip().lower(): v for k, v in fila.items()}
+    nombres = texto(f, "nombres", 100)
+    apellidos = texto(f, "apellidos", 100)
+    correo = texto(f, "correo", 120)
+    telefono = texto(f, "telefono")
+    if not nombres:
+        raise ValueError("nombres requerido")
+    if not apellidos:
+        raise ValueError("apellidos requerido")
+    if not _CORREO_RE.match(correo):
+        raise ValueError("correo inválido")
+    if not _TELEFONO_RE.match(telefono):
+        raise ValueError("telefono debe tener 8 dígitos")
+    return nombres, apellidos, correo, telefono
+
+
+def importar_estudiantes(filas, id_usuario: int, reporte: ReporteErrores,
+                         tam_bloque: int = 500, hilos: int = 4):
+    """
+    Inserta estudiantes (columnas nombres, apellidos, correo, telefono) por bloques.
+    Los duplicados (rc 2) se reportan por fila sin detener el resto.
+    """
+    from .db import sp_est_insertar_lote
+
+    def escribir(validos):
+        if not validos:
+            return []
+        rcs = sp_est_insertar_lote([datos for _, datos in validos], id_usuario)
+        return [
+            (num, None if rc == 0 else MSG_ESTUDIANTE.get(rc, f"Error (rc={rc})"))
+            for (num, _), (rc, _id) in zip(validos, rcs)
+        ]
+
+    return procesar(filas, validar_estudiante, escribir, reporte,
+                    clave=lambda fila: next((v for k, v in fila.items() if str(k).strip().lower() == "correo"), ""),
+                    tam_bloque=tam_bloque, hilos=hilos)
@@ -0,0 +1,432 @@
+"""
+Mide la latencia de las rutas críticas contra la base configurada.
+
+Uso:
+    python manage.py benchmark ventas --lineas 1,10,50,200 --repeticiones 20
+    python manage.py benchmark ventas-lote --ventas 200 --repeticiones 3
+    python manage.py benchmark estudiantes-lote --estudiantes 1000 --repeticiones 3
+    python manage.py benchmark listados --pagina 1 --tam-pagina 100
+    python manage.py benchmark ventas-historial --paginas 1,10,100,1000
+    python manage.py benchmark catalogo --productos 100000
+    python manage.py benchmark busqueda --tamanos 10000,100000,1000000 --con-bd
+    python manage.py benchmark busqueda --tamanos 100000 --consultas-difusas galeta,detrgente
+    python manage.py benchmark autocompletar --roster 500000
+
+Cada operación se ejecuta dentro de una transacción que se revierte al final,
+por lo que el benchmark no deja datos en la base.
+"""
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from estudiantes import autocompletar, busqueda, db
+from estudiantes.catalogo import Catalogo
+
+
+class _ContadorSQL:
+    """execute_wrapper que cuenta las sentencias enviadas a SQL Server"""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def medir(fn, repeticiones: int):
+    """
+    Ejecuta fn `repeticiones` veces, cada una en una transacción revertida.
+    Retorna (tiempos_ms, sentencias_por_ejecucion).
+    """
+    tiempos = []
+    contador = _ContadorSQL()
+    with connection.execute_wrapper(contador):
+        for _ in range(repeticiones):
+            with transaction.atomic():
+                t0 = time.perf_counter()
+                fn()
+                tiempos.append((time.perf_counter() - t0) * 1000)
+                transaction.set_rollback(True)
+    return tiempos, contador.total / max(1, repeticiones)
+
+
+def percentil(valores, p):
+    orden = sorted(valores)
+    if not orden:
+        return 0.0
+    k = min(len(orden) - 1, int(round((p / 100.0) * (len(orden) - 1))))
+    return orden[k]
+
+
+class Command(BaseCommand):
+    help = "Benchmark de rutas críticas (las escrituras se revierten)"
+
+    ESCENARIOS = ("ventas", "ventas-lote", "estudiantes-lote", "listados", "ventas-historial", "catalogo",
+                  "busqueda", "autocompletar")
+
+    def add_arguments(self, parser):
+        parser.add_argument("escenario", choices=self.ESCENARIOS)
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument("--usuario", type=int, default=None,
+                            help="idUsuario activo con el que se registran las operaciones")
+        parser.add_argument("--lineas", default="1,10,50,200",
+                            help="Tamaños de ticket a medir (escenario ventas)")
+        parser.add_argument("--ventas", type=int, default=200,
+                            help="Ventas por lote (escenario ventas-lote)")
+        parser.add_argument("--estudiantes", type=int, default=1000,
+                            help="Estudiantes por importación (escenario estudiantes-lote)")
+        parser.add_argument("--pagina", type=int, default=1, help="Página a pedir (escenario listados)")
+        parser.add_argument("--tam-pagina", type=int, default=100, help="Filas por página (escenario listados)")
+        parser.add_argument("--paginas", default="1,10,100,1000",
+                            help="Profundidades a medir (escenario ventas-historial)")
+        parser.add_argument("--productos", type=int, default=100000,
+                            help="Productos sintéticos (escenario catalogo)")
+        parser.add_argument("--tamanos", default="10000,100000,1000000",
+                            help="Tamaños de catálogo sintético (escenario busqueda)")
+        parser.add_argument("--consultas", default="galleta,cola 600,P000123,limp,integral de ch",
+                            help="Consultas separadas por coma (escenario busqueda)")
+        parser.add_argument("--consultas-difusas", default="galeta,chocolat pepsy,detrgente,integarl",
+                            help="Consultas con errores de tipeo para modo=difuso (escenario busqueda)")
+        parser.add_argument("--roster", type=int, default=500000,
+                            help="Estudiantes sintéticos (escenario autocompletar)")
+        parser.add_argument("--con-bd", action="store_true",
+                            help="Medir también LIKE vs índice contra la base configurada (escenario busqueda)")
+
+    def handle(self, *args, **opts):
+        getattr(self, f"_escenario_{opts['escenario'].replace('-', '_')}")(opts)
+
+    # ---------------------------
+    # Helpers
+    # ---------------------------
+    def _usuario(self, opts):
+        if opts["usuario"]:
+            return opts["usuario"]
+        with connection.cursor() as cur:
+            cur.execute("SELECT TOP 1 idUsuario FROM dbo.tbUsuario WHERE estado = 'activo' ORDER BY idUsuario")
+            row = cur.fetchone()
+        if not row:
+            raise CommandError("No hay usuarios activos; indica --usuario")
+        return int(row[0])
+
+    def _productos_con_stock(self, n):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT TOP (%s) idProducto, precioVenta, stockActual
+                FROM dbo.tbProducto
+                WHERE estado = 'activo' AND stockActual > 0
+                ORDER BY stockActual DESC
+            """, [n])
+            productos = cur.fetchall()
+        if not productos:
+            raise CommandError("No hay productos activos con stock para el benchmark")
+        return productos
+
+    def _imprimir(self, titulo, filas):
+        self.stdout.write(self.style.MIGRATE_HEADING(titulo))
+        self.stdout.write(f"{'caso':>12} {'media ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'sentencias':>11}")
+        for caso, tiempos, sentencias in filas:
+            self.stdout.write(
+                f"{caso:>12} {statistics.mean(tiempos):>10.2f} {percentil(tiempos, 50):>10.2f} "
+                f"{percentil(tiempos, 95):>10.2f} {sentencias:>11.1f}"
+            )
+
+    # ---------------------------
+    # Escenarios
+    # ---------------------------
+    def _escenario_ventas(self, opts):
+        """Latencia de sp_registrar_venta según el número de líneas del ticket"""
+        id_usuario = self._usuario(opts)
+        tamanos = [int(x) for x in opts["lineas"].split(",") if x.strip()]
+
+        productos = self._productos_con_stock(max(tamanos))
+
+        filas = []
+        for n in tamanos:
+            detalles = [
+                {"idProducto": int(p[0]), "cantidad": 1, "precioUnitario": float(p[1] or 0), "descuentoPct": 0}
+                for p in (productos[i % len(productos)] for i in range(n))
+            ]
+            rc_obtenidos = set()
+
+            def vender():
+                rc, _ = db.sp_registrar_venta(id_usuario, detalles)
+                rc_obtenidos.add(rc)
+
+            tiempos, sentencias = medir(vender, opts["repeticiones"])
+            if rc_obtenidos != {0}:
+                raise CommandError(f"La venta de {n} líneas devolvió rc={sorted(rc_obtenidos)} ({db.get_rc_message(max(rc_obtenidos))})")
+            filas.append((f"{n} líneas", tiempos, sentencias))
+
+        self._imprimir("sp_registrar_venta", filas)
+
+    def _escenario_ventas_lote(self, opts):
+        """Misma cola de ventas de 3 líneas: una por una vs sp_registrar_ventas_lote"""
+        id_usuario = self._usuario(opts)
+        n = opts["ventas"]
+        productos = self._productos_con_stock(3 * n)
+        ventas = [
+            {"ref": f"bench-{i}", "detalles": [
+                {"idProducto": int(p[0]), "cantidad": 1, "precioUnitario": float(p[1] or 0), "descuentoPct": 0}
+                for p in (productos[(3 * i + k) % len(productos)] for k in range(3))
+            ]}
+            for i in range(n)
+        ]
+        rechazos = set()
+
+        def una_por_una():
+            for v in ventas:
+                rc, _ = db.sp_registrar_venta(id_usuario, v["detalles"])
+                if rc != 0:
+                    rechazos.add(rc)
+
+        def lote():
+            for r in db.sp_registrar_ventas_lote(id_usuario, ventas):
+                if r["rc"] != 0:
+                    rechazos.add(r["rc"])
+
+        filas = []
+        for caso, fn in (("una a una", una_por_una), ("lote", lote)):
+            tiempos, sentencias = medir(fn, opts["repeticiones"])
+            filas.append((caso, tiempos, sentencias))
+        if rechazos:
+            self.stdout.write(self.style.WARNING(f"Ventas rechazadas durante el benchmark: rc={sorted(rechazos)}"))
+
+        self._imprimir(f"{n} ventas de 3 líneas", filas)
+        for caso, tiempos, _ in filas:
+            self.stdout.write(f"{caso:>12}: {n / (statistics.mean(tiempos) / 1000):.1f} ventas/s")
+
+    def _escenario_estudiantes_lote(self, opts):
+        """Inscripción masiva: sp_est_insertar por estudiante vs sp_est_insertar_lote"""
+        id_usuario = self._usuario(opts)
+        n = opts["estudiantes"]
+
+        def generar():
+            # Correos nuevos en cada ejecución para no chocar con la unicidad
+            sufijo = uuid.uuid4().hex[:8]
+            return [(f"Bench{i}", "Prueba", f"bench{i}.{sufijo}@example.com", f"{i % 100000000:08d}")
+                    for i in range(n)]
+
+        rechazos = set()
+
+        def uno_por_uno():
+            for est in generar():
+                rc, _ = db.sp_est_insertar(*est, id_usuario)
+                if rc != 0:
+                    rechazos.add(rc)
+
+        def lote():
+            for rc, _ in db.sp_est_insertar_lote(generar(), id_usuario):
+                if rc != 0:
+                    rechazos.add(rc)
+
+        filas = []
+        for caso, fn in (("uno a uno", uno_por_uno), ("lote", lote)):
+            tiempos, sentencias = medir(fn, opts["repeticiones"])
+            filas.append((caso, tiempos, sentencias))
+        if rechazos:
+            self.stdout.write(self.style.WARNING(f"Inserciones rechazadas durante el benchmark: rc={sorted(rechazos)}"))
+
+        self._imprimir(f"{n} estudiantes", filas)
+        for caso, tiempos, _ in filas:
+            self.stdout.write(f"{caso:>12}: {n / (statistics.mean(tiempos) / 1000):.1f} estudiantes/s")
+
+    def _escenario_listados(self, opts):
+        """Cada listado paginado: COUNT aparte + datos vs total en ventana vs sin total"""
+        pagina, tam = opts["pagina"], opts["tam_pagina"]
+        listados = (
+            # La consulta sin la caché de sp_categoria_listar: si no, se medirían aciertos sin sentencias
+            ("categorías", lambda **kw: db._sp_categoria_listar_bd(None, False, pagina, tam, **kw)),
+            ("productos", lambda **kw: db.sp_producto_listar(None, None, None, pagina, tam, **kw)),
+            ("productos+cat", lambda **kw: db.sp_producto_listar_con_categorias(None, None, None, pagina, tam, **kw)),
+            ("inventario", lambda **kw: db.vw_inventario_actual(None, False, pagina, tam, **kw)),
+            ("ventas", lambda **kw: db.listar_ventas(None, None, None, pagina, tam, **kw)),
+        )
+        for nombre, listar in listados:
+            filas = []
+            for caso, separado, con_total in (("count+datos", True, True), ("ventana", False, True),
+                                              ("sin total", False, False)):
+                tiempos, sentencias = medir(
+                    lambda: listar(con_total=con_total, conteo_separado=separado), opts["repeticiones"])
+                filas.append((caso, tiempos, sentencias))
+            self._imprimir(f"{nombre} (página {pagina}, {tam} filas)", filas)
+
+    def _escenario_ventas_historial(self, opts):
+        """Historial de ventas a distintas profundidades: OFFSET vs cursor (fecha, idVenta)"""
+        tam = opts["tam_pagina"]
+        profundidades = sorted(int(x) for x in opts["paginas"].split(",") if x.strip())
+
+        # Cursores de cada profundidad recorriendo el historial una vez
+        cursores, cursor, pagina = {1: None}, None, 1
+        while pagina < profundidades[-1]:
+            cursor = db.listar_ventas_pagina(limit=tam, cursor=cursor)["next"]
+            if not cursor:
+                break
+            pagina += 1
+            cursores[pagina] = cursor
+
+        filas = []
+        for p in profundidades:
+            if p not in cursores:
+                self.stdout.write(self.style.WARNING(f"El historial no llega a la página {p}"))
+                break
+            t_offset, s_offset = medir(lambda: db.listar_ventas(page=p, page_size=tam, con_total=False),
+                                       opts["repeticiones"])
+            t_cursor, s_cursor = medir(lambda: db.listar_ventas_pagina(limit=tam, cursor=cursores[p]),
+                                       opts["repeticiones"])
+            filas.append((f"offset p{p}", t_offset, s_offset))
+            filas.append((f"cursor p{p}", t_cursor, s_cursor))
+        self._imprimir(f"Historial de ventas ({tam} filas por página)", filas)
+
+    def _escenario_catalogo(self, opts):
+        """Memoria por producto del snapshot y latencia de búsqueda por id/código (sin BD)"""
+        n = opts["productos"]
+        categorias = [("Bebidas",), ("Snacks", "Ofertas"), ("Limpieza",), ()]
+
+        # Las filas se crean dentro de la medición y se liberan antes de la segunda
+        # foto, como las de la base: el snapshot se queda con sus str y float.
+        # Precios calculados por producto para que cada fila tenga sus propios float.
+        tracemalloc.start()
+        antes = tracemalloc.take_snapshot()
+        filas = [
+            (i, f"P{i:07d}", f"Producto de prueba {i}", 10.5 + i % 97, 15.25 + i % 89, 10.0, 5, "activo")
+            for i in range(1, n + 1)
+        ]
+        por_producto = {i: categorias[i % len(categorias)] for i in range(1, n + 1)}
+        cat = Catalogo(ttl=0)
+        cat.cargar_filas(filas, por_producto)
+        del filas, por_producto
+        gc.collect()
+        despues = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        memoria = sum(s.size_diff for s in despues.compare_to(antes, "filename"))
+
+        ids = [random.randint(1, n) for _ in range(100000)]
+        codigos = [f"P{i:07d}" for i in ids]
+        t0 = time.perf_counter()
+        for i in ids:
+            cat.obtener(i)
+        t_id = (time.perf_counter() - t0) / len(ids) * 1e6
+        t0 = time.perf_counter()
+        for c in codigos:
+            cat.por_codigo(c)
+        t_codigo = (time.perf_counter() - t0) / len(codigos) * 1e6
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Catálogo en memoria ({n} productos)"))
+        self.stdout.write(f"memoria total: {memoria / 1024 / 1024:.1f} MiB "
+                          f"({memoria / n:.0f} bytes/producto, {memoria / n * 100000 / 1024 / 1024:.1f} MiB por 100k)")
+        self.stdout.write(f"búsqueda por id: {t_id:.2f} µs   por código: {t_codigo:.2f} µs")
+
+    def _escenario_busqueda(self, opts):
+        """
+        Índice de trigramas frente al recorrido completo que hace LIKE '%texto%'.
+        Con catálogos sintéticos de cada tamaño (sin BD) y, al final, contra la base
+        configurada: sp_producto_listar_con_categorias con LIKE vs busqueda.listar_productos.
+        """
+        consultas = [c for c in opts["consultas"].split(",") if c.strip()]
+        marcas = ["Pepsi", "Coca", "Bimbo", "Maggi", "Nestlé", "Ducal", "Lux", "Rinso", "Gallo", "Pozuelo"]
+        tipos = ["Galleta", "Cola", "Pan integral", "Sopa", "Chocolate", "Frijol", "Jabón", "Detergente",
+                 "Cerveza", "Café molido", "Limpiador", "Galletas de chocolate"]
+        medidas = ["250 ml", "600 ml", "1 l", "2 l", "100 g", "500 g", "1 kg", "12 unidades"]
+        categorias = [("Bebidas",), ("Snacks", "Ofertas"), ("Limpieza",), ("Abarrotes",), ()]
+        rnd = random.Random(42)
+
+        for n in [int(x) for x in opts["tamanos"].split(",") if x.strip()]:
+            filas = [
+                (i, f"P{i:07d}", f"{rnd.choice(tipos)} {rnd.choice(marcas)} {rnd.choice(medidas)}",
+                 10.5, 15.25, 10.0, 5, "activo")
+                for i in range(1, n + 1)
+            ]
+            cat = Catalogo(ttl=0)
+            cat.cargar_filas(filas, {i: categorias[i % len(categorias)] for i in range(1, n + 1)})
+            idx = busqueda.IndiceNgramas(cat)
+            t0 = time.perf_counter()
+            idx.sincronizar()
+            t_construir = time.perf_counter() - t0
+
+            # Lo que hace SQL Server con LIKE '%x%': comparar cada fila
+            docs = [(busqueda.normalizar(p.codigo), busqueda.normalizar(p.nombre),
+                     tuple(busqueda.normalizar(c) for c in p.categorias)) for p in cat.productos()]
+
+            def recorrido(q):
+                q = busqueda.normalizar(q)
+                return [d for d in docs if q in d[0] or q in d[1] or any(q in c for c in d[2])]
+
+            filas_tabla = []
+            for q in consultas:
+                t_idx, t_scan = [], []
+                for _ in range(opts["repeticiones"]):
+                    t0 = time.perf_counter()
+                    encontrados = idx.buscar(q)
+                    t_idx.append((time.perf_counter() - t0) * 1000)
+                    t0 = time.perf_counter()
+                    esperados = recorrido(q)
+                    t_scan.append((time.perf_counter() - t0) * 1000)
+                if encontrados is not None and len(encontrados) != len(esperados):
+                    raise CommandError(f"'{q}': el índice encontró {len(encontrados)} y el recorrido {len(esperados)}")
+                filas_tabla.append((f"{q[:8]} like", t_scan, 0))
+                filas_tabla.append((f"{q[:8]} ngram", t_idx, 0))
+            self._imprimir(f"Búsqueda en {n} productos (índice construido en {t_construir:.1f} s, "
+                           f"{idx.estadisticas()['trigramas']} trigramas)", filas_tabla)
+
+            difuso = busqueda.IndiceDifuso(cat)
+            t0 = time.perf_counter()
+            difuso.sincronizar()
+            t_construir = time.perf_counter() - t0
+            filas_tabla = []
+            for q in [c for c in opts["consultas_difusas"].split(",") if c.strip()]:
+                tiempos = []
+                for _ in range(opts["repeticiones"]):
+                    t0 = time.perf_counter()
+                    difuso.buscar(q)
+                    tiempos.append((time.perf_counter() - t0) * 1000)
+                filas_tabla.append((q[:12], tiempos, 0))
+            self._imprimir(f"Búsqueda difusa en {n} productos (índice construido en {t_construir:.1f} s, "
+                           f"{difuso.estadisticas()['variantes']} variantes)", filas_tabla)
+
+        if not opts["con_bd"]:
+            return
+        filas_tabla = []
+        for q in consultas:
+            t_like, s_like = medir(lambda: db.sp_producto_listar_con_categorias(q, page_size=50), opts["repeticiones"])
+            busqueda.listar_productos(q, con_categorias=True, page_size=50)  # construye el índice
+            t_idx, s_idx = medir(lambda: busqueda.listar_productos(q, con_categorias=True, page_size=50),
+                                 opts["repeticiones"])
+            filas_tabla.append((f"{q[:8]} like", t_like, s_like))
+            filas_tabla.append((f"{q[:8]} ngram", t_idx, s_idx))
+        self._imprimir("Búsqueda contra la base configurada (50 filas, con categorías)", filas_tabla)
+
+    def _escenario_autocompletar(self, opts):
+        """Latencia top-10 del índice de prefijos de estudiantes (sin BD)"""
+        n = opts["roster"]
+        nombres = ["María", "José", "Juan", "Ana", "Luis", "Carlos", "Sofía", "Pedro", "Lucía", "Andrés",
+                   "Gabriela", "Diego", "Fernanda", "Jorge", "Valeria", "Ricardo", "Camila", "Héctor"]
+        apellidos = ["López", "Pérez", "García", "Hernández", "Martínez", "Rodríguez", "Gómez", "Díaz",
+                     "Morales", "Castillo", "Ramírez", "Cruz", "Ortiz", "Reyes", "Juárez", "Méndez"]
+        rnd = random.Random(7)
+        filas = [
+            (i, f"{rnd.choice(nombres)} {rnd.choice(nombres)}", f"{rnd.choice(apellidos)} {rnd.choice(apellidos)}",
+             f"estudiante{i}@correo.com")
+            for i in range(1, n + 1)
+        ]
+        idx = autocompletar.IndicePrefijos(ttl=0)
+        t0 = time.perf_counter()
+        idx.cargar_filas(filas)
+        t_carga = time.perf_counter() - t0
+
+        filas_tabla = []
+        for q in ("ma", "maria", "maria lop", "lopez garcia", "estudiante1234", "zz"):
+            tiempos = []
+            for _ in range(max(opts["repeticiones"], 100)):
+                t0 = time.perf_counter()
+                idx.buscar(q, 10)
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            filas_tabla.append((q[:12], tiempos, 0))
+        self._imprimir(f"Autocompletado top-10 en {n} estudiantes (carga {t_carga:.1f} s, "
+                       f"{idx.estadisticas()['claves']} claves)", filas_tabla)
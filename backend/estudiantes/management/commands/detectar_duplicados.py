@@ -0,0 +1,87 @@
+"""
+Busca estudiantes probablemente duplicados (bloqueo + similitud de texto).
+
+Uso:
+    python manage.py detectar_duplicados --umbral 0.85 --csv duplicados.csv
+    python manage.py detectar_duplicados --desde-id 12000
+    python manage.py detectar_duplicados --incremental     # solo estudiantes nuevos desde la última corrida
+
+En modo --incremental el último idEstudiante revisado se guarda en --estado
+(JSON) y la siguiente corrida solo evalúa pares que incluyan estudiantes nuevos.
+"""
+import csv
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estudiantes import duplicados
+
+
+class Command(BaseCommand):
+    help = "Detecta estudiantes probablemente duplicados y lista los pares por puntaje"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--umbral", type=float, default=duplicados.UMBRAL)
+        parser.add_argument("--desde-id", type=int, default=None,
+                            help="Solo pares con al menos un estudiante de id mayor a este")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Toma --desde-id del archivo de estado y lo actualiza al terminar")
+        parser.add_argument("--estado", default=os.path.join(tempfile.gettempdir(), "crud_duplicados_estado.json"))
+        parser.add_argument("--csv", default=None, help="Escribe todos los pares en este CSV")
+        parser.add_argument("--limite", type=int, default=50, help="Pares a mostrar en consola")
+
+    def handle(self, *args, **opts):
+        desde_id = opts["desde_id"]
+        if opts["incremental"] and desde_id is None:
+            desde_id = self._leer_estado(opts["estado"])
+
+        inicio = time.perf_counter()
+        registros = duplicados.cargar_registros()
+        t_carga = time.perf_counter() - inicio
+        pares = duplicados.detectar(registros, desde_id=desde_id, umbral=opts["umbral"])
+        duracion = time.perf_counter() - inicio
+
+        for p in pares[:opts["limite"]]:
+            a, b = p["a"], p["b"]
+            self.stdout.write(
+                f"{p['puntaje']:.3f}  #{a['idEstudiante']} {a['nombres']} {a['apellidos']} <{a['correo']}>  ~  "
+                f"#{b['idEstudiante']} {b['nombres']} {b['apellidos']} <{b['correo']}>  ({', '.join(p['motivos'])})"
+            )
+        if opts["csv"]:
+            self._escribir_csv(opts["csv"], pares)
+
+        alcance = f"nuevos desde id {desde_id}" if desde_id is not None else "padrón completo"
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pares)} pares candidatos en {len(registros)} estudiantes ({alcance}; "
+            f"carga {t_carga:.1f} s, total {duracion:.1f} s)"
+        ))
+        if opts["incremental"]:
+            self._guardar_estado(opts["estado"], duplicados.ultimo_id(registros))
+
+    def _leer_estado(self, ruta):
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                return int(json.load(f)["ultimoId"])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Archivo de estado inválido ({ruta}): {e}")
+
+    def _guardar_estado(self, ruta, ultimo_id):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"ultimoId": ultimo_id}, f)
+
+    def _escribir_csv(self, ruta, pares):
+        with open(ruta, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["puntaje", "idA", "nombresA", "apellidosA", "correoA", "telefonoA",
+                        "idB", "nombresB", "apellidosB", "correoB", "telefonoB", "motivos"])
+            for p in pares:
+                a, b = p["a"], p["b"]
+                w.writerow([p["puntaje"],
+                            a["idEstudiante"], a["nombres"], a["apellidos"], a["correo"], a["telefono"],
+                            b["idEstudiante"], b["nombres"], b["apellidos"], b["correo"], b["telefono"],
+                            "; ".join(p["motivos"])])
@@ -0,0 +1,86 @@
+"""
+Crea y mantiene las estadísticas de movimientos por producto (tbProductoMovimientoEstadistica).
+
+Uso:
+    python manage.py estadisticas_inventario --crear        # tabla + historial completo; activa los reportes
+    python manage.py estadisticas_inventario --recortar     # pasada nocturna (cron, pasada la medianoche)
+    python manage.py estadisticas_inventario --verificar --reparar
+    python manage.py estadisticas_inventario --desactivar   # los reportes vuelven a leer tbInventarioMovimiento
+
+Los movimientos suman a los contadores de 30 días al insertarse; --recortar los
+recalcula desde la medianoche de hace 30 días para descontar lo que salió de la
+ventana. Si la pasada no corre por más de un día, los reportes dejan de usar las
+estadísticas hasta la siguiente.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estudiantes import db
+
+
+class Command(BaseCommand):
+    help = "Crea, recorta y verifica tbProductoMovimientoEstadistica (estadísticas de inventario para reportes)"
+
+    def add_arguments(self, parser):
+        accion = parser.add_mutually_exclusive_group(required=True)
+        accion.add_argument("--crear", action="store_true",
+                            help="Crea la tabla y la calcula con todo el historial de movimientos")
+        accion.add_argument("--recortar", action="store_true",
+                            help="Recalcula los contadores de la ventana de 30 días (pasada nocturna)")
+        accion.add_argument("--verificar", action="store_true", help="Compara con tbInventarioMovimiento")
+        accion.add_argument("--desactivar", action="store_true",
+                            help="Los reportes vuelven a calcular sobre tbInventarioMovimiento")
+        parser.add_argument("--reparar", action="store_true",
+                            help="Con --verificar: recalcula todo el historial si hay diferencias")
+        parser.add_argument("--limite", type=int, default=20, help="Diferencias a mostrar en consola")
+
+    def handle(self, *args, **opts):
+        if opts["crear"]:
+            db.estadisticas_movimientos_crear()
+            self.stdout.write(f"Tabla {db.MOVIMIENTOS_ESTADISTICA_TABLA} lista")
+        elif not db.estadisticas_movimientos_existe():
+            raise CommandError(f"{db.MOVIMIENTOS_ESTADISTICA_TABLA} no existe: ejecute primero --crear")
+
+        if opts["desactivar"]:
+            db.estadisticas_movimientos_desactivar()
+            self.stdout.write(self.style.SUCCESS("Estadísticas desactivadas: los reportes leen tbInventarioMovimiento"))
+            return
+
+        if opts["verificar"]:
+            self._verificar(opts)
+            return
+
+        self._recalcular(completo=opts["crear"])
+
+    def _recalcular(self, completo):
+        inicio = time.perf_counter()
+        filas, desde = db.estadisticas_movimientos_recalcular(completo=completo)
+        alcance = "historial completo" if completo else "ventana"
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas recalculadas ({alcance}, contadores desde {desde}): "
+            f"{filas} filas en {time.perf_counter() - inicio:.1f} s"))
+
+    def _verificar(self, opts):
+        desde = db.estadisticas_movimientos_ventana()
+        if desde is None:
+            raise CommandError("Las estadísticas no tienen ventana: ejecute --recortar o --crear")
+        diferencias = db.estadisticas_movimientos_diferencias()
+        for dif in diferencias[:opts["limite"]]:
+            self.stdout.write(
+                f"  producto {dif['idProducto']}: estadística {self._fila(dif['actual'])} / "
+                f"movimientos {self._fila(dif['esperado'])}"
+            )
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS(f"Estadísticas (ventana desde {desde}) coinciden con los movimientos"))
+            return
+        if not opts["reparar"]:
+            raise CommandError(f"{len(diferencias)} productos difieren (use --reparar para recalcular)")
+        self._recalcular(completo=True)
+
+    @staticmethod
+    def _fila(valores):
+        if valores is None:
+            return "-"
+        ultimo, entradas, salidas = valores
+        return f"último={ultimo or '-'} entradas={entradas or 0} salidas={salidas or 0}"
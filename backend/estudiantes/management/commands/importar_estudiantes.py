@@ -0,0 +1,65 @@
+"""
+Importa estudiantes desde un CSV/XLSX/JSON (inscripciones masivas).
+
+Uso:
+    python manage.py importar_estudiantes inscritos.csv --usuario 1 --errores errores.csv
+
+Columnas: nombres, apellidos, correo, telefono. Los correos ya registrados se
+reportan como duplicados (rc 2) sin detener el resto del archivo.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from estudiantes import importacion
+
+
+class Command(BaseCommand):
+    help = "Importa estudiantes desde CSV/XLSX/JSON por bloques y escribe un CSV con las filas rechazadas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ruta")
+        parser.add_argument("--usuario", type=int, default=None)
+        parser.add_argument("--errores", default=None, help="Ruta del CSV de errores (por defecto IMPORTACION_DIR)")
+        parser.add_argument("--bloque", type=int, default=getattr(settings, "IMPORTACION_TAM_BLOQUE", 500))
+        parser.add_argument("--hilos", type=int, default=getattr(settings, "IMPORTACION_HILOS", 4))
+
+    def handle(self, *args, **opts):
+        id_usuario = opts["usuario"] or self._usuario()
+        try:
+            archivo = open(opts["ruta"], "rb")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        reporte = importacion.ReporteErrores(opts["errores"])
+        inicio = time.perf_counter()
+        try:
+            filas = importacion.leer_filas(archivo, opts["ruta"], formatos=("csv", "xlsx", "json"))
+            resumen = importacion.importar_estudiantes(filas, id_usuario, reporte,
+                                                       tam_bloque=opts["bloque"], hilos=opts["hilos"])
+        except importacion.ArchivoInvalido as e:
+            raise CommandError(str(e))
+        finally:
+            reporte.cerrar()
+            archivo.close()
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"Filas: {resumen['procesadas']}  insertados: {resumen['escritas']}  "
+            f"errores: {resumen['errores']}  "
+            f"({duracion:.1f} s, {resumen['procesadas'] / duracion if duracion else 0:.0f} filas/s)"
+        )
+        if resumen["errores"]:
+            self.stdout.write(self.style.WARNING(f"Reporte de errores: {reporte.ruta}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Importación sin errores"))
+
+    def _usuario(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT TOP 1 idUsuario FROM dbo.tbUsuario WHERE estado = 'activo' ORDER BY idUsuario")
+            row = cur.fetchone()
+        if not row:
+            raise CommandError("No hay usuarios activos; indica --usuario")
+        return int(row[0])
@@ -0,0 +1,65 @@
+"""
+Importa el catálogo de productos desde un CSV/XLSX (upsert por código).
+
+Uso:
+    python manage.py importar_productos catalogo.csv --usuario 1 --errores errores.csv
+
+Columnas: codigo, nombre, descripcion, precioCosto, precioVenta, stockActual,
+stockMinimo, descuentoMaximoPct, estado, categorias (nombres separados por '|').
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from estudiantes import importacion
+
+
+class Command(BaseCommand):
+    help = "Importa productos desde CSV/XLSX por streaming y escribe un CSV con las filas rechazadas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ruta")
+        parser.add_argument("--usuario", type=int, default=None)
+        parser.add_argument("--errores", default=None, help="Ruta del CSV de errores (por defecto IMPORTACION_DIR)")
+        parser.add_argument("--bloque", type=int, default=getattr(settings, "IMPORTACION_TAM_BLOQUE", 500))
+        parser.add_argument("--hilos", type=int, default=getattr(settings, "IMPORTACION_HILOS", 4))
+
+    def handle(self, *args, **opts):
+        id_usuario = opts["usuario"] or self._usuario()
+        try:
+            archivo = open(opts["ruta"], "rb")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        reporte = importacion.ReporteErrores(opts["errores"])
+        inicio = time.perf_counter()
+        try:
+            filas = importacion.leer_filas(archivo, opts["ruta"])
+            resumen = importacion.importar_productos(filas, id_usuario, reporte,
+                                                     tam_bloque=opts["bloque"], hilos=opts["hilos"])
+        except importacion.ArchivoInvalido as e:
+            raise CommandError(str(e))
+        finally:
+            reporte.cerrar()
+            archivo.close()
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"Filas: {resumen['procesadas']}  creados: {resumen['creados']}  "
+            f"actualizados: {resumen['actualizados']}  errores: {resumen['errores']}  "
+            f"({duracion:.1f} s, {resumen['procesadas'] / duracion if duracion else 0:.0f} filas/s)"
+        )
+        if resumen["errores"]:
+            self.stdout.write(self.style.WARNING(f"Reporte de errores: {reporte.ruta}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Importación sin errores"))
+
+    def _usuario(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT TOP 1 idUsuario FROM dbo.tbUsuario WHERE estado = 'activo' ORDER BY idUsuario")
+            row = cur.fetchone()
+        if not row:
+            raise CommandError("No hay usuarios activos; indica --usuario")
+        return int(row[0])
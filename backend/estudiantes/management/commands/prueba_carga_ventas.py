@@ -0,0 +1,110 @@
+"""
+Prueba de carga de ventas concurrentes sobre un producto "caliente".
+
+Uso (SOLO contra una base de pruebas: registra ventas reales):
+    python manage.py prueba_carga_ventas --producto 15 --ventas 300 --hilos 32 --stock-inicial 200
+
+Lanza las ventas desde varios hilos (cada uno con su propia conexión) y verifica
+que el stock final coincide con las ventas aceptadas y que nunca se sobrevende.
+"""
+import threading
+import time
+from collections import Counter
+from queue import Empty, Queue
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from estudiantes import db
+
+
+class Command(BaseCommand):
+    help = "Dispara ventas concurrentes contra un producto y verifica stock final y throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--producto", type=int, required=True)
+        parser.add_argument("--ventas", type=int, default=300)
+        parser.add_argument("--hilos", type=int, default=32)
+        parser.add_argument("--cantidad", type=int, default=1, help="Unidades por venta")
+        parser.add_argument("--usuario", type=int, default=None)
+        parser.add_argument("--stock-inicial", type=int, default=None,
+                            help="Fija stockActual del producto antes de la prueba")
+        parser.add_argument("--sin-bloqueo", action="store_true",
+                            help="Desactiva la reserva con bloqueo de fila (para comparar)")
+
+    def _stock(self, id_producto):
+        with connection.cursor() as cur:
+            cur.execute("SELECT stockActual, precioVenta FROM dbo.tbProducto WHERE idProducto = %s", [id_producto])
+            row = cur.fetchone()
+        if not row:
+            raise CommandError(f"El producto {id_producto} no existe")
+        return int(row[0]), float(row[1] or 0)
+
+    def handle(self, *args, **opts):
+        id_producto = opts["producto"]
+        cantidad = opts["cantidad"]
+
+        id_usuario = opts["usuario"]
+        if not id_usuario:
+            with connection.cursor() as cur:
+                cur.execute("SELECT TOP 1 idUsuario FROM dbo.tbUsuario WHERE estado = 'activo' ORDER BY idUsuario")
+                row = cur.fetchone()
+            if not row:
+                raise CommandError("No hay usuarios activos; indica --usuario")
+            id_usuario = int(row[0])
+
+        if opts["stock_inicial"] is not None:
+            with connection.cursor() as cur:
+                cur.execute("UPDATE dbo.tbProducto SET stockActual = %s WHERE idProducto = %s",
+                            [opts["stock_inicial"], id_producto])
+
+        stock_inicial, precio = self._stock(id_producto)
+        detalles = [{"idProducto": id_producto, "cantidad": cantidad, "precioUnitario": precio, "descuentoPct": 0}]
+        bloquear = not opts["sin_bloqueo"]
+
+        pendientes = Queue()
+        for _ in range(opts["ventas"]):
+            pendientes.put(1)
+        resultados = Counter()
+        candado = threading.Lock()
+
+        def cajero():
+            try:
+                while True:
+                    try:
+                        pendientes.get_nowait()
+                    except Empty:
+                        return
+                    rc, _ = db.sp_registrar_venta(id_usuario, detalles, bloquear_stock=bloquear)
+                    with candado:
+                        resultados[rc] += 1
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(opts["hilos"])]
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        duracion = time.perf_counter() - t0
+
+        stock_final, _ = self._stock(id_producto)
+        aceptadas = resultados[0]
+        esperadas = min(opts["ventas"], stock_inicial // cantidad)
+
+        self.stdout.write(f"Ventas lanzadas: {opts['ventas']} en {opts['hilos']} hilos ({'con' if bloquear else 'sin'} bloqueo)")
+        self.stdout.write(f"Resultados por rc: {dict(sorted(resultados.items()))}")
+        self.stdout.write(f"Stock inicial={stock_inicial} final={stock_final} aceptadas={aceptadas}")
+        self.stdout.write(f"Duración {duracion:.2f}s, throughput {opts['ventas'] / duracion:.1f} ventas/s")
+
+        errores = []
+        if stock_final < 0:
+            errores.append(f"sobreventa: stock final negativo ({stock_final})")
+        if stock_final != stock_inicial - aceptadas * cantidad:
+            errores.append(f"stock final {stock_final} != {stock_inicial} - {aceptadas}x{cantidad}")
+        if bloquear and aceptadas != esperadas:
+            errores.append(f"se aceptaron {aceptadas} ventas, se esperaban {esperadas}")
+        if errores:
+            raise CommandError("; ".join(errores))
+        self.stdout.write(self.style.SUCCESS("OK: sin sobreventa y stock consistente"))
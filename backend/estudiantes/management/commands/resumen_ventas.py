@@ -0,0 +1,126 @@
+"""
+Crea, respalda y verifica el resumen diario de ventas (tbVentaResumenDiario).
+
+Uso:
+    python manage.py resumen_ventas --crear        # tabla + historial completo; activa los reportes
+    python manage.py resumen_ventas --respaldar --desde 2024-01-01 --hasta 2024-12-31
+    python manage.py resumen_ventas --verificar --desde 2025-01-01
+    python manage.py resumen_ventas --verificar --reparar
+    python manage.py resumen_ventas --desactivar   # los reportes vuelven a agregar tbVenta
+
+Los días cerrados (antes de ayer) se recalculan por bloques de --dias-bloque días;
+los que aún reciben ventas, uno por uno con bloqueo de rango sobre tbVenta, de modo
+que las ventas concurrentes esperan y se suman sobre lo recalculado.
+El resumen no tiene categorías (los reportes filtrados por categoría leen tbVenta),
+así que reasignar categorías no lo desalinea.
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estudiantes import db
+
+
+def _fecha(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida (use AAAA-MM-DD): {valor}")
+
+
+class Command(BaseCommand):
+    help = "Crea, respalda y verifica tbVentaResumenDiario (resumen diario de ventas para reportes)"
+
+    def add_arguments(self, parser):
+        accion = parser.add_mutually_exclusive_group(required=True)
+        accion.add_argument("--crear", action="store_true",
+                            help="Crea la tabla, respalda todo el historial y la marca como completa")
+        accion.add_argument("--respaldar", action="store_true", help="Recalcula el rango desde tbVenta")
+        accion.add_argument("--verificar", action="store_true", help="Compara el resumen con tbVenta")
+        accion.add_argument("--desactivar", action="store_true",
+                            help="Quita la marca de completo: los reportes vuelven a leer tbVenta")
+        parser.add_argument("--desde", type=_fecha, default=None)
+        parser.add_argument("--hasta", type=_fecha, default=None)
+        parser.add_argument("--reparar", action="store_true", help="Con --verificar: recalcula los días con diferencias")
+        parser.add_argument("--dias-bloque", type=int, default=31)
+        parser.add_argument("--limite", type=int, default=20, help="Diferencias a mostrar en consola")
+
+    def handle(self, *args, **opts):
+        if opts["crear"]:
+            db.resumen_ventas_crear()
+            self.stdout.write(f"Tabla {db.RESUMEN_VENTAS_TABLA} lista")
+        elif not db.resumen_ventas_existe():
+            raise CommandError(f"{db.RESUMEN_VENTAS_TABLA} no existe: ejecute primero --crear")
+
+        if opts["desactivar"]:
+            db.resumen_ventas_marcar(False)
+            self.stdout.write(self.style.SUCCESS("Resumen desactivado: los reportes leen tbVenta"))
+            return
+
+        primera, _ = db.resumen_ventas_rango()
+        hoy = db._fecha_hoy_bd()
+        desde = opts["desde"] or primera or hoy
+        hasta = opts["hasta"] or hoy
+        if desde > hasta:
+            raise CommandError("--desde es posterior a --hasta")
+
+        if opts["verificar"]:
+            self._verificar(desde, hasta, hoy, opts)
+            return
+
+        self._respaldar(desde, hasta, hoy, opts["dias_bloque"])
+        if opts["crear"] or (opts["desde"] is None and opts["hasta"] is None):
+            db.resumen_ventas_marcar(True)
+            self.stdout.write(self.style.SUCCESS("Resumen marcado como completo: los reportes lo usan"))
+
+    def _respaldar(self, desde, hasta, hoy, dias_bloque):
+        inicio, filas = time.perf_counter(), 0
+        for d, h, bloquear in self._tramos(desde, hasta, hoy, dias_bloque):
+            filas += db.resumen_ventas_recalcular(d, h, bloquear=bloquear)
+            self.stdout.write(f"  {d} .. {h}: {filas} filas acumuladas")
+        self.stdout.write(self.style.SUCCESS(
+            f"Respaldo {desde} .. {hasta}: {filas} filas en {time.perf_counter() - inicio:.1f} s"))
+
+    @staticmethod
+    def _tramos(desde, hasta, hoy, dias_bloque):
+        """(desde, hasta, bloquear): bloques para días cerrados, un día a la vez para los abiertos"""
+        abierto = hoy - datetime.timedelta(days=1)
+        paso = datetime.timedelta(days=max(1, dias_bloque))
+        d = desde
+        while d <= hasta:
+            if d >= abierto:
+                yield d, d, True
+                d += datetime.timedelta(days=1)
+            else:
+                h = min(d + paso - datetime.timedelta(days=1), hasta, abierto - datetime.timedelta(days=1))
+                yield d, h, False
+                d = h + datetime.timedelta(days=1)
+
+    def _verificar(self, desde, hasta, hoy, opts):
+        diferencias = []
+        for d, h, _ in self._tramos(desde, hasta, hoy, opts["dias_bloque"]):
+            diferencias += db.resumen_ventas_diferencias(d, h)
+        for dif in diferencias[:opts["limite"]]:
+            self.stdout.write(
+                f"  {dif['fecha']} usuario {dif['idUsuario']}: "
+                f"resumen {self._fila(dif['resumen'])} / tbVenta {self._fila(dif['esperado'])}"
+            )
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS(f"Resumen {desde} .. {hasta} coincide con tbVenta"))
+            return
+        dias = sorted({dif["fecha"] for dif in diferencias})
+        if not opts["reparar"]:
+            raise CommandError(f"{len(diferencias)} filas difieren en {len(dias)} días "
+                               f"(use --reparar para recalcularlos)")
+        abierto = hoy - datetime.timedelta(days=1)
+        for dia in dias:
+            db.resumen_ventas_recalcular(dia, dia, bloquear=dia >= abierto)
+        self.stdout.write(self.style.SUCCESS(f"{len(dias)} días recalculados ({len(diferencias)} filas)"))
+
+    @staticmethod
+    def _fila(valores):
+        if valores is None:
+            return "-"
+        subtotal, descuentos, total, tickets, unidades = valores
+        return f"total={float(total):.2f} desc={float(descuentos):.2f} tickets={tickets} unidades={unidades}"
@@ -0,0 +1,67 @@
+"""
+Verifica un backend de caché compartido con varios procesos a la vez.
+
+Uso:
+    python manage.py verificar_cache                                   # SQLite temporal
+    python manage.py verificar_cache --backend sqlite:///var/tmp/crud_cache.sqlite3
+    python manage.py verificar_cache --backend redis://127.0.0.1:6379/0 --procesos 8
+    python manage.py verificar_cache --resp-local                      # sustituto RESP en este proceso
+
+Las verificaciones están en estudiantes.verificacion_cache; las mismas corren
+automáticamente en estudiantes/tests/test_cache_compartido.py (SQLite y RESP local).
+Este comando sirve para probar el backend real de un despliegue. No toca la base de datos.
+"""
+import contextlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estudiantes import verificacion_cache
+from estudiantes.cache import crear_backend
+
+
+class Command(BaseCommand):
+    help = "Prueba un backend de caché compartido con varios procesos (lectura, reserva, INCR e invalidación)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default=None,
+                            help="URL del backend (por defecto un archivo SQLite temporal)")
+        parser.add_argument("--resp-local", action="store_true",
+                            help="Levanta un sustituto de Redis en este proceso y lo usa como backend")
+        parser.add_argument("--procesos", type=int, default=4)
+        parser.add_argument("--intervalo", type=float, default=0.5,
+                            help="CACHE_SINCRONIZAR_SEGUNDOS de los procesos de prueba")
+        parser.add_argument("--tolerancia", type=float, default=0.5,
+                            help="Segundos de margen sobre --intervalo para aceptar un retraso")
+
+    def handle(self, *args, **opts):
+        procesos = opts["procesos"]
+        if procesos < 2:
+            raise CommandError("--procesos debe ser al menos 2")
+        if not verificacion_cache.hay_fork():
+            raise CommandError("Se requiere un sistema con fork (Linux/macOS)")
+
+        if opts["resp_local"]:
+            contexto = verificacion_cache.servidor_resp()
+        elif opts["backend"]:
+            contexto = contextlib.nullcontext(opts["backend"])
+        else:
+            contexto = verificacion_cache.sqlite_temporal()
+
+        with contexto as url:
+            if not crear_backend(url).compartido:
+                raise CommandError("El backend debe ser compartido (sqlite:/// o redis://)")
+            try:
+                resultados = verificacion_cache.correr(url, procesos, opts["intervalo"])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(f"{procesos} procesos en {resultados['segundos']:.2f} s")
+        self.stdout.write(f"Backend {url.split('@')[-1]}")
+        fallas = []
+        for nombre, ok, detalle in verificacion_cache.evaluar(resultados, opts["intervalo"] + opts["tolerancia"]):
+            self.stdout.write(f"  {'OK   ' if ok else 'FALLA'} {nombre}: {detalle}")
+            if not ok:
+                fallas.append(nombre)
+        if fallas:
+            raise CommandError(f"{len(fallas)} verificaciones fallaron: {', '.join(fallas)}")
+        self.stdout.write(self.style.SUCCESS("Backend compartido verificado"))
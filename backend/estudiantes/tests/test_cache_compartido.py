@@ -0,0 +1,31 @@
+"""
+Backends de caché compartidos con varios procesos (estudiantes.verificacion_cache).
+No usan la base de datos: SQLite en un archivo temporal y Redis con el sustituto RESP local.
+"""
+import unittest
+
+from django.test import SimpleTestCase
+
+from estudiantes import verificacion_cache
+
+PROCESOS = 4
+INTERVALO = 0.3
+TOLERANCIA = 0.7
+
+
+@unittest.skipUnless(verificacion_cache.hay_fork(), "requiere fork (Linux/macOS)")
+class CacheCompartidoMultiprocesoTests(SimpleTestCase):
+
+    def _verificar(self, url):
+        resultados = verificacion_cache.correr(url, PROCESOS, INTERVALO)
+        for nombre, ok, detalle in verificacion_cache.evaluar(resultados, INTERVALO + TOLERANCIA):
+            with self.subTest(nombre):
+                self.assertTrue(ok, detalle)
+
+    def test_sqlite(self):
+        with verificacion_cache.sqlite_temporal() as url:
+            self._verificar(url)
+
+    def test_redis_resp_local(self):
+        with verificacion_cache.servidor_resp() as url:
+            self._verificar(url)
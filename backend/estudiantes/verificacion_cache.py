@@ -0,0 +1,270 @@
+"""
+Verificación de un backend de caché compartido con varios procesos a la vez.
+
+La usan las pruebas (estudiantes/tests/test_cache_compartido.py) y el comando
+verificar_cache. Cada proceso abre su propia conexión al backend y se comprueba que:
+  - lo que guarda uno lo leen los demás,
+  - add() reserva una clave para un solo proceso (idempotencia),
+  - INCR concurrente no pierde incrementos,
+  - Versiones, invalidar_grupo() y Difusion llegan a todos los procesos dentro
+    del intervalo de sincronización (más una tolerancia).
+No toca la base de datos. Requiere fork (Linux/macOS).
+"""
+import contextlib
+import multiprocessing
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+
+from .cache import FALTA, CacheLRU, Difusion, Versiones, crear_backend
+
+INCREMENTOS = 200
+
+
+def hay_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _esperar(condicion, limite):
+    """Segundos hasta que condicion() es verdadera, o None si no ocurre antes de `limite`"""
+    inicio = time.time()
+    while time.time() - inicio < limite:
+        if condicion():
+            return time.time()
+        time.sleep(0.005)
+    return None
+
+
+def _trabajador(url, indice, intervalo, ejecucion, barrera, cola):
+    """Corre en un proceso hijo: cada prueba se sincroniza con la barrera"""
+    backend = crear_backend(url)
+    resultado = {"indice": indice}
+    escritor = indice == 0
+    limite = intervalo * 3 + 2
+    try:
+        cache = CacheLRU(f"verif-{ejecucion}", ttl=60, backend=backend, intervalo=intervalo)
+        versiones = Versiones(f"verif-{ejecucion}", backend, intervalo)
+        difusion = Difusion(f"verif-{ejecucion}", backend, intervalo)
+        difusion.base()
+
+        # 1. Lo que guarda un proceso lo leen los demás
+        if escritor:
+            cache.set(("detalle", 1), {"nombre": "compartido"})
+        barrera.wait()
+        resultado["compartido"] = cache.get(("detalle", 1)) == {"nombre": "compartido"}
+        barrera.wait()
+
+        # 2. Reserva de idempotencia: un solo proceso gana
+        resultado["reservas"] = int(cache.add("reserva", indice, ttl=60))
+        barrera.wait()
+
+        # 3. INCR concurrente
+        for _ in range(INCREMENTOS):
+            backend.incr(f"verif-{ejecucion}:incr")
+        barrera.wait()
+
+        # 4. Versión por clave: todos leen 0, el escritor incrementa
+        versiones.actual("p1")
+        barrera.wait()
+        if escritor:
+            time.sleep(0.05)
+            backend.set(f"verif-{ejecucion}:t-version", time.time())
+            versiones.incrementar(["p1"])
+        else:
+            visto = _esperar(lambda: versiones.actual("p1") >= 1, limite)
+            # El escritor guarda la hora antes de incrementar: ya está al verlo
+            t0 = backend.get(f"verif-{ejecucion}:t-version")
+            resultado["retrasoVersion"] = visto - t0 if visto and t0 is not FALTA else None
+        barrera.wait()
+
+        # 5. Invalidación de un grupo de claves
+        if escritor:
+            cache.set(("listar", "a"), "v1")
+        barrera.wait()
+        cache.get(("listar", "a"))
+        barrera.wait()
+        if escritor:
+            time.sleep(0.05)
+            backend.set(f"verif-{ejecucion}:t-grupo", time.time())
+            cache.invalidar_grupo("listar")
+        else:
+            visto = _esperar(lambda: cache.get(("listar", "a"), FALTA) is FALTA, limite)
+            t0 = backend.get(f"verif-{ejecucion}:t-grupo")
+            resultado["retrasoGrupo"] = visto - t0 if visto and t0 is not FALTA else None
+        barrera.wait()
+
+        # 6. Difusión de ids cambiados para índices en memoria
+        if escritor:
+            time.sleep(0.05)
+            backend.set(f"verif-{ejecucion}:t-difusion", time.time())
+            difusion.publicar([7, 8])
+            time.sleep(intervalo + 0.1)
+            resultado["difusionPropia"] = difusion.pendientes() is None
+        else:
+            recibidos = []
+            visto = _esperar(lambda: recibidos.append(difusion.pendientes()) or recibidos[-1] is not None, limite)
+            t0 = backend.get(f"verif-{ejecucion}:t-difusion")
+            resultado["retrasoDifusion"] = visto - t0 if visto and t0 is not FALTA else None
+            resultado["difusionIds"] = sorted(recibidos[-1]) if visto else None
+        barrera.wait()
+    except Exception as e:  # noqa: BLE001 - se informa al proceso principal
+        resultado["error"] = f"{type(e).__name__}: {e}"
+        barrera.abort()
+    cola.put(resultado)
+
+
+def correr(url, procesos: int, intervalo: float) -> dict:
+    """
+    Corre las pruebas en `procesos` procesos contra el backend `url`.
+    Retorna {procesos: [resultado por proceso], incr: total de INCR, segundos}.
+    RuntimeError si algún proceso falla.
+    """
+    ctx = multiprocessing.get_context("fork")
+    ejecucion = uuid.uuid4().hex[:8]
+    barrera, cola = ctx.Barrier(procesos, timeout=intervalo * 6 + 30), ctx.Queue()
+    hijos = [ctx.Process(target=_trabajador, args=(url, i, intervalo, ejecucion, barrera, cola))
+             for i in range(procesos)]
+    inicio = time.perf_counter()
+    for h in hijos:
+        h.start()
+    resultados = [cola.get(timeout=intervalo * 40 + 120) for _ in hijos]
+    for h in hijos:
+        h.join()
+    resultados.sort(key=lambda r: r["indice"])
+    errores = [f"proceso {r['indice']}: {r['error']}" for r in resultados if "error" in r]
+    if errores:
+        raise RuntimeError("Falló la ejecución:\n  " + "\n  ".join(errores))
+    total_incr, = crear_backend(url).contadores([f"verif-{ejecucion}:incr"])
+    return {"procesos": resultados, "incr": total_incr, "segundos": time.perf_counter() - inicio}
+
+
+def evaluar(resultados: dict, maximo: float) -> list:
+    """[(nombre, ok, detalle)] de cada verificación; maximo = retraso aceptado en segundos"""
+    por_proceso = resultados["procesos"]
+    procesos, lectores = len(por_proceso), por_proceso[1:]
+    verificaciones = [
+        ("lectura compartida", all(r["compartido"] for r in por_proceso),
+         f"{sum(r['compartido'] for r in por_proceso)}/{procesos} procesos leen el valor"),
+    ]
+    reservas = sum(r["reservas"] for r in por_proceso)
+    verificaciones.append(("reserva add()", reservas == 1, f"{reservas} de {procesos} procesos obtuvieron la clave"))
+    esperado = procesos * INCREMENTOS
+    verificaciones.append(("INCR concurrente", resultados["incr"] == esperado, f"{resultados['incr']} de {esperado}"))
+    for nombre, campo in (("versión por clave", "retrasoVersion"),
+                          ("invalidar_grupo", "retrasoGrupo"),
+                          ("difusión", "retrasoDifusion")):
+        retrasos = [r[campo] for r in lectores]
+        ok = all(d is not None and d <= maximo for d in retrasos)
+        peor = max((d for d in retrasos if d is not None), default=None)
+        detalle = f"peor retraso {peor:.3f} s (máximo {maximo:.2f} s)" if peor is not None else "no llegó"
+        verificaciones.append((nombre, ok, detalle))
+    ids_ok = all(r["difusionIds"] == [7, 8] for r in lectores) and por_proceso[0]["difusionPropia"]
+    verificaciones.append(("difusión: ids y cambios propios", ids_ok,
+                           "los demás reciben [7, 8]; quien publica no los recibe de vuelta"))
+    return verificaciones
+
+
+@contextlib.contextmanager
+def sqlite_temporal():
+    """URL de un archivo SQLite temporal; lo borra (con -wal y -shm) al salir"""
+    archivo = os.path.join(tempfile.gettempdir(), f"crud_cache_verif_{uuid.uuid4().hex}.sqlite3")
+    try:
+        yield f"sqlite:///{archivo}"
+    finally:
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(archivo + sufijo):
+                os.remove(archivo + sufijo)
+
+
+@contextlib.contextmanager
+def servidor_resp():
+    """URL redis:// de un sustituto RESP que corre en este proceso mientras dura el bloque"""
+    servidor = _ServidorRESP()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        yield f"redis://127.0.0.1:{servidor.server_address[1]}/0"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+class _ManejadorRESP(socketserver.StreamRequestHandler):
+    """Sustituto local de Redis con los comandos que usa BackendRedis"""
+
+    def _leer_comando(self):
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        if not linea.startswith(b"*"):
+            return linea.split()
+        args = []
+        for _ in range(int(linea[1:])):
+            largo = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(largo + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(valor):
+        return b"$-1\r\n" if valor is None else b"$%d\r\n%s\r\n" % (len(valor), valor)
+
+    def handle(self):
+        servidor = self.server
+        while True:
+            args = self._leer_comando()
+            if args is None:
+                return
+            comando = args[0].upper()
+            with servidor.lock:
+                self.wfile.write(self._responder(servidor, comando, args[1:]))
+
+    def _responder(self, servidor, comando, args):
+        datos, ahora = servidor.datos, time.monotonic()
+
+        def vigente(clave):
+            item = datos.get(clave)
+            if item is not None and item[1] is not None and item[1] <= ahora:
+                del datos[clave]
+                return None
+            return item
+
+        if comando in (b"PING", b"SELECT", b"AUTH"):
+            return b"+OK\r\n" if comando != b"PING" else b"+PONG\r\n"
+        if comando == b"GET":
+            item = vigente(args[0])
+            return self._bulk(item[0] if item else None)
+        if comando == b"MGET":
+            partes = [b"*%d\r\n" % len(args)]
+            for clave in args:
+                item = vigente(clave)
+                partes.append(self._bulk(item[0] if item else None))
+            return b"".join(partes)
+        if comando == b"SET":
+            clave, valor, opciones = args[0], args[1], [a.upper() for a in args[2:]]
+            expira = None
+            if b"PX" in opciones:
+                expira = ahora + int(args[2 + opciones.index(b"PX") + 1]) / 1000
+            if b"NX" in opciones and vigente(clave) is not None:
+                return b"$-1\r\n"
+            datos[clave] = (valor, expira)
+            return b"+OK\r\n"
+        if comando == b"DEL":
+            return b":%d\r\n" % sum(datos.pop(c, None) is not None for c in args)
+        if comando == b"INCR":
+            item = vigente(args[0])
+            valor = int(item[0]) + 1 if item else 1
+            datos[args[0]] = (str(valor).encode(), None)
+            return b":%d\r\n" % valor
+        return b"-ERR comando no soportado\r\n"
+
+
+class _ServidorRESP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _ManejadorRESP)
+        self.datos = {}
+        self.lock = threading.Lock()
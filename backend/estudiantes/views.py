@@ -1,4 +1,5 @@
-from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed, FileResponse, Http404, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_exempt 
 from django.shortcuts import render, redirect
@@ -8,13 +9,18 @@ from django.db import connection
 from django.conf import settings
 from django.urls import reverse
 from .security import verify_recaptcha  
+from . import autocompletar, busqueda, duplicados, idempotencia, importacion
+from .cache import CACHES
+from .catalogo import catalogo
 from utils.guards import require_role
 import csv, io, datetime
 import json
+import os
 import secrets
 
 from .db import (
     listar_estudiantes,            
+    listar_estudiantes_pagina,
     obtener_estudiante_por_id,     
     sp_est_insertar,
     sp_est_actualizar,
@@ -26,7 +32,8 @@ from .db import (
     registrar_usuario,
     bloquear_usuario,
     desbloquear_usuario,
-    rep_accesos, rep_transacciones, vw_ultima_conexion, vw_tiempo_promedio, rep_datos_personales,
+    rep_accesos, rep_transacciones, rep_accesos_pagina, rep_transacciones_pagina,
+    vw_ultima_conexion, vw_tiempo_promedio, rep_datos_personales,
     get_usuario_info,
     login_usuario,
     solicitar_codigo_reset,  # crea registro y guarda hash del código
@@ -49,15 +56,112 @@ def _json_body(request):
         return {}
 
 
+def _int_param(request, nombre, defecto, minimo=1, maximo=None):
+    try:
+        v = int(request.GET.get(nombre) or defecto)
+    except (TypeError, ValueError):
+        v = defecto
+    v = max(minimo, v)
+    return min(v, maximo) if maximo else v
+
+
+def _fecha_param(request, nombre):
+    """YYYY-MM-DD -> date (None si no viene); lanza ValueError si el formato no es válido"""
+    v = (request.GET.get(nombre) or "").strip()
+    if not v:
+        return None
+    try:
+        return datetime.date.fromisoformat(v[:10])
+    except ValueError:
+        raise ValueError(f"{nombre} debe tener formato YYYY-MM-DD")
+
+
+def _flag_param(request, nombre, defecto=False):
+    v = request.GET.get(nombre)
+    if v is None or v == "":
+        return defecto
+    return v.lower() in ("1", "true")
+
+
 # ---------------------------
 # API: Listar
-# GET /api/estudiantes
+# GET /api/estudiantes?pageSize=50&cursor=...&orden=apellidos&dir=asc
+#     filtros: buscar (nombre/apellido), correo, desde, hasta (YYYY-MM-DD)
+#     page=N usa OFFSET en lugar del cursor; todos=1 devuelve la lista completa (sin paginar)
+# Respuesta: {data, total, next}
 # ---------------------------
 @require_role("admin", "secretaria")
 @require_http_methods(["GET"])
 def api_listar(request):
-    data = listar_estudiantes()
-    return JsonResponse({"data": data})
+    if _flag_param(request, "todos"):
+        data = listar_estudiantes()
+        return JsonResponse({"data": data, "total": len(data), "next": None})
+
+    cursor = request.GET.get("cursor") or None
+    page = request.GET.get("page")
+    try:
+        result = listar_estudiantes_pagina(
+            buscar=(request.GET.get("buscar") or "").strip() or None,
+            correo=(request.GET.get("correo") or "").strip() or None,
+            desde=_fecha_param(request, "desde"),
+            hasta=_fecha_param(request, "hasta"),
+            orden=request.GET.get("orden") or "idEstudiante",
+            descendente=(request.GET.get("dir") or "asc").lower() == "desc",
+            page=_int_param(request, "page", 1) if page else None,
+            page_size=_int_param(request, "pageSize", 50, maximo=500),
+            cursor=cursor,
+            # En páginas con cursor el total ya se conoce de la primera
+            con_total=_flag_param(request, "withTotal", defecto=not cursor),
+        )
+    except ValueError as e:
+        return JsonResponse({"msg": str(e)}, status=400)
+    return JsonResponse(result)
+
+
+# ---------------------------
+# API: Autocompletado
+# GET /api/estudiantes/autocompletar?q=mar lo&k=10
+# Respuesta: {data: [{idEstudiante, nombres, apellidos, correo}, ...]}
+# ---------------------------
+@require_role("admin", "secretaria")
+@require_http_methods(["GET"])
+def api_autocompletar(request):
+    q = (request.GET.get("q") or "").strip()
+    k = _int_param(request, "k", 10, maximo=50)
+    return JsonResponse({"data": autocompletar.indice.buscar(q, k) if q else []})
+
+
+# ---------------------------
+# API: Posibles duplicados
+# GET /api/estudiantes/duplicados?desdeId=12000&umbral=0.85&limit=100
+#     desdeId (obligatorio): solo pares con algún estudiante nuevo (id > desdeId); se
+#     revisan a lo sumo duplicados.NUEVOS_POR_CONSULTA nuevos por consulta. El padrón
+#     completo se revisa con `manage.py detectar_duplicados`.
+# Respuesta: {data: [{a, b, puntaje, motivos}], total, ultimoId, hasMore}
+#     (ultimoId = desdeId de la próxima consulta; hasMore = quedan nuevos sin revisar)
+# ---------------------------
+@require_role("admin", "secretaria")
+@require_http_methods(["GET"])
+def api_duplicados(request):
+    desde_id = request.GET.get("desdeId")
+    if desde_id in (None, ""):
+        return JsonResponse({"msg": "desdeId es obligatorio (el padrón completo se revisa con "
+                                    "manage.py detectar_duplicados)"}, status=400)
+    try:
+        desde_id = int(desde_id)
+        umbral = float(request.GET.get("umbral") or duplicados.UMBRAL)
+    except ValueError:
+        return JsonResponse({"msg": "desdeId/umbral inválidos"}, status=400)
+    limite = _int_param(request, "limit", 100, maximo=1000)
+
+    registros, ultimo_id, hay_mas = duplicados.cargar_registros_nuevos(desde_id)
+    pares = duplicados.detectar(registros, desde_id=desde_id, umbral=umbral)
+    return JsonResponse({
+        "data": pares[:limite],
+        "total": len(pares),
+        "ultimoId": ultimo_id,
+        "hasMore": hay_mas,
+    })
 
 
 # ---------------------------
@@ -123,6 +227,63 @@ def api_eliminar(request, id_est: int):
     rc = sp_est_eliminar(id_est, request.session.get("id_usuario_db"))
     return JsonResponse({"rc": rc})  # 200
 
+# ---------------------------
+# API: Importación masiva
+# POST /api/estudiantes/importar
+# multipart 'archivo' (CSV/XLSX/JSON) o JSON {estudiantes: [{nombres, apellidos, correo, telefono}, ...]}
+# ---------------------------
+@require_role("admin","secretaria")
+@require_http_methods(["POST"])
+def api_importar(request):
+    archivo = request.FILES.get("archivo")
+    try:
+        if archivo:
+            filas = importacion.leer_filas(archivo.file, archivo.name, formatos=("csv", "xlsx", "json"))
+        else:
+            body = json.loads(request.body.decode("utf-8") or "{}")
+            filas = body.get("estudiantes")
+            if not isinstance(filas, list):
+                return JsonResponse({"ok": False, "msg": "Envía un archivo o la lista 'estudiantes'"}, status=400)
+            filas = [f for f in filas if isinstance(f, dict)]
+    except importacion.ArchivoInvalido as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    except Exception:
+        return JsonResponse({"ok": False, "msg": "JSON inválido"}, status=400)
+
+    reporte = importacion.ReporteErrores()
+    try:
+        resumen = importacion.importar_estudiantes(
+            filas, request.session.get("id_usuario_db"), reporte,
+            tam_bloque=getattr(settings, "IMPORTACION_TAM_BLOQUE", 500),
+            hilos=getattr(settings, "IMPORTACION_HILOS", 4),
+        )
+    except importacion.ArchivoInvalido as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    except Exception as e:
+        print(f"Error importando estudiantes: {e}")
+        return JsonResponse({"ok": False, "msg": "No se pudo leer el archivo"}, status=400)
+    finally:
+        reporte.cerrar()
+
+    resumen["ok"] = True
+    resumen["reporteErrores"] = reverse("api_importar_errores", args=[reporte.token]) if reporte.token else None
+    return JsonResponse(resumen)
+
+
+@require_role("admin","secretaria")
+@require_http_methods(["GET"])
+def api_importar_errores(request, token: str):
+    return _descargar_reporte_errores(token)
+
+
+def _descargar_reporte_errores(token: str):
+    """FileResponse con el CSV de errores de una importación"""
+    ruta = importacion.ruta_reporte(token)
+    if not ruta:
+        raise Http404("Reporte no encontrado")
+    return FileResponse(open(ruta, "rb"), as_attachment=True,
+                        filename=f"errores_importacion_{token[:8]}.csv", content_type="text/csv")
+
 #-------------------------
 # APIs Usuarios
 #-------------------------
@@ -486,32 +647,49 @@ def api_rep_tiempo_promedio(request):
 @require_role("admin")
 @require_http_methods(["GET"])
 def api_rep_accesos(request):
+    """
+    Paginado por cursor: ?limit=500&cursor=<next de la página anterior> -> {ok, data, next}
+    ?offset=N conserva el paginado anterior (sin next).
+    """
     qs = request.GET
-    data = rep_accesos(
+    filtros = dict(
         usuario=qs.get("usuario"),
         estado=_bool_or_none(qs.get("exito")),
         f_ini=_get_date(qs, "desde"),
         f_fin=_get_date(qs, "hasta"),
         accion=qs.get("accion"),
-        limit=int(qs.get("limit") or 500),
-        offset=int(qs.get("offset") or 0),
+        limit=_int_param(request, "limit", 500, maximo=5000),
     )
-    return JsonResponse({"ok": True, "data": data})
+    if qs.get("offset"):
+        data = rep_accesos(offset=_int_param(request, "offset", 0, minimo=0), **filtros)
+        return JsonResponse({"ok": True, "data": data})
+    try:
+        pagina = rep_accesos_pagina(cursor=qs.get("cursor") or None, **filtros)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    return JsonResponse({"ok": True, **pagina})
 
 @require_role("admin")
 @require_http_methods(["GET"])
 def api_rep_transacciones(request):
+    """Mismo esquema de paginado que api_rep_accesos (cursor por defecto, offset por compatibilidad)"""
     qs = request.GET
-    data = rep_transacciones(
+    filtros = dict(
         usuario=qs.get("usuario"),
         entidad=qs.get("entidad"),
         operacion=qs.get("operacion"),
         f_ini=_get_date(qs, "desde"),
         f_fin=_get_date(qs, "hasta"),
-        limit=int(qs.get("limit") or 500),
-        offset=int(qs.get("offset") or 0),
+        limit=_int_param(request, "limit", 500, maximo=5000),
     )
-    return JsonResponse({"ok": True, "data": data})
+    if qs.get("offset"):
+        data = rep_transacciones(offset=_int_param(request, "offset", 0, minimo=0), **filtros)
+        return JsonResponse({"ok": True, "data": data})
+    try:
+        pagina = rep_transacciones_pagina(cursor=qs.get("cursor") or None, **filtros)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    return JsonResponse({"ok": True, **pagina})
 
 @require_role("admin")
 @require_http_methods(["GET"])
@@ -940,19 +1118,20 @@ from .db import (
     sp_categoria_crear, sp_categoria_actualizar, sp_categoria_eliminar,
     sp_categoria_obtener, sp_categoria_listar,
     # Inventario
-    sp_inventario_historial,
+    sp_inventario_historial, inventario_historial_pagina, inventario_historial_stream,
     # Productos
     sp_producto_crear, sp_producto_actualizar, sp_producto_eliminar,
-    sp_producto_obtener, sp_producto_listar, sp_producto_listar_con_categorias,
+    sp_producto_obtener, sp_producto_listar, sp_producto_listar_con_categorias, stock_por_producto,
     # Producto-Categoría
     sp_producto_categoria_asignar, sp_producto_categoria_quitar, sp_producto_categoria_listar,
     # Inventario
-    sp_inventario_registrar_entrada, vw_inventario_actual,
+    sp_inventario_registrar_entrada, sp_inventario_registrar_movimientos_lote, vw_inventario_actual,
     # Ventas
-    sp_registrar_venta, listar_ventas, obtener_venta_detalle,
+    sp_registrar_venta, sp_registrar_ventas_lote, listar_ventas, listar_ventas_pagina, obtener_venta_detalle,
     # Reportes
     sp_reporte_ventas_por_fecha, sp_reporte_inventario_actual,
     sp_reporte_productos_mas_vendidos, sp_reporte_ingresos_totales,
+    get_rc_message,
 )
 
 # ---------------------------
@@ -967,7 +1146,9 @@ def api_categoria_listar(request):
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("pageSize", 100))
     
-    result = sp_categoria_listar(buscar, solo_activas, page, page_size)
+    # withTotal=0: sin conteo (scroll infinito, usar hasMore)
+    result = sp_categoria_listar(buscar, solo_activas, page, page_size,
+                                 con_total=_flag_param(request, "withTotal", True))
     return JsonResponse({"ok": True, **result})
 
 
@@ -1047,26 +1228,140 @@ def api_categoria_eliminar(request, id_cat: int):
 @require_role("admin", "secretaria")
 @require_http_methods(["GET"])
 def api_producto_listar(request):
-    """Lista productos con filtros y paginación"""
+    """Lista productos con filtros y paginación (modo=difuso tolera errores de tipeo en buscar)"""
     buscar = request.GET.get("buscar")
     id_categoria = request.GET.get("idCategoria")
     estado = request.GET.get("estado")
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("pageSize", 100))
     con_categorias = request.GET.get("conCategorias", "0").lower() in ("1", "true")
+    con_total = _flag_param(request, "withTotal", True)
+    difuso = request.GET.get("modo") == "difuso"
     
-    if con_categorias:
+    result = None
+    if buscar:
+        # Índice de trigramas en memoria (ordena por relevancia); None = consulta muy corta
+        result = busqueda.listar_productos(
+            buscar, int(id_categoria) if id_categoria else None, estado, page, page_size,
+            con_total, con_categorias, difuso
+        )
+    if result is None and con_categorias:
         result = sp_producto_listar_con_categorias(
-            buscar, int(id_categoria) if id_categoria else None, estado, page, page_size
+            buscar, int(id_categoria) if id_categoria else None, estado, page, page_size, con_total
         )
-    else:
+    elif result is None:
         result = sp_producto_listar(
-            buscar, int(id_categoria) if id_categoria else None, estado, page, page_size
+            buscar, int(id_categoria) if id_categoria else None, estado, page, page_size, con_total
         )
     
     return JsonResponse({"ok": True, **result})
 
 
+@require_role("admin", "secretaria")
+@require_http_methods(["GET"])
+def api_catalogo(request):
+    """
+    Snapshot del catálogo en memoria (sin stock) para el POS.
+    ?version=N devuelve solo los cambios desde N: {ok, version, cambios, eliminados};
+    sin version, o si N ya no está en el historial: {ok, version, completo: true, data}
+    """
+    version = request.GET.get("version")
+    if version not in (None, ""):
+        try:
+            delta = catalogo.cambios_desde(int(version))
+        except ValueError:
+            return JsonResponse({"ok": False, "msg": "version inválida"}, status=400)
+        if delta is not None:
+            actual, cambiados, eliminados = delta
+            return JsonResponse({
+                "ok": True, "version": actual, "completo": False,
+                "cambios": [p.como_dict() for p in cambiados], "eliminados": eliminados,
+            })
+    version, productos = catalogo.snapshot()
+    return JsonResponse({
+        "ok": True, "version": version, "completo": True,
+        "data": [p.como_dict() for p in productos],
+    })
+
+
+@require_role("admin")
+@require_http_methods(["GET"])
+def api_cache_estadisticas(request):
+    """Aciertos/fallos de las cachés vistos por este proceso y tamaño de los índices"""
+    return JsonResponse({
+        "ok": True,
+        "pid": os.getpid(),
+        "caches": [c.estadisticas() for c in CACHES.values()],
+        "indices": {
+            "catalogo": catalogo.estadisticas(),
+            "busqueda": busqueda.indice.estadisticas(),
+            "busquedaDifusa": busqueda.indice_difuso.estadisticas(),
+            "estudiantes": autocompletar.indice.estadisticas(),
+        },
+    })
+
+
+def _productos_por_codigo(codigos: list):
+    """[(codigo, dict para el POS | None)] con precio, tope de descuento y stock actual"""
+    encontrados = catalogo.por_codigos(codigos)
+    stock = stock_por_producto([p.idProducto for p in encontrados.values()]) if encontrados else {}
+    resultado = []
+    for c in codigos:
+        p = encontrados.get(c)
+        if p is None or p.idProducto not in stock:
+            resultado.append((c, None))
+            continue
+        resultado.append((c, {
+            "idProducto": p.idProducto,
+            "codigo": p.codigo,
+            "nombre": p.nombre,
+            "precioVenta": p.precioVenta,
+            "descuentoMaximoPct": p.descuentoMaximoPct,
+            "stockActual": stock[p.idProducto],
+            "estado": p.estado,
+            "categorias": list(p.categorias),
+        }))
+    return resultado
+
+
+@require_role("admin", "secretaria")
+@require_http_methods(["GET"])
+def api_producto_por_codigo(request, codigo: str):
+    """Búsqueda exacta por código (escáner): precio, descuento máximo y stock en una respuesta"""
+    (_, prod), = _productos_por_codigo([codigo])
+    if not prod:
+        return JsonResponse({"ok": False, "msg": "Producto no encontrado"}, status=404)
+    return JsonResponse({"ok": True, "data": prod})
+
+
+@require_role("admin", "secretaria")
+@require_http_methods(["POST"])
+def api_productos_por_codigos(request):
+    """
+    Búsqueda exacta de varios códigos a la vez
+    body: {codigos: [...]} -> {ok, data: [...], noEncontrados: [...]}
+    """
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except:
+        return JsonResponse({"ok": False, "msg": "JSON inválido"}, status=400)
+    
+    codigos = body.get("codigos")
+    if not isinstance(codigos, list) or not codigos:
+        return JsonResponse({"ok": False, "msg": "Envía la lista 'codigos'"}, status=400)
+    if len(codigos) > 500:
+        return JsonResponse({"ok": False, "msg": "Máximo 500 códigos por consulta"}, status=400)
+    
+    # Sin repetidos, conservando el orden
+    codigos = list(dict.fromkeys(str(c).strip() for c in codigos if str(c).strip()))
+    resultado = _productos_por_codigo(codigos)
+    return JsonResponse({
+        "ok": True,
+        "data": [prod for _, prod in resultado if prod],
+        "noEncontrados": [c for c, prod in resultado if not prod],
+    })
+
+
 @require_role("admin", "secretaria")
 @require_http_methods(["GET"])
 def api_producto_detalle(request, id_prod: int):
@@ -1194,6 +1489,52 @@ def api_producto_categoria_quitar(request, id_prod: int, id_cat: int):
     return JsonResponse({"ok": True})
 
 
+@require_role("admin")
+@require_http_methods(["POST"])
+def api_productos_importar(request):
+    """
+    Importa el catálogo de productos desde un CSV/XLSX (campo multipart 'archivo').
+    Crea o actualiza por código; las filas inválidas van al reporte de errores.
+    """
+    archivo = request.FILES.get("archivo")
+    if not archivo:
+        return JsonResponse({"ok": False, "msg": "Adjunta el archivo en el campo 'archivo'"}, status=400)
+    
+    try:
+        filas = importacion.leer_filas(archivo.file, archivo.name)
+    except importacion.ArchivoInvalido as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    
+    id_usuario = request.session.get("id_usuario_db")
+    reporte = importacion.ReporteErrores()
+    try:
+        resumen = importacion.importar_productos(
+            filas, id_usuario, reporte,
+            tam_bloque=getattr(settings, "IMPORTACION_TAM_BLOQUE", 500),
+            hilos=getattr(settings, "IMPORTACION_HILOS", 4),
+        )
+    except importacion.ArchivoInvalido as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    except Exception as e:
+        print(f"Error importando productos: {e}")
+        return JsonResponse({"ok": False, "msg": "No se pudo leer el archivo"}, status=400)
+    finally:
+        reporte.cerrar()
+    
+    resumen["ok"] = True
+    resumen["reporteErrores"] = (
+        reverse("api_productos_importar_errores", args=[reporte.token]) if reporte.token else None
+    )
+    return JsonResponse(resumen)
+
+
+@require_role("admin")
+@require_http_methods(["GET"])
+def api_productos_importar_errores(request, token: str):
+    """Descarga el CSV de errores de una importación"""
+    return _descargar_reporte_errores(token)
+
+
 # ---------------------------
 # APIs: Inventario
 # ---------------------------
@@ -1206,7 +1547,8 @@ def api_inventario_actual(request):
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("pageSize", 100))
     
-    result = vw_inventario_actual(buscar, solo_criticos, page, page_size)
+    result = vw_inventario_actual(buscar, solo_criticos, page, page_size,
+                                  con_total=_flag_param(request, "withTotal", True))
     return JsonResponse({"ok": True, **result})
 
 
@@ -1252,12 +1594,100 @@ def api_inventario_entrada(request):
     return JsonResponse({"ok": True})
 
 
+@require_role("admin")
+@require_http_methods(["POST"])
+def api_inventario_movimientos_lote(request):
+    """
+    Registra muchos movimientos de inventario en una petición
+    body: {movimientos: [{idProducto, cantidad, tipoMovimiento, costoUnitario, motivo}], tamLote?}
+    tamLote: movimientos por transacción (0 = todos en una sola)
+    """
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except:
+        return JsonResponse({"ok": False, "msg": "JSON inválido"}, status=400)
+    
+    movimientos = body.get("movimientos")
+    if not isinstance(movimientos, list) or not movimientos:
+        return JsonResponse({"ok": False, "msg": "Debe enviar al menos un movimiento"}, status=400)
+    max_movs = getattr(settings, "INVENTARIO_LOTE_MAX", 5000)
+    if len(movimientos) > max_movs:
+        return JsonResponse({"ok": False, "msg": f"Máximo {max_movs} movimientos por petición"}, status=400)
+    
+    try:
+        tam_lote = int(body.get("tamLote", 500))
+    except (TypeError, ValueError):
+        tam_lote = 500
+    
+    id_usuario = request.session.get("id_usuario_db")
+    resultados = sp_inventario_registrar_movimientos_lote(id_usuario, movimientos, tam_lote)
+    for r in resultados:
+        r["msg"] = get_rc_message(r["rc"])
+    
+    registrados = sum(1 for r in resultados if r["rc"] == 0)
+    return JsonResponse({
+        "ok": True,
+        "registrados": registrados,
+        "fallidos": len(resultados) - registrados,
+        "resultados": resultados,
+    })
+
+
 @require_role("admin", "secretaria")
 @require_http_methods(["GET"])
 def api_inventario_historial(request, id_prod: int):
-    """Obtiene el historial de movimientos de un producto"""
-    data = sp_inventario_historial(id_prod)
-    return JsonResponse({"ok": True, "data": data})
+    """
+    Historial de movimientos de un producto.
+    Filtros: desde, hasta (YYYY-MM-DD), tipo (E|S)
+    - por defecto paginado por cursor: ?limit=100&cursor=<next> -> {ok, data, next}
+    - ?formato=ndjson|csv descarga el historial completo en streaming
+    """
+    tipo = (request.GET.get("tipo") or "").upper() or None
+    try:
+        desde = _fecha_param(request, "desde")
+        hasta = _fecha_param(request, "hasta")
+    except ValueError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    if tipo not in (None, "E", "S"):
+        return JsonResponse({"ok": False, "msg": "tipo debe ser E o S"}, status=400)
+    
+    formato = (request.GET.get("formato") or "").lower()
+    if formato in ("ndjson", "csv"):
+        filas = inventario_historial_stream(id_prod, desde, hasta, tipo)
+        if formato == "ndjson":
+            contenido = (json.dumps(f, cls=DjangoJSONEncoder) + "\n" for f in filas)
+            resp = StreamingHttpResponse(contenido, content_type="application/x-ndjson")
+        else:
+            resp = StreamingHttpResponse(_csv_stream(filas), content_type="text/csv; charset=utf-8")
+        resp["Content-Disposition"] = f'attachment; filename="historial_producto_{id_prod}.{formato}"'
+        return resp
+    
+    try:
+        pagina = inventario_historial_pagina(
+            id_prod, desde, hasta, tipo,
+            limit=_int_param(request, "limit", 100, maximo=1000),
+            cursor=request.GET.get("cursor") or None,
+        )
+    except ValueError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    return JsonResponse({"ok": True, **pagina})
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+def _csv_stream(filas):
+    """Genera un CSV (con BOM para Excel) fila por fila a partir de dicts"""
+    w = csv.writer(_Eco())
+    columnas = None
+    for f in filas:
+        if columnas is None:
+            columnas = list(f.keys())
+            yield "\ufeff" + w.writerow(columnas)
+        yield w.writerow([f[c] for c in columnas])
 
 
 # ---------------------------
@@ -1266,19 +1696,32 @@ def api_inventario_historial(request, id_prod: int):
 @require_role("admin")
 @require_http_methods(["GET"])
 def api_ventas_listar(request):
-    """Lista ventas con filtros"""
+    """
+    Lista ventas con filtros (fechaInicio, fechaFin, idUsuario).
+    Por defecto pagina por cursor: ?limit=100&cursor=<next> -> {ok, data, next}
+    ?offset=N (o ?page=N) conserva el paginado anterior: {ok, data: {data, total, page, pageSize}}
+    """
     fecha_inicio = request.GET.get("fechaInicio")
     fecha_fin = request.GET.get("fechaFin")
     id_usuario = request.GET.get("idUsuario")
-    limit = int(request.GET.get("limit", 100))
-    offset = int(request.GET.get("offset", 0))
+    id_usuario = int(id_usuario) if id_usuario else None
+    limit = _int_param(request, "limit", 100, maximo=1000)
     
-    data = listar_ventas(
-        fecha_inicio, fecha_fin,
-        int(id_usuario) if id_usuario else None,
-        limit, offset
-    )
-    return JsonResponse({"ok": True, "data": data})
+    if request.GET.get("offset") or request.GET.get("page"):
+        if request.GET.get("page"):
+            page = _int_param(request, "page", 1)
+        else:
+            page = _int_param(request, "offset", 0, minimo=0) // limit + 1
+        data = listar_ventas(fecha_inicio, fecha_fin, id_usuario, page, limit,
+                             con_total=_flag_param(request, "withTotal", True))
+        return JsonResponse({"ok": True, "data": data})
+    
+    try:
+        pagina = listar_ventas_pagina(fecha_inicio, fecha_fin, id_usuario, limit,
+                                      request.GET.get("cursor") or None)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    return JsonResponse({"ok": True, **pagina})
 
 
 @require_role("admin")
@@ -1296,18 +1739,79 @@ def api_venta_crear(request):
     if not detalles:
         return JsonResponse({"ok": False, "msg": "La venta debe tener al menos un producto"}, status=400)
     
+    # Idempotency-Key opcional: los reintentos reciben la respuesta de la primera venta
+    clave_idem = (request.headers.get("Idempotency-Key") or "").strip()
+    if len(clave_idem) > idempotencia.MAX_LARGO_CLAVE:
+        return JsonResponse({"ok": False, "msg": "Idempotency-Key demasiado larga"}, status=400)
+    if clave_idem:
+        huella = idempotencia.huella(request.body)
+        estado, previa = idempotencia.iniciar(id_usuario, clave_idem, huella)
+        if estado == "repetida":
+            resp = JsonResponse(previa)
+            resp["Idempotent-Replayed"] = "true"
+            return resp
+        if estado == "en_proceso":
+            return JsonResponse({"ok": False, "msg": "Una venta con esta Idempotency-Key se está procesando"}, status=409)
+        if estado == "conflicto":
+            return JsonResponse({"ok": False, "msg": "Idempotency-Key ya usada con otra venta"}, status=422)
+    
     rc, id_venta = sp_registrar_venta(id_usuario, detalles)
     
     if rc != 0:
+        if clave_idem:
+            idempotencia.liberar(id_usuario, clave_idem)
         MSG = {
             1: "Dato inválido",
+            3: "Producto no existe",
             6: "Usuario no válido",
             11: "Stock insuficiente",
             5: "Error general"
         }
         return JsonResponse({"ok": False, "rc": rc, "msg": MSG.get(rc, "Error")}, status=400)
     
-    return JsonResponse({"ok": True, "idVenta": id_venta})
+    respuesta = {"ok": True, "idVenta": id_venta}
+    if clave_idem:
+        idempotencia.completar(id_usuario, clave_idem, huella, respuesta)
+    return JsonResponse(respuesta)
+
+
+@require_role("admin")
+@require_http_methods(["POST"])
+def api_ventas_lote(request):
+    """
+    Registra un lote de ventas (sincronización de cajas que estuvieron sin conexión)
+    body: {ventas: [{ref?, detalles: [...]}, ...], tamLote?}
+    Responde un resultado por venta con el mismo rc de /api/ventas/create.
+    """
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except:
+        return JsonResponse({"ok": False, "msg": "JSON inválido"}, status=400)
+    
+    ventas = body.get("ventas")
+    if not isinstance(ventas, list) or not ventas:
+        return JsonResponse({"ok": False, "msg": "El lote debe tener al menos una venta"}, status=400)
+    max_ventas = getattr(settings, "VENTAS_LOTE_MAX", 1000)
+    if len(ventas) > max_ventas:
+        return JsonResponse({"ok": False, "msg": f"Máximo {max_ventas} ventas por lote"}, status=400)
+    
+    try:
+        tam_lote = int(body.get("tamLote") or 50)
+    except (TypeError, ValueError):
+        tam_lote = 50
+    
+    id_usuario = request.session.get("id_usuario_db")
+    resultados = sp_registrar_ventas_lote(id_usuario, ventas, tam_lote)
+    for r in resultados:
+        r["msg"] = get_rc_message(r["rc"])
+    
+    aceptadas = sum(1 for r in resultados if r["rc"] == 0)
+    return JsonResponse({
+        "ok": True,
+        "aceptadas": aceptadas,
+        "rechazadas": len(resultados) - aceptadas,
+        "resultados": resultados,
+    })
 
 
 @require_role("admin")
@@ -16,6 +16,7 @@
   const msgBuscar = $("msgBuscar");
   const errId = $("err-id");
   const frmBuscar = $("frmBuscar");
+  const sugerencias = $("sugerenciasEstudiantes");
   
   // Panel y formulario de actualización
   const panelActualizar = $("panelActualizar");
@@ -65,7 +66,7 @@
     }
     
     if (!/^\d+$/.test(id)) {
-      showError('id', 'El ID debe ser un número');
+      showError('id', 'Seleccione un estudiante de la lista o ingrese su ID');
       return false;
     }
     
@@ -228,12 +229,38 @@
     }
   });
 
+  // Sugerencias por nombre/apellido/correo: cada opción tiene como valor el ID
+  let timerSugerencias = null;
+  async function cargarSugerencias(texto) {
+    try {
+      const params = new URLSearchParams({ q: texto, k: 10 });
+      const res = await fetch(`${API_BASE}/api/estudiantes/autocompletar?${params}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const { data } = await res.json();
+      if (idEstudiante.value.trim() !== texto) return; // llegó tarde
+      sugerencias.innerHTML = "";
+      (data ?? []).forEach(est => {
+        const opt = document.createElement("option");
+        opt.value = est.idEstudiante;
+        opt.label = `${est.nombres} ${est.apellidos} · ${est.correo}`;
+        sugerencias.appendChild(opt);
+      });
+    } catch (err) {
+      console.error(err);
+    }
+  }
+
   // Limpiar mensajes cuando se modifica el input de búsqueda
   idEstudiante?.addEventListener("input", () => {
     msgBuscar.textContent = "";
     panelActualizar.classList.add("hidden");
     panelActualizar.setAttribute("aria-hidden", "true");
     clearErrors();
+
+    const texto = idEstudiante.value.trim();
+    clearTimeout(timerSugerencias);
+    if (!sugerencias || /^\d*$/.test(texto) || texto.length < 2) return;
+    timerSugerencias = setTimeout(() => cargarSugerencias(texto), 150);
   });
 
 })();
\ No newline at end of file
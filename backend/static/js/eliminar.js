@@ -11,6 +11,10 @@
   const $ = (id) => document.getElementById(id);
   const tbody = $("tbodyEstudiantes");
   const msg   = $("msg");
+  const btnMas = $("btnMas");
+
+  const PAGE_SIZE = 100;
+  let nextCursor = null;
 
   // Modal
   const overlay     = $("overlay");
@@ -41,13 +45,17 @@
     currentId = null;
   }
 
-  async function cargarTabla() {
+  // Carga la primera página (reset) o la siguiente usando el cursor del servidor
+  async function cargarTabla(reset = true) {
     try {
-      const res = await fetch(`${API_BASE}/api/estudiantes`);
+      const params = new URLSearchParams({ pageSize: PAGE_SIZE });
+      if (!reset && nextCursor) params.set("cursor", nextCursor);
+      const res = await fetch(`${API_BASE}/api/estudiantes?${params}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const data = await res.json();
       const list = data?.data ?? [];
-      tbody.innerHTML = "";
+      if (reset) tbody.innerHTML = "";
+      nextCursor = data?.next ?? null;
 
       list.forEach(row => {
         const tr = document.createElement("tr");
@@ -69,7 +77,8 @@
         tbody.appendChild(tr);
       });
 
-      msg.textContent = list.length ? "" : "No hay estudiantes registrados.";
+      btnMas?.classList.toggle("hidden", !nextCursor);
+      if (reset) msg.textContent = list.length ? "" : "No hay estudiantes registrados.";
     } catch (err) {
       console.error(err);
       msg.textContent = "Error al cargar la tabla.";
@@ -86,6 +95,7 @@
   }
 
   btnCancelar?.addEventListener("click", (e) => { e.preventDefault(); closeModal(); });
+  btnMas?.addEventListener("click", (e) => { e.preventDefault(); cargarTabla(false); });
   overlay?.addEventListener("click", closeModal);
 
   btnEliminar?.addEventListener("click", async (e) => {
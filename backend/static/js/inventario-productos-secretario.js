@@ -195,6 +195,54 @@ function buscarProductos() {
   cargarInventario();
 }
 
+// Historial paginado por cursor: se piden HISTORIAL_PAGINA movimientos por vez
+const HISTORIAL_PAGINA = 100;
+let historialCursor = null;
+
+async function pedirHistorial(idProducto, cursor = null) {
+  const params = new URLSearchParams({ limit: HISTORIAL_PAGINA });
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetch(`/api/inventario/historial/${idProducto}?${params}`, {
+    headers: { 'X-CSRFToken': csrftoken }
+  });
+  return response.json();
+}
+
+function filaHistorial(m) {
+  return `
+    <tr style="border-bottom: 1px solid rgba(255,255,255,0.08);">
+      <td style="padding: 12px; font-size: 13px;">${formatearFecha(m.fecha)}</td>
+      <td style="padding: 12px;">
+        <span style="padding: 4px 10px; border-radius: 6px; font-size: 12px; font-weight: 600; ${
+          m.tipo === 'E' 
+            ? 'background: rgba(52,211,153,0.2); color: #34d399;' 
+            : 'background: rgba(255,75,47,0.2); color: #ff4b2f;'
+        }">
+          ${m.tipo === 'E' ? 'ENTRADA' : 'SALIDA'}
+        </span>
+      </td>
+      <td style="padding: 12px; text-align: right; font-weight: 700;">${m.cantidad}</td>
+      <td style="padding: 12px; font-size: 13px; color: rgba(255,255,255,0.7);">${m.motivo || 'Sin descripción'}</td>
+    </tr>`;
+}
+
+async function cargarMasHistorial(idProducto) {
+  if (!historialCursor) return;
+  try {
+    const result = await pedirHistorial(idProducto, historialCursor);
+    const tbody = document.getElementById('historialBody');
+    if (result.ok && tbody) {
+      tbody.insertAdjacentHTML('beforeend', (result.data || []).map(filaHistorial).join(''));
+    }
+    historialCursor = result.ok ? (result.next || null) : null;
+  } catch (error) {
+    console.error('Error al cargar historial:', error);
+    historialCursor = null;
+  }
+  const btn = document.getElementById('btnHistorialMas');
+  if (btn && !historialCursor) btn.style.display = 'none';
+}
+
 async function verHistorial(idProducto) {
   const producto = productos.find(p => p.idProducto === idProducto);
   
@@ -203,22 +251,14 @@ async function verHistorial(idProducto) {
     return;
   }
 
-  // Cargar historial desde API
+  // Cargar la primera página del historial desde API
   let movimientos = [];
+  historialCursor = null;
   try {
-    const url = `/api/inventario/historial/${idProducto}`;
-    const response = await fetch(url, {
-      headers: { 'X-CSRFToken': csrftoken }
-    });
-    
-    const result = await response.json();
+    const result = await pedirHistorial(idProducto);
     if (result.ok && result.data) {
-      movimientos = result.data.map(m => ({
-        fecha: m.fecha,
-        tipo: m.tipo,
-        cantidad: m.cantidad,
-        motivo: m.motivo || 'Sin descripción'
-      }));
+      movimientos = result.data;
+      historialCursor = result.next || null;
     }
   } catch (error) {
     console.error('Error al cargar historial:', error);
@@ -256,28 +296,16 @@ async function verHistorial(idProducto) {
                 <th style="padding: 10px; text-align: left; font-size: 12px; font-weight: 700; text-transform: uppercase;">Motivo</th>
               </tr>
             </thead>
-            <tbody>
-              ${movimientos.map(m => `
-                <tr style="border-bottom: 1px solid rgba(255,255,255,0.08);">
-                  <td style="padding: 12px; font-size: 13px;">${formatearFecha(m.fecha)}</td>
-                  <td style="padding: 12px;">
-                    <span style="padding: 4px 10px; border-radius: 6px; font-size: 12px; font-weight: 600; ${
-                      m.tipo === 'E' 
-                        ? 'background: rgba(52,211,153,0.2); color: #34d399;' 
-                        : 'background: rgba(255,75,47,0.2); color: #ff4b2f;'
-                    }">
-                      ${m.tipo === 'E' ? 'ENTRADA' : 'SALIDA'}
-                    </span>
-                  </td>
-                  <td style="padding: 12px; text-align: right; font-weight: 700;">${m.cantidad}</td>
-                  <td style="padding: 12px; font-size: 13px; color: rgba(255,255,255,0.7);">${m.motivo}</td>
-                </tr>
-              `).join('')}
+            <tbody id="historialBody">
+              ${movimientos.map(filaHistorial).join('')}
             </tbody>
           </table>`
         }
       </div>
       <div class="modal-footer">
+        <button type="button" id="btnHistorialMas" class="btn-secondary" style="${historialCursor ? '' : 'display: none;'}"
+                onclick="cargarMasHistorial(${idProducto})">Cargar más</button>
+        <a class="btn-secondary" href="/api/inventario/historial/${idProducto}?formato=csv">Descargar CSV</a>
         <button type="button" class="btn-secondary" onclick="cerrarModalHistorial()">Cerrar</button>
       </div>
     </div>
@@ -377,6 +377,54 @@ async function guardarMovimiento(event) {
   }
 }
 
+// Historial paginado por cursor: se piden HISTORIAL_PAGINA movimientos por vez
+const HISTORIAL_PAGINA = 100;
+let historialCursor = null;
+
+async function pedirHistorial(idProducto, cursor = null) {
+  const params = new URLSearchParams({ limit: HISTORIAL_PAGINA });
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetch(`/api/inventario/historial/${idProducto}?${params}`, {
+    headers: { 'X-CSRFToken': csrftoken }
+  });
+  return response.json();
+}
+
+function filaHistorial(m) {
+  return `
+    <tr style="border-bottom: 1px solid rgba(255,255,255,0.08);">
+      <td style="padding: 12px; font-size: 13px;">${formatearFecha(m.fecha)}</td>
+      <td style="padding: 12px;">
+        <span style="padding: 4px 10px; border-radius: 6px; font-size: 12px; font-weight: 600; ${
+          m.tipo === 'E' 
+            ? 'background: rgba(52,211,153,0.2); color: #34d399;' 
+            : 'background: rgba(255,75,47,0.2); color: #ff4b2f;'
+        }">
+          ${m.tipo === 'E' ? 'ENTRADA' : 'SALIDA'}
+        </span>
+      </td>
+      <td style="padding: 12px; text-align: right; font-weight: 700;">${m.cantidad}</td>
+      <td style="padding: 12px; font-size: 13px; color: rgba(255,255,255,0.7);">${m.motivo || 'Sin motivo'}</td>
+    </tr>`;
+}
+
+async function cargarMasHistorial(idProducto) {
+  if (!historialCursor) return;
+  try {
+    const data = await pedirHistorial(idProducto, historialCursor);
+    const tbody = document.getElementById('historialBody');
+    if (data.ok && tbody) {
+      tbody.insertAdjacentHTML('beforeend', (data.data || []).map(filaHistorial).join(''));
+    }
+    historialCursor = data.ok ? (data.next || null) : null;
+  } catch (error) {
+    console.error('❌ Error al obtener historial:', error);
+    historialCursor = null;
+  }
+  const btn = document.getElementById('btnHistorialMas');
+  if (btn && !historialCursor) btn.style.display = 'none';
+}
+
 async function verHistorial(idProducto) {
   const producto = productos.find(p => p.idProducto === idProducto);
   
@@ -412,15 +460,12 @@ async function verHistorial(idProducto) {
 
   // Consultar API
   try {
-    const response = await fetch(`/api/inventario/historial/${idProducto}`, {
-      headers: { 'X-CSRFToken': csrftoken }
-    });
-    
-    const data = await response.json();
+    const data = await pedirHistorial(idProducto);
     
     console.log('✅ Historial obtenido:', data);
     
     const movimientos = data.ok ? (data.data || []) : [];
+    historialCursor = data.ok ? (data.next || null) : null;
     
     modal.innerHTML = `
       <div class="modal-content" style="max-width: 700px;">
@@ -446,28 +491,16 @@ async function verHistorial(idProducto) {
                   <th style="padding: 10px; text-align: left; font-size: 12px; font-weight: 700; text-transform: uppercase;">Descripción</th>
                 </tr>
               </thead>
-              <tbody>
-                ${movimientos.map(m => `
-                         <tr style="border-bottom: 1px solid rgba(255,255,255,0.08);">
-                           <td style="padding: 12px; font-size: 13px;">${formatearFecha(m.fecha)}</td>
-                           <td style="padding: 12px;">
-                             <span style="padding: 4px 10px; border-radius: 6px; font-size: 12px; font-weight: 600; ${
-                               m.tipo === 'E' 
-                                 ? 'background: rgba(52,211,153,0.2); color: #34d399;' 
-                                 : 'background: rgba(255,75,47,0.2); color: #ff4b2f;'
-                             }">
-                               ${m.tipo === 'E' ? 'ENTRADA' : 'SALIDA'}
-                             </span>
-                           </td>
-                           <td style="padding: 12px; text-align: right; font-weight: 700;">${m.cantidad}</td>
-                           <td style="padding: 12px; font-size: 13px; color: rgba(255,255,255,0.7);">${m.motivo || 'Sin motivo'}</td>
-                         </tr>
-                `).join('')}
+              <tbody id="historialBody">
+                ${movimientos.map(filaHistorial).join('')}
               </tbody>
             </table>`
           }
         </div>
         <div class="modal-footer">
+          <button type="button" id="btnHistorialMas" class="btn-secondary" style="${historialCursor ? '' : 'display: none;'}"
+                  onclick="cargarMasHistorial(${idProducto})">Cargar más</button>
+          <a class="btn-secondary" href="/api/inventario/historial/${idProducto}?formato=csv">Descargar CSV</a>
           <button type="button" class="btn-secondary" onclick="cerrarModalHistorial()">Cerrar</button>
         </div>
       </div>
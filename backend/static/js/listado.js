@@ -7,6 +7,10 @@
   const tbody = $("tbody");
   const msg   = $("msg");
   const btnRefrescar = $("btnRefrescar");
+  const btnMas = $("btnMas");
+
+  const PAGE_SIZE = 100;
+  let nextCursor = null;
 
   // Modal informativo
   const overlay = $("overlay");
@@ -30,13 +34,17 @@
     modal.classList.add("hidden");
   }
 
-  async function cargar() {
+  // Carga la primera página (reset) o la siguiente usando el cursor del servidor
+  async function cargar(reset = true) {
     try {
-      const res = await fetch(`${API_BASE}/api/estudiantes`);
+      const params = new URLSearchParams({ pageSize: PAGE_SIZE });
+      if (!reset && nextCursor) params.set("cursor", nextCursor);
+      const res = await fetch(`${API_BASE}/api/estudiantes?${params}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const { data } = await res.json();
+      const { data, total, next } = await res.json();
       const list = data ?? [];
-      tbody.innerHTML = "";
+      if (reset) tbody.innerHTML = "";
+      nextCursor = next ?? null;
 
       list.forEach(row => {
         const tr = document.createElement("tr");
@@ -52,7 +60,10 @@
         tbody.appendChild(tr);
       });
 
-      msg.textContent = list.length ? "" : "No hay estudiantes para mostrar.";
+      btnMas?.classList.toggle("hidden", !nextCursor);
+      if (reset) {
+        msg.textContent = list.length ? (total != null ? `${total} estudiantes` : "") : "No hay estudiantes para mostrar.";
+      }
     } catch (err) {
       console.error(err);
       msg.textContent = "Error al cargar el listado.";
@@ -60,6 +71,7 @@
   }
 
   btnRefrescar?.addEventListener("click", (e) => { e.preventDefault(); cargar(); });
+  btnMas?.addEventListener("click", (e) => { e.preventDefault(); cargar(false); });
   overlay?.addEventListener("click", closeModal);
   btnVolver?.addEventListener("click", (e) => { e.preventDefault(); closeModal(); });
 
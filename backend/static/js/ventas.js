@@ -42,6 +42,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
   if (searchInput) {
     searchInput.addEventListener('input', () => buscarProductos());
+    // Los lectores de código de barras terminan con Enter: búsqueda exacta por código
+    searchInput.addEventListener('keydown', (e) => {
+      if (e.key === 'Enter') {
+        e.preventDefault();
+        escanearCodigo(searchInput.value.trim());
+      }
+    });
     console.log('✅ Evento agregado: searchInput');
   }
   
@@ -126,6 +133,41 @@ function buscarProductos() {
   cargarProductosDesdeAPI();
 }
 
+// Agrega al carrito el producto con ese código exacto (precio, descuento y stock en una consulta)
+async function escanearCodigo(codigo) {
+  if (!codigo) return;
+  try {
+    const url = window.API_PRODUCTO_POR_CODIGO.replace('__codigo__', encodeURIComponent(codigo));
+    const response = await fetch(url, {
+      headers: { 'X-CSRFToken': csrftoken }
+    });
+    const data = await response.json();
+    if (!data.ok) {
+      mostrarError(`Código no encontrado: ${codigo}`);
+      return;
+    }
+    const producto = data.data;
+    if (producto.estado !== 'activo') {
+      mostrarError(`El producto ${producto.codigo} está inactivo`);
+      return;
+    }
+    // El carrito valida el stock contra la lista de productos cargada
+    const idx = productos.findIndex(p => p.idProducto === producto.idProducto);
+    if (idx >= 0) productos[idx] = { ...productos[idx], ...producto };
+    else productos.push(producto);
+
+    if ((parseInt(producto.stockActual) || 0) > 0) {
+      agregarAlCarrito(producto);
+    } else {
+      mostrarError(`Sin stock: ${producto.nombre}`);
+    }
+    const searchInput = document.getElementById('searchProducts');
+    if (searchInput) searchInput.value = '';
+  } catch (error) {
+    console.error('❌ Error al buscar código:', error);
+  }
+}
+
 function agregarAlCarrito(producto) {
   const stockActual = parseInt(producto.stockActual) || 0;
   const descuentoMaximo = parseFloat(producto.descuentoMaximoPct) || 0;